@@ -0,0 +1,146 @@
+import argparse
+import glob
+import json
+import os
+
+import pandas as pd
+
+from dedup_index import day_files, file_hash
+
+DATA_DIR = "data"
+# 不進 git（.gitignore）；news.yml 每晚以 artifact「news-archive」發布，
+# 本機要查詢時下載解壓到這裡，或直接跑 export 重建
+ARCHIVE_DIR = os.path.join(DATA_DIR, "_archive")
+MANIFEST_PATH = os.path.join(ARCHIVE_DIR, "manifest.json")
+
+# 有 pyarrow / fastparquet 就寫 Parquet；都沒有時 Feather 也不能用（它同樣依賴 pyarrow），
+# 退回 gzip pickle，至少保留 datetime 與 category 型別
+try:
+  import pyarrow  # noqa: F401
+  FORMAT = "parquet"
+except ImportError:
+  try:
+    import fastparquet  # noqa: F401
+    FORMAT = "parquet"
+  except ImportError:
+    FORMAT = "pickle"
+
+EXT = {"parquet": ".parquet", "pickle": ".pkl.gz"}
+COLUMNS = ["day", "published_at", "scraped_at", "source", "title", "summary", "url", "canonical_url", "cluster_id"]
+TIME_COLUMNS = ["published_at", "scraped_at"]
+
+
+def partition_path(day: str, fmt=FORMAT) -> str:
+  """依月份分區：data/_archive/month=YYYY-MM/YYYY-MM-DD.parquet"""
+  return os.path.join(ARCHIVE_DIR, f"month={day[:7]}", f"{day}{EXT[fmt]}")
+
+
+def to_frame(items: list[dict], day: str) -> pd.DataFrame:
+  df = pd.DataFrame(items, columns=[c for c in COLUMNS if c != "day"])
+  df.insert(0, "day", day)
+  for col in TIME_COLUMNS:
+    df[col] = pd.to_datetime(df[col], format="ISO8601", utc=True, errors="coerce").dt.tz_convert("Asia/Taipei")
+  df["source"] = df["source"].astype("category")
+  for col in ("title", "summary", "url", "canonical_url", "cluster_id"):
+    df[col] = df[col].astype("string")
+  return df
+
+
+def _write(df, path):
+  os.makedirs(os.path.dirname(path), exist_ok=True)
+  tmp = path + ".tmp"
+  if FORMAT == "parquet":
+    df.to_parquet(tmp, index=False)
+  else:
+    df.to_pickle(tmp, compression="gzip")
+  os.replace(tmp, path)
+
+
+def _read(path, columns=None):
+  if path.endswith(".parquet"):
+    return pd.read_parquet(path, columns=columns)
+  df = pd.read_pickle(path, compression="gzip")
+  return df[columns] if columns else df
+
+
+def export(data_dir=DATA_DIR, force=False) -> list[str]:
+  """只轉換內容 hash 有變動（或格式改變）的日期，回傳更新的日期列表。"""
+  from store_news import load_json
+
+  manifest = {}
+  if os.path.exists(MANIFEST_PATH) and not force:
+    with open(MANIFEST_PATH, "r", encoding="utf-8") as f:
+      manifest = json.load(f)
+  days = manifest.get("days", {}) if manifest.get("format") == FORMAT else {}
+
+  updated = []
+  for p in day_files(data_dir):
+    day = os.path.basename(p)[:-len(".json")]
+    h = file_hash(p)
+    if days.get(day) == h and os.path.exists(partition_path(day)):
+      continue
+    _write(to_frame(load_json(p), day), partition_path(day))
+    days[day] = h
+    updated.append(day)
+
+  os.makedirs(ARCHIVE_DIR, exist_ok=True)
+  tmp = MANIFEST_PATH + ".tmp"
+  with open(tmp, "w", encoding="utf-8") as f:
+    json.dump({"format": FORMAT, "days": days}, f, ensure_ascii=False, indent=2)
+  os.replace(tmp, MANIFEST_PATH)
+  return updated
+
+
+def load(date_from=None, date_to=None, columns=None) -> pd.DataFrame:
+  """讀取日期範圍內的分區（只開需要的月份與日期檔），回傳合併後的 DataFrame。"""
+  paths = []
+  for month_dir in sorted(glob.glob(os.path.join(ARCHIVE_DIR, "month=*"))):
+    month = month_dir.rsplit("=", 1)[-1]
+    if (date_from and month < date_from[:7]) or (date_to and month > date_to[:7]):
+      continue
+    for p in sorted(glob.glob(os.path.join(month_dir, f"*{EXT[FORMAT]}"))):
+      day = os.path.basename(p)[:10]
+      if (date_from and day < date_from) or (date_to and day > date_to):
+        continue
+      paths.append(p)
+  if not paths:
+    return pd.DataFrame(columns=columns or COLUMNS)
+  df = pd.concat([_read(p, columns) for p in paths], ignore_index=True)
+  if "source" in df:
+    df["source"] = df["source"].astype("category")
+  return df
+
+
+def source_counts(date_from=None, date_to=None, top=20) -> pd.Series:
+  df = load(date_from, date_to, columns=["source"])
+  return df["source"].value_counts().head(top)
+
+
+def daily_counts(date_from=None, date_to=None) -> pd.DataFrame:
+  """每日文章數與來源數。"""
+  df = load(date_from, date_to, columns=["day", "source"])
+  return df.groupby("day").agg(articles=("source", "size"), sources=("source", "nunique"))
+
+
+def main():
+  parser = argparse.ArgumentParser(description="data/ 的欄式（Parquet）歸檔")
+  sub = parser.add_subparsers(dest="cmd", required=True)
+  e = sub.add_parser("export", help="增量轉換有變動的日期")
+  e.add_argument("--force", action="store_true", help="全部重轉")
+  for name, help_text in (("sources", "來源文章數排行"), ("daily", "每日文章數 / 來源數")):
+    q = sub.add_parser(name, help=help_text)
+    q.add_argument("--from", dest="date_from", help="YYYY-MM-DD")
+    q.add_argument("--to", dest="date_to", help="YYYY-MM-DD")
+  args = parser.parse_args()
+
+  if args.cmd == "export":
+    updated = export(force=args.force)
+    print(f"✅ Exported {len(updated)} day(s) as {FORMAT} to {ARCHIVE_DIR}")
+  elif args.cmd == "sources":
+    print(source_counts(args.date_from, args.date_to).to_string())
+  elif args.cmd == "daily":
+    print(daily_counts(args.date_from, args.date_to).to_string())
+
+
+if __name__ == "__main__":
+  main()
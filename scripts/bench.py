@@ -0,0 +1,291 @@
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from formatter import to_email_html
+from store_news import TAIPEI, canonicalize_url, merge_dedup, save_json
+from post_to_facebook import optimize_md_for_fb
+
+OUT_DIR = "tmp/bench"
+# 目前一天約 10~180 篇；1x 以 200 篇為基準
+BASE_ITEMS = 200
+# 一份電子報約 1~5 KB；1x 以 8 個段落為基準
+BASE_SECTIONS = 8
+
+CJK_WORDS = [
+    "人工智慧", "生成式", "晶片", "輝達", "台積電", "大型語言模型", "資料中心", "監管", "開源",
+    "機器人", "自駕車", "半導體", "算力", "投資", "財報", "新創", "雲端", "隱私", "教育", "醫療",
+]
+EN_WORDS = [
+    "AI", "Nvidia", "OpenAI", "GPU", "LLM", "agent", "chip", "model", "cloud", "startup",
+    "data", "center", "regulation", "Google", "Microsoft", "robotics", "inference", "training",
+]
+SOURCES = ["TechNews 科技新報", "iThome", "數位時代", "Reuters", "Bloomberg", "NPR", "CNBC", "經濟日報", "中央社"]
+HOSTS = ["technews.tw", "www.ithome.com.tw", "www.bnext.com.tw", "www.reuters.com", "www.cnbc.com", "money.udn.com"]
+TRACKING = ["utm_source", "utm_medium", "utm_campaign", "fbclid", "gclid", "igshid", "spm"]
+
+# cli.py 各子指令的 import 時間上限（毫秒，不含直譯器啟動）；約為目前實測的 2~3 倍
+STARTUP_BUDGET_MS = {
+    "cli": 20,
+    "fetch": 120,
+    "store": 120,
+    "generate": 150,
+    "regenerate": 150,
+    "publish": 300,
+    "build": 150,
+    "digest": 150,
+}
+# 這些子指令不該載入的重量級套件（archive 需要 pandas，所以 build 只量預設目標）
+HEAVY_MODULES = ["pandas", "bs4", "g4f", "numpy"]
+STARTUP_SNIPPET = """
+import json, sys, time
+sys.path.insert(0, {scripts!r})
+t0 = time.perf_counter()
+import cli
+if {cmd!r} != "cli":
+    cli.load({cmd!r})
+ms = (time.perf_counter() - t0) * 1000
+print(json.dumps({{"ms": ms, "heavy": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def synth_title(rng):
+    words = [rng.choice(CJK_WORDS if rng.random() < 0.7 else EN_WORDS) for _ in range(rng.randint(4, 9))]
+    return " ".join("".join(w if not w.isascii() else f" {w} " for w in words).split())
+
+
+def synth_url(rng, i):
+    host = rng.choice(HOSTS)
+    path = f"/{2026 - i % 2}/{i % 12 + 1:02d}/{i % 28 + 1:02d}/article-{i}"
+    query = [f"{k}={rng.randint(1, 9999)}" for k in rng.sample(TRACKING, rng.randint(0, 4))]
+    if rng.random() < 0.2:
+        query.append(f"id={i}")
+    rng.shuffle(query)
+    return f"https://{host}{path}" + ("?" + "&".join(query) if query else "")
+
+
+def tracked_variant(rng, url):
+    """同一篇文章的另一種網址：大小寫不同的網域、換過的追蹤參數、加上 fragment"""
+    base, _, query = url.partition("?")
+    keep = [kv for kv in query.split("&") if kv.startswith("id=")]
+    extra = [f"{k}={rng.randint(1, 9999)}" for k in rng.sample(TRACKING, rng.randint(1, 3))]
+    scheme, _, rest = base.partition("://")
+    host, _, path = rest.partition("/")
+    return f"{scheme}://{host.upper()}/{path}?" + "&".join(keep + extra) + "#top"
+
+
+def synth_items(n, dup_ratio=0.3, seed=0):
+    """
+    依 data/*.json 的欄位產生 n 篇假新聞；約 dup_ratio 比例是前面某篇換了追蹤參數的重複網址。
+    """
+    rng = random.Random(seed)
+    start = datetime(2026, 8, 1, tzinfo=TAIPEI)
+    items = []
+    for i in range(n):
+        published = start + timedelta(seconds=rng.randint(0, 86400 * 2))
+        if items and rng.random() < dup_ratio:
+            orig = rng.choice(items)
+            url = tracked_variant(rng, orig["url"])
+            title = orig["title"]
+        else:
+            url = synth_url(rng, i)
+            title = synth_title(rng)
+        items.append({
+            "title": title,
+            "url": url,
+            "source": rng.choice(SOURCES),
+            "published_at": published.isoformat(sep=" "),
+            "summary": "".join(rng.choice(CJK_WORDS) for _ in range(rng.randint(15, 40))) + "...",
+        })
+    return items
+
+
+def synth_markdown(sections, seed=0):
+    """仿 eletters/*.md 的電子報：標題、編號段落、粗體、斜體、清單與連結"""
+    rng = random.Random(seed)
+    lines = ["# 2026年08月01日 每日 AI 趨勢摘要", "", synth_title(rng) + "。", ""]
+    for i in range(1, sections + 1):
+        lines.append(f"## {i}. {synth_title(rng)}")
+        lines.append(f"**{rng.choice(EN_WORDS)}** {synth_title(rng)}，*{rng.choice(EN_WORDS)} {rng.choice(EN_WORDS)}* {synth_title(rng)}。")
+        for _ in range(rng.randint(2, 4)):
+            lines.append(f"- {synth_title(rng)} ~~{rng.choice(EN_WORDS)}~~")
+        lines.append(f"1. [{synth_title(rng)}]({synth_url(rng, i)})")
+        lines.append("")
+        lines.append("")
+        lines.append("")
+    lines.append("## 結論")
+    lines.append(synth_title(rng) + "。🚀")
+    return "\n".join(lines)
+
+
+def measure(fn, repeat):
+    """回傳 (最快一次的秒數, 峰值記憶體 bytes)。峰值另外跑一次量，避免 tracemalloc 拖慢計時。"""
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak
+
+
+def stages(scale, dup_ratio, seed, workdir):
+    """各項測試：(名稱, 處理筆數, 要計時的函式)"""
+    n = BASE_ITEMS * scale
+    items = synth_items(n, dup_ratio, seed)
+    # 當日檔已經有一半，新批次是另一半加上重複
+    existing = merge_dedup([], items[: n // 2])
+    batch = items[n // 2:]
+    urls = [it["url"] for it in items]
+    merged = merge_dedup(existing, batch)
+    path = os.path.join(workdir, "day.json")
+    md = synth_markdown(BASE_SECTIONS * scale, seed)
+    # canonicalize_url 有 LRU memo，每次先清掉，量的是沒命中時的解析成本
+    clear_memo = getattr(canonicalize_url, "cache_clear", lambda: None)
+    return [
+        ("canonicalize_url", len(urls), lambda: (clear_memo(), [canonicalize_url(u) for u in urls])),
+        ("merge_dedup", len(batch), lambda: merge_dedup(existing, batch)),
+        ("save_json", len(merged), lambda: save_json(path, merged)),
+        ("optimize_md_for_fb", len(md), lambda: optimize_md_for_fb(md)),
+        ("md_to_email_html", len(md), lambda: to_email_html(md)),
+    ]
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(scales, dup_ratio=0.3, seed=0, repeat=3, only=None) -> dict:
+    result = {
+        "commit": git_commit(),
+        "run_at": datetime.now(TAIPEI).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "dup_ratio": dup_ratio,
+        "seed": seed,
+        "results": [],
+    }
+    workdir = tempfile.mkdtemp(prefix="news-bench-")
+    try:
+        for scale in scales:
+            for name, count, fn in stages(scale, dup_ratio, seed, workdir):
+                if only and name not in only:
+                    continue
+                seconds, peak = measure(fn, repeat)
+                row = {
+                    "stage": name,
+                    "scale": scale,
+                    "count": count,
+                    "seconds": round(seconds, 6),
+                    "per_second": round(count / seconds, 1) if seconds else None,
+                    "peak_kb": round(peak / 1024, 1),
+                }
+                result["results"].append(row)
+                # count 對 optimize_md_for_fb / md_to_email_html 是字元數，其餘是筆數
+                print(f"{name:<20} x{scale:<4} {count:>9} {seconds * 1000:>10.2f} ms "
+                      f"{row['per_second']:>12}/s {row['peak_kb']:>10} KB")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return result
+
+
+def startup(repeat=5, budgets=None) -> list[str]:
+    """
+    每個子指令在全新的直譯器裡 import 需要的模組，取 repeat 次中最快的一次；
+    回傳超出預算或載入了重量級套件的子指令。
+    """
+    budgets = budgets or STARTUP_BUDGET_MS
+    scripts = os.path.dirname(os.path.abspath(__file__))
+    failures = []
+    for cmd, budget in budgets.items():
+        code = STARTUP_SNIPPET.format(scripts=scripts, cmd=cmd, heavy=HEAVY_MODULES)
+        best, heavy = float("inf"), []
+        for _ in range(repeat):
+            out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout
+            row = json.loads(out.strip().splitlines()[-1])
+            best = min(best, row["ms"])
+            heavy = row["heavy"]
+        flag = ""
+        if best > budget:
+            flag = " <- over budget"
+        elif heavy:
+            flag = f" <- imports {', '.join(heavy)}"
+        print(f"{cmd:<12} {best:>8.1f} ms  budget {budget:>5} ms{flag}")
+        if flag:
+            failures.append(cmd)
+    return failures
+
+
+def compare(base_path, new_path, threshold=0.2) -> list[str]:
+    """比較兩次結果，回傳變慢超過 threshold（比例）的項目。"""
+    with open(base_path, "r", encoding="utf-8") as f:
+        base = {(r["stage"], r["scale"]): r for r in json.load(f)["results"]}
+    with open(new_path, "r", encoding="utf-8") as f:
+        new = json.load(f)["results"]
+    regressions = []
+    for r in new:
+        b = base.get((r["stage"], r["scale"]))
+        if not b or not b["seconds"]:
+            continue
+        ratio = r["seconds"] / b["seconds"]
+        mem = r["peak_kb"] / b["peak_kb"] if b["peak_kb"] else 1.0
+        flag = " <- regression" if ratio > 1 + threshold else ""
+        print(f"{r['stage']:<20} x{r['scale']:<4} time {ratio:>6.2f}x  peak {mem:>6.2f}x{flag}")
+        if flag:
+            regressions.append(f"{r['stage']} x{r['scale']}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="匯入與格式化熱路徑的效能測試（合成資料）")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    r = sub.add_parser("run", help="執行測試並把結果存成 JSON")
+    r.add_argument("--scale", default="1,10,100", help="資料量倍數，逗號分隔（1x = 今天的量）")
+    r.add_argument("--dup-ratio", type=float, default=0.3)
+    r.add_argument("--seed", type=int, default=0)
+    r.add_argument("--repeat", type=int, default=3, help="每項跑幾次取最快")
+    r.add_argument("--stage", action="append", help="只跑指定項目，可重複")
+    r.add_argument("--out", help=f"結果檔（預設 {OUT_DIR}/<commit>-<時間>.json）")
+    c = sub.add_parser("compare", help="比較兩次結果，變慢超過門檻時 exit 1")
+    c.add_argument("base")
+    c.add_argument("new")
+    c.add_argument("--threshold", type=float, default=0.2)
+    s = sub.add_parser("startup", help="量 cli.py 各子指令的 import 時間，超出 STARTUP_BUDGET_MS 時 exit 1")
+    s.add_argument("--repeat", type=int, default=5, help="每項跑幾次取最快")
+    args = parser.parse_args()
+
+    if args.cmd == "run":
+        scales = [int(s) for s in args.scale.split(",") if s.strip()]
+        result = run(scales, args.dup_ratio, args.seed, args.repeat, only=args.stage)
+        out = args.out or os.path.join(
+            OUT_DIR, f"{result['commit'] or 'nogit'}-{datetime.now(TAIPEI).strftime('%Y%m%d%H%M%S')}.json")
+        os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+        with open(out, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"Results saved to {out}")
+    elif args.cmd == "compare":
+        if compare(args.base, args.new, args.threshold):
+            sys.exit(1)
+    elif args.cmd == "startup":
+        if startup(args.repeat):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+import json
+import os
+import sys
+from datetime import date, datetime
+
+from dedup_index import day_files, file_hash
+from store_news import TAIPEI, load_json, sort_key
+
+DATA_DIR = "data"
+BUNDLE_DIR = os.path.join(DATA_DIR, "bundles")
+MANIFEST_PATH = os.path.join(DATA_DIR, "manifest.json")
+
+
+def week_id(d: date) -> str:
+  y, w, _ = d.isocalendar()
+  return f"{y}-W{w:02d}"
+
+
+def month_id(d: date) -> str:
+  return f"{d.year}-{d.month:02d}"
+
+
+def merge_days(paths):
+  """合併多天資料：依 canonical_url（沒有就 url）去重，依 published_at 排序，最新在前。"""
+  m = {}
+  for p in paths:
+    for it in load_json(p):
+      m.setdefault(it.get("canonical_url") or it.get("url") or it.get("title"), it)
+  return sorted(m.values(), key=sort_key, reverse=True)
+
+
+def write_bundle(name, items):
+  os.makedirs(BUNDLE_DIR, exist_ok=True)
+  path = os.path.join(BUNDLE_DIR, f"{name}.json")
+  tmp = path + ".tmp"
+  with open(tmp, "w", encoding="utf-8") as f:
+    # 不縮排，前端下載量少一半左右
+    json.dump(items, f, ensure_ascii=False, separators=(",", ":"))
+  os.replace(tmp, path)
+  return os.path.relpath(path, DATA_DIR).replace(os.sep, "/")
+
+
+def build(force=False):
+  """
+  依每日檔的內容 hash 增量重建週 / 月 bundle，並輸出 manifest：
+  {"dates": {日期: {count, hash}}, "weeks": {週: {file, start, end, count}}, "months": {...}}
+  """
+  old = {}
+  if os.path.exists(MANIFEST_PATH) and not force:
+    with open(MANIFEST_PATH, "r", encoding="utf-8") as f:
+      old = json.load(f)
+  old_dates = old.get("dates", {})
+
+  dates = {}
+  groups = {"weeks": {}, "months": {}}
+  changed = {"weeks": set(), "months": set()}
+  for p in day_files(DATA_DIR):
+    ds = os.path.basename(p)[:-len(".json")]
+    d = date.fromisoformat(ds)
+    h = file_hash(p)
+    prev = old_dates.get(ds)
+    count = prev["count"] if prev and prev["hash"] == h else len(load_json(p))
+    dates[ds] = {"count": count, "hash": h}
+    for kind, gid in (("weeks", week_id(d)), ("months", month_id(d))):
+      groups[kind].setdefault(gid, []).append(ds)
+      if not prev or prev["hash"] != h:
+        changed[kind].add(gid)
+
+  out = {"generated_at": datetime.now(TAIPEI).isoformat(timespec="seconds"), "dates": dates}
+  rebuilt = 0
+  for kind, prefix in (("weeks", "week"), ("months", "month")):
+    out[kind] = {}
+    for gid, days in sorted(groups[kind].items()):
+      entry = old.get(kind, {}).get(gid)
+      bundle_file = os.path.join(BUNDLE_DIR, f"{prefix}-{gid}.json")
+      if gid in changed[kind] or entry is None or entry.get("days") != days or not os.path.exists(bundle_file):
+        items = merge_days([os.path.join(DATA_DIR, f"{ds}.json") for ds in days])
+        entry = {
+          "file": write_bundle(f"{prefix}-{gid}", items),
+          "start": days[0],
+          "end": days[-1],
+          "days": days,
+          "count": len(items),
+        }
+        rebuilt += 1
+      out[kind][gid] = entry
+
+  tmp = MANIFEST_PATH + ".tmp"
+  with open(tmp, "w", encoding="utf-8") as f:
+    json.dump(out, f, ensure_ascii=False, separators=(",", ":"))
+  os.replace(tmp, MANIFEST_PATH)
+  return rebuilt
+
+
+def main():
+  force = "--force" in sys.argv
+  rebuilt = build(force=force)
+  print(f"✅ Rebuilt {rebuilt} bundles, manifest at {MANIFEST_PATH}")
+
+
+if __name__ == "__main__":
+  main()
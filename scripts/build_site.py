@@ -0,0 +1,159 @@
+import argparse
+import glob
+import hashlib
+import json
+import os
+import re
+
+import formatter
+
+ELETTERS_DIR = "eletters"
+# GitHub Pages 直接提供的靜態檔；目錄名稱不能以 _ 開頭（Jekyll 會略過）
+SITE_DIR = os.path.join(ELETTERS_DIR, "site")
+MANIFEST_PATH = os.path.join(SITE_DIR, "manifest.json")
+# 每頁索引筆數；第 1 頁約 10 KB，newsletter.html 一開始只載這一個檔
+PAGE_SIZE = int(os.getenv("SITE_PAGE_SIZE", "30"))
+EXCERPT_CHARS = 120
+
+DATE_MD_RE = re.compile(r"^(\d{4}-\d{2}-\d{2})\.md$")
+FRONT_MATTER_RE = re.compile(r"\A---\s*\n.*?\n---\s*\n", re.DOTALL)
+
+
+def render_version():
+  """formatter.py 的內容 hash；轉換規則改了就全部重轉（輸出沒變的檔案不會重寫）"""
+  with open(formatter.__file__, "rb") as f:
+    return hashlib.sha1(f.read()).hexdigest()[:16]
+
+
+def newsletter_files(md_dir=ELETTERS_DIR):
+  """eletters/ 底下 YYYY-MM-DD.md，依日期排序"""
+  files = []
+  for p in glob.glob(os.path.join(md_dir, "*.md")):
+    m = DATE_MD_RE.match(os.path.basename(p))
+    if m:
+      files.append((m.group(1), p))
+  return sorted(files)
+
+
+def plain_text(nodes):
+  out = []
+  for node in nodes:
+    if node[0] in ("text", "code"):
+      out.append(node[1])
+    else:
+      out.append(plain_text(node[1]))
+  return "".join(out)
+
+
+def summarize(md, fallback_title):
+  """(標題, 摘要)：第一個標題、第一段非標題文字（去掉 Markdown 標記）"""
+  title = excerpt = None
+  for kind, _, inline in formatter.tokenize(md):
+    if inline is None:
+      continue
+    text = plain_text(inline).strip()
+    if not text:
+      continue
+    if kind == "heading" and title is None:
+      title = text
+    elif kind != "heading" and excerpt is None:
+      excerpt = text
+    if title and excerpt:
+      break
+  excerpt = excerpt or ""
+  if len(excerpt) > EXCERPT_CHARS:
+    excerpt = excerpt[:EXCERPT_CHARS].rstrip() + "…"
+  return title or fallback_title, excerpt
+
+
+def write_if_changed(path, text):
+  """內容相同就不寫，避免 workflow 產生沒有意義的 commit"""
+  if os.path.exists(path):
+    with open(path, "r", encoding="utf-8") as f:
+      if f.read() == text:
+        return False
+  tmp = path + ".tmp"
+  with open(tmp, "w", encoding="utf-8") as f:
+    f.write(text)
+  os.replace(tmp, path)
+  return True
+
+
+def build(md_dir=ELETTERS_DIR, site_dir=SITE_DIR, force=False):
+  """
+  依每份電子報的內容 hash 增量產生：
+    site/html/<日期>.html：預先轉好的 HTML。檔名固定，內容沒變就不會出現在 commit 裡
+    site/index-<n>.json：分頁索引 {"page", "pages", "total", "items": [{date, title, excerpt, html}]}，最新在前；
+      html 是 "html/<日期>.html?v=<輸出 hash>"，內容改了網址就跟著變，瀏覽器不會拿到舊快取
+    site/manifest.json：{"render": formatter 版本, "files": {日期: {hash, html, v, title, excerpt}}}
+  回傳 (改寫的 HTML 篇數, 刪除的篇數)
+  """
+  html_dir = os.path.join(site_dir, "html")
+  os.makedirs(html_dir, exist_ok=True)
+  manifest_path = os.path.join(site_dir, "manifest.json")
+  old = {}
+  if os.path.exists(manifest_path) and not force:
+    with open(manifest_path, "r", encoding="utf-8") as f:
+      old = json.load(f)
+  version = render_version()
+  old_files = old.get("files", {}) if old.get("render") == version else {}
+
+  files, rendered = {}, 0
+  for ds, p in newsletter_files(md_dir):
+    with open(p, "rb") as f:
+      raw = f.read()
+    h = hashlib.sha1(raw).hexdigest()[:16]
+    name = f"html/{ds}.html"
+    entry = old_files.get(ds)
+    if entry and entry["hash"] == h and entry["html"] == name and os.path.exists(os.path.join(site_dir, name)):
+      files[ds] = entry
+      continue
+    md = FRONT_MATTER_RE.sub("", raw.decode("utf-8").replace("\r\n", "\n"))
+    title, excerpt = summarize(md, ds)
+    html = formatter.to_html(md) + "\n"
+    if write_if_changed(os.path.join(site_dir, name), html):
+      rendered += 1
+    files[ds] = {"hash": h, "html": name, "v": hashlib.sha1(html.encode("utf-8")).hexdigest()[:10],
+                 "title": title, "excerpt": excerpt}
+
+  # 刪掉已移除電子報（以及舊版檔名帶 hash）的 HTML
+  keep = {os.path.basename(e["html"]) for e in files.values()}
+  removed = 0
+  for p in glob.glob(os.path.join(html_dir, "*.html")):
+    if os.path.basename(p) not in keep:
+      os.remove(p)
+      removed += 1
+
+  dates = sorted(files, reverse=True)
+  pages = max((len(dates) + PAGE_SIZE - 1) // PAGE_SIZE, 1)
+  for n in range(1, pages + 1):
+    chunk = dates[(n - 1) * PAGE_SIZE:n * PAGE_SIZE]
+    index = {
+      "page": n,
+      "pages": pages,
+      "total": len(dates),
+      "items": [{"date": ds, "title": files[ds]["title"], "excerpt": files[ds]["excerpt"],
+                 "html": f"{files[ds]['html']}?v={files[ds]['v']}"} for ds in chunk],
+    }
+    write_if_changed(os.path.join(site_dir, f"index-{n}.json"),
+                     json.dumps(index, ensure_ascii=False, separators=(",", ":")))
+  for p in glob.glob(os.path.join(site_dir, "index-*.json")):
+    m = re.match(r"index-(\d+)\.json$", os.path.basename(p))
+    if m and int(m.group(1)) > pages:
+      os.remove(p)
+
+  write_if_changed(manifest_path, json.dumps({"render": version, "page_size": PAGE_SIZE, "files": files},
+                                             ensure_ascii=False, indent=1, sort_keys=True) + "\n")
+  return rendered, removed
+
+
+def main():
+  parser = argparse.ArgumentParser(description="把 eletters/*.md 預先轉成 newsletter.html 用的靜態檔")
+  parser.add_argument("--force", action="store_true", help="忽略 manifest 全部重建")
+  args = parser.parse_args()
+  rendered, removed = build(force=args.force)
+  print(f"✅ Wrote {rendered} newsletters, removed {removed} stale files, site at {SITE_DIR}")
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,239 @@
+import argparse
+import hashlib
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from urllib.parse import parse_qsl, unquote, urlencode, urlparse, urlunparse
+
+from dedup_index import INDEX_DIR
+from serp_cache import ResponseCache
+
+# 規則改了就加一：data/ 裡存的 canonical_url 要用 migrate 重算，跨日索引也要重建
+RULES_VERSION = 3
+VERSION_PATH = os.path.join(INDEX_DIR, "canonical_version")
+
+# 保留常見必要參數，其它像 utm_*, fbclid 會移除（全域，各網域可在 DOMAIN_RULES 追加）
+KEEP_QUERY_KEYS = {"id", "cid", "sid", "ref"}
+
+# 各網域的規則，以 host 比對，找不到再去掉最左邊一段往上找（m.cnyes.com -> cnyes.com）。
+#   host：換成這個 host（行動版、AMP 子網域指回主站）
+#   path：[(regex, 取代字串)]，依序套用在 path 上
+#   keep：這個網域額外要保留的 query 參數（小寫比對；文章 ID 放在 query 的網站一定要列）
+#   unwrap：這些 query 參數裡是真正的網址（轉址包裝），直接取出來再正規化一次；
+#           值不是網址（例如 google.com/goto?url=<token>）時保留該參數，它就是文章的識別
+#   resolve：短網址 / 轉址服務，離線無法還原，交給 resolve_redirects() 連線展開
+# 沒有 keep 規則的網域，若 path 是動態頁（.php / .aspx ... 或根目錄），文章 ID 多半在 query 裡，
+# 保留追蹤參數以外的全部參數；跨日索引是永久的，誤把兩篇併成同一個 key 會讓後一篇永遠收不進來
+DOMAIN_RULES = {
+  "m.cnyes.com": {"host": "news.cnyes.com"},
+  "moneydj.com": {"keep": {"a"}},
+  "m.moneydj.com": {
+    "host": "www.moneydj.com",
+    "path": [(r"^/f1a\.aspx$", "/kmdj/news/newsviewer.aspx")],
+    "keep": {"a"},
+  },
+  "rti.org.tw": {"keep": {"uid", "pid"}},
+  "gamer.com.tw": {"keep": {"sn"}},
+  "stpi.narl.org.tw": {"keep": {"postid"}},
+  "stpi.niar.org.tw": {"keep": {"postid"}},
+  "blog.104.com.tw": {"keep": {"p"}},
+  "tca.org.tw": {"keep": {"n"}},
+  # 政府網站共用的 CMS：News_Content.aspx?n=<單元>&s=<文章>
+  "gov.tw": {"keep": {"n", "s"}},
+  "taiwan-healthcare.org": {"keep": {"refdocid"}},
+  "digitimes.com.tw": {"keep": {"id"}},
+  "aastocks.com": {"keep": {"id"}},
+  "facebook.com": {"host": "www.facebook.com", "keep": {"story_fbid", "fbid"}},
+  "worldjournal.com": {"path": [(r"/amp/", "/")]},
+  "bitget.com": {"path": [(r"/amp/", "/")]},
+  "google.com": {"unwrap": {"url", "q"}},
+  "news.google.com": {"resolve": True},
+  "t.co": {"resolve": True},
+  "bit.ly": {"resolve": True},
+  "lnkd.in": {"resolve": True},
+  "reurl.cc": {"resolve": True},
+  "ppt.cc": {"resolve": True},
+}
+
+# 所有網域共用：結尾的 /amp 是 AMP 版本
+AMP_SUFFIX_RE = re.compile(r"/amp/?$")
+TRACKING_KEYS = {"fbclid", "gclid", "igshid", "spm"}
+DYNAMIC_PATH_RE = re.compile(r"(?:^/?$|\.(?:php|aspx?|jsp|cgi)$)", re.IGNORECASE)
+
+# canonicalize_url 的 LRU 快取大小
+MEMO_SIZE = int(os.getenv("CANON_MEMO_SIZE", "65536"))
+
+REDIRECT_CACHE_DIR = "tmp/redirect_cache"
+
+
+@lru_cache(maxsize=4096)
+def rule_for(host: str) -> dict:
+  labels = host.split(".")
+  for i in range(len(labels) - 1):
+    rule = DOMAIN_RULES.get(".".join(labels[i:]))
+    if rule is not None:
+      return rule
+  return {}
+
+
+@lru_cache(maxsize=MEMO_SIZE)
+def canonicalize_url(u: str) -> str:
+  try:
+    p = urlparse(u.strip())
+    # 小寫網域、保留 path、移除 fragment
+    netloc = p.netloc.lower()
+    rule = rule_for(netloc.split(":")[0])
+    q_pairs = parse_qsl(p.query, keep_blank_values=True)
+
+    for k, v in q_pairs:
+      if k.lower() in rule.get("unwrap", ()) and v.startswith(("http://", "https://")):
+        return canonicalize_url(unquote(v))
+
+    netloc = rule.get("host", netloc)
+    path = p.path
+    for pattern, repl in rule.get("path", ()):
+      path = re.sub(pattern, repl, path)
+    if AMP_SUFFIX_RE.search(path):
+      path = AMP_SUFFIX_RE.sub("", path) or "/"
+
+    # 過濾追蹤參數
+    keep = KEEP_QUERY_KEYS | rule.get("keep", set()) | rule.get("unwrap", set())
+    keep_all = "keep" not in rule and DYNAMIC_PATH_RE.search(path)
+    filtered = []
+    for k, v in q_pairs:
+      kl = k.lower()
+      if kl.startswith("utm_") or kl in TRACKING_KEYS:
+        continue
+      if keep_all or kl in keep:
+        filtered.append((k, v))
+    query = urlencode(filtered, doseq=True)
+    return urlunparse((p.scheme, netloc, path, "", query, ""))
+  except Exception:
+    return u.strip()
+
+
+def needs_resolve(url: str) -> bool:
+  return bool(rule_for(urlparse(url).netloc.lower()).get("resolve"))
+
+
+class RedirectCache(ResponseCache):
+  """短網址 -> 最終網址，一個網址一個檔；只快取成功展開（不再是轉址服務）的結果。"""
+
+  def key(self, params):
+    return hashlib.sha1(params["url"].encode("utf-8")).hexdigest()
+
+  def describe(self, params):
+    return {"url": params["url"]}
+
+  def cacheable(self, response):
+    return isinstance(response, str) and not needs_resolve(response)
+
+
+def resolve_redirects(urls, max_workers=8, rate_per_host=2.0, cache=None) -> dict:
+  """
+  批次展開短網址 / Google News 包裝連結，回傳 {原網址: 最終網址}（展開失敗的不列）。
+  結果存在 tmp/redirect_cache，同一網址不會重複連線。
+  """
+  import tracing
+  from news_fetcher import RateLimiter, build_session
+
+  urls = sorted({u for u in urls if needs_resolve(u)})
+  if not urls:
+    return {}
+  cache = cache or RedirectCache(
+    cache_dir=os.getenv("REDIRECT_CACHE_DIR", REDIRECT_CACHE_DIR),
+    ttl=int(os.getenv("REDIRECT_CACHE_TTL", str(30 * 24 * 3600))),
+    max_bytes=20 * 1024 * 1024,
+  )
+  session = build_session(pool_size=max_workers)
+  limiter = RateLimiter(rate_per_host)
+
+  def resolve(url):
+    def fetch():
+      limiter.wait(url)
+      with tracing.external("redirect", host=urlparse(url).netloc) as call:
+        r = session.head(url, allow_redirects=True, timeout=10)
+        if r.status_code in (403, 405):
+          r = session.get(url, allow_redirects=True, timeout=10, stream=True)
+          r.close()
+        call["status"] = r.status_code
+        return r.url
+    try:
+      return url, cache.fetch({"url": url}, fetch)
+    except Exception as e:
+      print(f"Redirect resolution failed for {url}: {e}")
+      return url, None
+
+  try:
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+      results = list(pool.map(resolve, urls))
+  finally:
+    session.close()
+  return {u: final for u, final in results if final and not needs_resolve(final)}
+
+
+def read_version(path=VERSION_PATH):
+  """data/ 的 canonical_url 是用哪一版規則算的；沒有這個檔案（新的 data 目錄）視為目前版本"""
+  try:
+    with open(path, "r", encoding="utf-8") as f:
+      return int(f.read().strip() or 0)
+  except FileNotFoundError:
+    return RULES_VERSION
+  except ValueError:
+    return 0
+
+
+def migrate(data_dir="data", dry_run=False) -> tuple[int, int]:
+  """
+  用目前規則重算 data/ 裡每篇（含 related 的轉載）的 canonical_url（之後 item_key 直接信任這個欄位），
+  再重建跨日索引。回傳 (改動的檔案數, 改動的文章數)。
+  """
+  from dedup_index import build_index, day_files
+  from store_news import load_json, save_json, store_lock
+
+  files = changed = 0
+  with store_lock():
+    for p in day_files(data_dir):
+      items = load_json(p)
+      n = 0
+      for it in items:
+        for x in [it] + it.get("related", []):
+          if not x.get("url"):
+            continue
+          canon = canonicalize_url(x.get("resolved_url") or x["url"])
+          if x.get("canonical_url") != canon:
+            x["canonical_url"] = canon
+            n += 1
+      if n:
+        files += 1
+        changed += n
+        if not dry_run:
+          save_json(p, items)
+    if not dry_run:
+      build_index(data_dir)
+      with open(VERSION_PATH, "w", encoding="utf-8") as f:
+        f.write(f"{RULES_VERSION}\n")
+  return files, changed
+
+
+def main():
+  parser = argparse.ArgumentParser(description="網址正規化規則")
+  sub = parser.add_subparsers(dest="cmd", required=True)
+  c = sub.add_parser("show", help="顯示某個網址正規化後的結果")
+  c.add_argument("url")
+  m = sub.add_parser("migrate", help="規則改變後重算 data/ 的 canonical_url 並重建跨日索引")
+  m.add_argument("--data-dir", default="data")
+  m.add_argument("--dry-run", action="store_true")
+  args = parser.parse_args()
+
+  if args.cmd == "show":
+    print(canonicalize_url(args.url))
+  elif args.cmd == "migrate":
+    files, changed = migrate(args.data_dir, args.dry_run)
+    verb = "Would update" if args.dry_run else "Updated"
+    print(f"✅ {verb} {changed} canonical_url values in {files} files (rules v{RULES_VERSION})")
+
+
+if __name__ == "__main__":
+  main()
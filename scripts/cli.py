@@ -0,0 +1,72 @@
+import argparse
+import importlib
+import sys
+
+# 子指令 -> [(模組, 參數, tracing.run 名稱)]。模組在執行該子指令時才 import，
+# 所以 `cli.py --help` 或跑 store 時不會載入 requests / pandas / g4f。
+# 模組自己的 __main__ 已經包 tracing.run 的，這裡的名稱為 None
+COMMANDS = {
+    "fetch": ("用 SerpAPI 抓新聞，寫出 tmp/batches 批次檔", [("news", [], "news")]),
+    "store": ("把批次檔合併去重存進 data/（compact：折疊 .jsonl）", [("store_news", None, None)]),
+    "generate": ("產生今天的電子報 eletters/YYYY-MM-DD.md", [("py_news", None, None)]),
+    "regenerate": ("用自訂 prompt 重新產生今天的電子報", [("regen_py_news", None, None)]),
+    "publish": ("把今天的電子報加入發文佇列並發到 Facebook", [("post_to_facebook", None, "post_to_facebook")]),
+    "digest": ("每日結構化摘要與週報 / 月報（daily / build）", [("digest", None, None)]),
+}
+# build 的目標可以任意組合，預設只建前端需要的 bundles 與 site（archive 需要 pandas）；
+# search 重建全文索引 data/_search（store 平常只更新當月），依 manifest 只重建有變動的月份
+BUILD_TARGETS = {
+    "bundles": ("build_bundles", [], None),
+    "site": ("build_site", [], None),
+    "archive": ("archive_export", ["export"], None),
+    "search": ("search_index", ["update"], None),
+}
+DEFAULT_BUILD = ["bundles", "site"]
+
+
+def steps(cmd, rest):
+    """子指令要依序執行的 (模組, argv, tracing 名稱)；None 的 argv 表示把剩下的參數原樣傳給模組"""
+    if cmd == "build":
+        targets = rest or DEFAULT_BUILD
+        unknown = [t for t in targets if t not in BUILD_TARGETS]
+        if unknown:
+            raise SystemExit(f"Unknown build target(s): {', '.join(unknown)}; choose from {', '.join(BUILD_TARGETS)}")
+        return [BUILD_TARGETS[t] for t in targets]
+    return [(module, rest if argv is None else argv, trace) for module, argv, trace in COMMANDS[cmd][1]]
+
+
+def load(cmd, rest=()):
+    """只 import 子指令用到的模組（不執行），bench.py startup 用來量 import 時間"""
+    return [importlib.import_module(module) for module, _, _ in steps(cmd, list(rest))]
+
+
+def run_module(module_name, argv, trace=None):
+    module = importlib.import_module(module_name)
+    # 各腳本的 main() 自己讀 sys.argv，照直接執行 python scripts/<模組>.py 的樣子給參數
+    saved = sys.argv
+    sys.argv = [module.__file__] + list(argv)
+    try:
+        if trace:
+            import tracing
+            with tracing.run(trace):
+                module.main()
+        else:
+            module.main()
+    finally:
+        sys.argv = saved
+
+
+def main():
+    parser = argparse.ArgumentParser(description="新聞 / 電子報流程的統一入口")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    for name, (help_text, _) in COMMANDS.items():
+        sub.add_parser(name, help=help_text)
+    sub.add_parser("build", help=f"產生靜態檔：{' / '.join(BUILD_TARGETS)}（預設 {' '.join(DEFAULT_BUILD)}）")
+    args, rest = parser.parse_known_args()
+
+    for module, argv, trace in steps(args.cmd, rest):
+        run_module(module, argv, trace)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+import argparse
+import glob
+import hashlib
+import os
+import re
+
+import storage
+
+INDEX_DIR = os.path.join("data", "_index")
+INDEX_PATH = os.path.join(INDEX_DIR, "item_keys.tsv")
+
+# .json / .json.gz / .json.zst（見 storage.py），以及尚未 compact 的 .jsonl
+DAY_FILE_RE = re.compile(r"^(\d{4}-\d{2}-\d{2})\.json(?:l|\.gz|\.zst)?$")
+
+
+def key_digest(key: str) -> str:
+    """item_key 的 64-bit 摘要（16 個 hex 字元），比完整 URL 小很多，碰撞機率可忽略。"""
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+
+
+def day_files(data_dir="data"):
+    """data/ 底下所有日期的 YYYY-MM-DD.json 路徑（只有 .jsonl 尚未 compact 的也算），依日期排序。"""
+    days = set()
+    for p in glob.glob(os.path.join(data_dir, "*.json*")):
+        m = DAY_FILE_RE.match(os.path.basename(p))
+        if m:
+            days.add(m.group(1))
+    return [os.path.join(data_dir, f"{d}.json") for d in sorted(days)]
+
+
+def file_hash(path):
+    """
+    當日檔（含尚未 compact 的 .jsonl）的內容 hash，用來判斷哪些天有變動。
+    壓縮過的當日檔以 indent=2 的內容計算，換儲存格式不會改變 hash。
+    """
+    h = hashlib.sha1()
+    raw = storage.legacy_bytes(path)
+    if raw is not None:
+        h.update(raw)
+    log = os.path.splitext(path)[0] + ".jsonl"
+    if os.path.exists(log):
+        with open(log, "rb") as f:
+            h.update(f.read())
+    return h.hexdigest()[:16]
+
+
+class KeyIndex:
+    """
+    跨日去重索引：每行 `<digest>\\t<首次出現日期>`，只會 append。
+    載入後是 dict，查詢 O(1)；新 key 先暫存，flush() 時才寫檔。
+    """
+
+    def __init__(self, path=INDEX_PATH):
+        self.path = path
+        self.keys = {}
+        self._pending = []
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    digest, _, day = line.rstrip("\n").partition("\t")
+                    if digest:
+                        self.keys.setdefault(digest, day)
+
+    def __contains__(self, key):
+        return key_digest(key) in self.keys
+
+    def __len__(self):
+        return len(self.keys)
+
+    def first_seen(self, key):
+        return self.keys.get(key_digest(key))
+
+    def add(self, key, day):
+        digest = key_digest(key)
+        if digest not in self.keys:
+            self.keys[digest] = day
+            self._pending.append((digest, day))
+
+    def flush(self):
+        if not self._pending:
+            return 0
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.writelines(f"{d}\t{day}\n" for d, day in self._pending)
+        n = len(self._pending)
+        self._pending = []
+        return n
+
+
+def build_index(data_dir="data", path=INDEX_PATH):
+    """從頭掃過整個 data/ 重建索引（一次性，含 related 的轉載），同一 key 記錄最早出現的日期。"""
+    from store_news import all_keys, load_json
+
+    keys = {}
+    for p in day_files(data_dir):
+        day = os.path.basename(p)[:-len(".json")]
+        # 與 store_news 寫入時相同：併進 related 的轉載也要記，否則重建後它們又會被當成新文章
+        for key in all_keys(load_json(p)):
+            keys.setdefault(key_digest(key), day)
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.writelines(f"{d}\t{day}\n" for d, day in keys.items())
+    os.replace(tmp, path)
+    return len(keys)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="跨日去重索引")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    b = sub.add_parser("build", help="掃描整個 data/ 重建索引")
+    b.add_argument("--data-dir", default="data")
+    sub.add_parser("stats", help="顯示索引大小")
+    c = sub.add_parser("check", help="查詢某個 URL 是否已收錄")
+    c.add_argument("url")
+    args = parser.parse_args()
+
+    if args.cmd == "build":
+        n = build_index(args.data_dir)
+        print(f"✅ Indexed {n} keys to {INDEX_PATH}")
+    elif args.cmd == "stats":
+        idx = KeyIndex()
+        print(f"{len(idx)} keys, {os.path.getsize(INDEX_PATH) if os.path.exists(INDEX_PATH) else 0} bytes")
+    elif args.cmd == "check":
+        from store_news import item_key
+        day = KeyIndex().first_seen(item_key({"url": args.url}))
+        print(f"first seen: {day}" if day else "not indexed")
+
+
+if __name__ == "__main__":
+    main()
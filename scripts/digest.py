@@ -0,0 +1,414 @@
+import argparse
+import hashlib
+import json
+import os
+import re
+from datetime import date, datetime, timedelta
+
+import formatter
+import llm_pipeline
+import ranking
+import tracing
+from build_bundles import month_id, week_id
+from dedup_index import file_hash
+from store_news import TAIPEI, load_json
+
+DATA_DIR = "data"
+OUT_DIR = "eletters"
+# 每日結構化摘要（py_news.py 產生電子報時順便寫出）與週報 / 月報
+DIGEST_DIR = os.path.join(OUT_DIR, "digest")
+DAILY_DIR = os.path.join(DIGEST_DIR, "daily")
+MANIFEST_PATH = os.path.join(DIGEST_DIR, "manifest.json")
+# 擷取規則或欄位改變時 +1，舊的每日摘要會自動重建
+SCHEMA_VERSION = 1
+
+TOP_TOPICS = 12
+TOP_ENTITIES = 12
+TOP_CLUSTERS = 8
+TOP_HEADLINES = 10
+# prompt 放不下時逐級減少每天 / 每週列出的項目數
+DETAIL_LEVELS = (8, 6, 4, 3, 2, 1)
+
+LATIN_RE = re.compile(r"[A-Za-z][A-Za-z0-9]*(?:[-.][A-Za-z0-9]+)*")
+CJK_RUN_RE = re.compile(r"[㐀-䶿一-鿿]{2,}")
+SENTENCE_RE = re.compile(r"^.+?[。！？!?]")
+# 電子報裡不算重點的段落（結語、呼籲）
+SKIP_HEADLINE_RE = re.compile(r"總結|結論|結語|鼓勵|歡迎")
+# 幾乎每篇都有、或不具資訊量的詞
+STOP_ENTITIES = {"AI", "A", "The", "In", "On", "For", "And", "Of", "To", "With", "New"}
+STOP_PHRASES = {
+    "人工", "工智", "智慧", "人工智", "工智慧", "人工智慧", "推出", "宣布", "發表", "表示", "公司",
+    "全球", "今年", "成為", "可能", "最新", "進行", "持續", "透過", "以及", "發展", "技術", "應用",
+}
+# 以虛詞開頭或結尾的片段（「的關鍵」「來了」）不是詞
+EDGE_CHARS = set("的了嗎是在與和到讓將也就都被把等及為對從會有這那")
+
+WEEK_PROMPT = (
+    "你是一個專業的 AI 產業分析師。以下是 {label} 每天整理好的結構化重點"
+    "（當日主題、關鍵公司與技術、電子報重點、主要新聞與報導數），"
+    "請用繁體中文寫一份趨勢週報：先用一段話總結這段期間最重要的發展，"
+    "再用 ## 小標分 3 到 6 個主題說明事件脈絡、關鍵公司與數據，最後列出值得持續關注的事項。"
+    "不要寫大標題與開場白。"
+)
+MONTH_PROMPT = (
+    "你是一個專業的 AI 產業分析師。以下是 {label} 逐週彙整的結構化重點"
+    "（每週出現天數最多的主題、關鍵公司與技術、報導數最多的新聞），"
+    "請用繁體中文寫一份趨勢月報：先用一段話總結本月最重要的發展與變化，"
+    "再用 ## 小標分 3 到 6 個主題說明趨勢如何演變、關鍵公司與數據，最後列出下個月值得關注的事項。"
+    "不要寫大標題與開場白。"
+)
+
+
+def data_path(day: date) -> str:
+    return os.path.join(DATA_DIR, f"{day.isoformat()}.json")
+
+
+def newsletter_path(day: date) -> str:
+    return os.path.join(OUT_DIR, f"{day.isoformat()}.md")
+
+
+def daily_path(day: date) -> str:
+    return os.path.join(DAILY_DIR, f"{day.isoformat()}.json")
+
+
+def write_atomic(path, text):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+
+def _read_json(path, default):
+    if not os.path.exists(path):
+        return default
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _ranked(counts: dict, limit: int) -> list:
+    return [[t, c] for t, c in sorted(counts.items(), key=lambda kv: (-kv[1], -len(kv[0]), kv[0]))[:limit]]
+
+
+def key_entities(articles: list[dict], limit=TOP_ENTITIES) -> list:
+    """英文專有名詞（含大寫字母，例如 OpenAI、GPT-5），回傳 [[名稱, 出現篇數]]"""
+    df = {}
+    for a in articles:
+        text = f"{a.get('title') or ''} {a.get('summary') or ''}"
+        names = {m for m in LATIN_RE.findall(text) if len(m) > 1 and m not in STOP_ENTITIES and not m.islower()}
+        for name in names:
+            df[name] = df.get(name, 0) + 1
+    return _ranked({k: v for k, v in df.items() if v >= 2}, limit)
+
+
+def _cjk_terms(text: str) -> set:
+    terms = set()
+    for run in CJK_RUN_RE.findall(text):
+        for n in range(2, 5):
+            for i in range(len(run) - n + 1):
+                terms.add(run[i:i + n])
+    return terms
+
+
+def key_topics(articles: list[dict], limit=TOP_TOPICS) -> list:
+    """
+    標題裡重複出現的中文詞（2~4 字），回傳 [[詞, 出現篇數]]。
+    被較長的詞完全涵蓋（出現篇數相同）的子字串不列，例如「積電」併入「台積電」。
+    """
+    df = {}
+    for a in articles:
+        for t in _cjk_terms(a.get("title") or ""):
+            df[t] = df.get(t, 0) + 1
+    cands = {t: c for t, c in df.items()
+             if c >= 2 and t not in STOP_PHRASES and t[0] not in EDGE_CHARS and t[-1] not in EDGE_CHARS}
+    keep = {}
+    for t, c in cands.items():
+        if not any(len(u) > len(t) and t in u and cu >= c for u, cu in cands.items()):
+            keep[t] = c
+    return _ranked(keep, limit)
+
+
+def top_clusters(articles: list[dict], limit=TOP_CLUSTERS) -> list:
+    """挑選規則與電子報相同（相關度 + 來源多樣性）；size 是含轉載在內的報導數"""
+    out = []
+    for a in ranking.select_articles(articles, k=limit):
+        out.append({
+            "title": a["title"],
+            "source": a.get("source") or "",
+            "url": a.get("url") or "",
+            "size": 1 + len(a.get("related") or []),
+        })
+    out.sort(key=lambda c: -c["size"])
+    return out
+
+
+def headlines(md: str, limit=TOP_HEADLINES) -> list:
+    """
+    電子報的段落重點：小標（第一個大標題除外）或整行粗體，後面接下一段的第一句。
+    LLM 失敗時的退回內容沒有這種結構，自然取不到。
+    """
+    out, pending, seen_title = [], None, False
+    for kind, _, inline in formatter.tokenize(md or ""):
+        if inline is None:
+            continue
+        if kind == "heading" and not seen_title:
+            seen_title = True
+            continue
+        is_label = kind == "heading" or (kind == "text" and len(inline) == 1 and inline[0][0] == "strong")
+        if is_label:
+            if pending:
+                out.append(pending)
+            label = _plain(inline).strip().rstrip("：:")
+            pending = None if SKIP_HEADLINE_RE.search(label) else label
+        elif pending and kind == "text":
+            m = SENTENCE_RE.match(_plain(inline).strip())
+            out.append(f"{pending}：{m.group(0) if m else _plain(inline).strip()[:80]}")
+            pending = None
+        if len(out) >= limit:
+            break
+    if pending and len(out) < limit:
+        out.append(pending)
+    return out
+
+
+def _plain(nodes) -> str:
+    return "".join(n[1] if n[0] in ("text", "code") else _plain(n[1]) for n in nodes)
+
+
+def daily_input(day: date, md: str | None) -> str:
+    h = hashlib.sha1()
+    for part in (file_hash(data_path(day)), md or "", f"schema={SCHEMA_VERSION}"):
+        h.update(part.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()[:16]
+
+
+def summarize_day(day: date, md: str | None = None) -> dict:
+    """一天的結構化摘要：主題、關鍵名詞、主要新聞與電子報重點，只用規則擷取，不呼叫 LLM"""
+    articles = [a for a in load_json(data_path(day)) if a.get("title")]
+    return {
+        "date": day.isoformat(),
+        "input": daily_input(day, md),
+        "articles": len(articles) + sum(len(a.get("related") or []) for a in articles),
+        "sources": len({a.get("source") for a in articles if a.get("source")}),
+        "topics": key_topics(articles),
+        "entities": key_entities(articles),
+        "clusters": top_clusters(articles) if articles else [],
+        "headlines": headlines(md),
+    }
+
+
+def save_daily(summary: dict):
+    write_atomic(daily_path(date.fromisoformat(summary["date"])), json.dumps(summary, ensure_ascii=False, indent=1) + "\n")
+
+
+def write_daily(day: date, md: str | None = None) -> dict:
+    """py_news.py 產生電子報後呼叫；md 是剛寫出的電子報內容"""
+    summary = summarize_day(day, md)
+    save_daily(summary)
+    return summary
+
+
+def load_daily(day: date) -> dict | None:
+    """讀取每日摘要；沒有或已過期（資料、電子報或擷取規則變了）就從 data/ 與 eletters/ 重建。沒有資料的日子回傳 None"""
+    md = None
+    if os.path.exists(newsletter_path(day)):
+        with open(newsletter_path(day), "r", encoding="utf-8") as f:
+            md = f.read()
+    cached = _read_json(daily_path(day), None)
+    if cached and cached.get("input") == daily_input(day, md):
+        return cached
+    summary = summarize_day(day, md)
+    if not summary["articles"] and not summary["headlines"]:
+        return None
+    save_daily(summary)
+    return summary
+
+
+# ---- 週報 / 月報 ----
+
+def period_days(period: str) -> list[date]:
+    """2026-W42 -> 該 ISO 週的 7 天；2026-10 -> 該月每一天"""
+    if "-W" in period:
+        year, week = period.split("-W")
+        return [date.fromisocalendar(int(year), int(week), d) for d in range(1, 8)]
+    start = date.fromisoformat(period + "-01")
+    end = (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return [start + timedelta(days=i) for i in range((end - start).days)]
+
+
+def period_label(period: str) -> str:
+    days = period_days(period)
+    if "-W" in period:
+        return f"{days[0].strftime('%Y/%m/%d')}–{days[-1].strftime('%m/%d')}（第 {days[0].isocalendar()[1]} 週）"
+    return days[0].strftime("%Y年%m月")
+
+
+def aggregate(summaries: list[dict]) -> dict:
+    """多天合併：主題 / 名詞依出現天數排序（同天數再比篇數），新聞依報導數排序"""
+    out = {"days": len(summaries), "articles": sum(s["articles"] for s in summaries)}
+    for field, limit in (("topics", TOP_TOPICS), ("entities", TOP_ENTITIES)):
+        days, total = {}, {}
+        for s in summaries:
+            for term, n in s[field]:
+                days[term] = days.get(term, 0) + 1
+                total[term] = total.get(term, 0) + n
+        ranked = sorted(days, key=lambda t: (-days[t], -total[t], t))[:limit]
+        out[field] = [[t, days[t]] for t in ranked]
+    # 報導數相同時輪流取各天排名最前的新聞，不讓第一天佔滿
+    ranked = [(-c["size"], rank, s["date"], dict(c, date=s["date"]))
+              for s in summaries for rank, c in enumerate(s["clusters"])]
+    ranked.sort(key=lambda r: r[:3])
+    out["clusters"] = [r[3] for r in ranked[:TOP_CLUSTERS]]
+    return out
+
+
+def _names(pairs, n):
+    return "、".join(t for t, _ in pairs[:n])
+
+
+def format_day(s: dict, n: int) -> str:
+    lines = [f"### {s['date']}（{s['articles']} 篇，{s['sources']} 個來源）"]
+    if s["topics"]:
+        lines.append("主題：" + _names(s["topics"], n))
+    if s["entities"]:
+        lines.append("關鍵：" + _names(s["entities"], n))
+    lines += [f"- 重點｜{h}" for h in s["headlines"][:n]]
+    lines += [f"- 新聞｜{c['title']}（{c['source']}，{c['size']} 則報導）" for c in s["clusters"][:n]]
+    return "\n".join(lines)
+
+
+def format_week(week: str, agg: dict, n: int) -> str:
+    lines = [f"### {period_label(week)}（{agg['days']} 天，{agg['articles']} 篇）"]
+    if agg["topics"]:
+        lines.append("主題：" + _names(agg["topics"], n))
+    if agg["entities"]:
+        lines.append("關鍵：" + _names(agg["entities"], n))
+    lines += [f"- 新聞｜{c['date']} {c['title']}（{c['source']}，{c['size']} 則報導）" for c in agg["clusters"][:n]]
+    return "\n".join(lines)
+
+
+def build_prompt(period: str, summaries: list[dict]) -> str:
+    """
+    週報：逐日列出每日摘要；月報：先把每日摘要依週合併，再逐週列出。
+    兩者長度都與期間內的原始文章數無關；超過 TOKEN_BUDGET 時逐級減少每段列出的項目數。
+    """
+    label = period_label(period)
+    if "-W" in period:
+        header = WEEK_PROMPT.format(label=label)
+        sections = lambda n: [format_day(s, n) for s in summaries]  # noqa: E731
+    else:
+        header = MONTH_PROMPT.format(label=label)
+        weeks = {}
+        for s in summaries:
+            weeks.setdefault(week_id(date.fromisoformat(s["date"])), []).append(s)
+        sections = lambda n: [format_week(w, aggregate(ss), n) for w, ss in sorted(weeks.items())]  # noqa: E731
+    for n in DETAIL_LEVELS:
+        prompt = header + "\n\n" + "\n\n".join(sections(n))
+        if llm_pipeline.estimate_tokens(prompt) <= llm_pipeline.TOKEN_BUDGET:
+            break
+    return prompt
+
+
+def fallback(period: str, summaries: list[dict], error) -> str:
+    """LLM 失敗時至少留下規則擷取的重點"""
+    agg = aggregate(summaries)
+    lines = [f"抱歉，由於 LLM 推論失敗，未能生成完整的報告。錯誤訊息：{error}", ""]
+    if agg["topics"]:
+        lines.append("**主題**：" + _names(agg["topics"], TOP_TOPICS))
+    if agg["entities"]:
+        lines.append("**關鍵**：" + _names(agg["entities"], TOP_ENTITIES))
+    lines.append("")
+    lines += [f"- {c['date']} [{c['title']}]({c['url']})（{c['source']}）" for c in agg["clusters"]]
+    return "\n".join(lines) + "\n"
+
+
+def digest_path(period: str) -> str:
+    return os.path.join(DIGEST_DIR, f"{period}.md")
+
+
+def build_period(period: str, complete=None, force=False, today=None) -> tuple[str, bool]:
+    """
+    產生一份週報 / 月報，回傳 (檔案路徑, 是否重新產生)。
+    prompt 只由每日摘要組成，每日摘要沒變（prompt hash 相同）就不再呼叫 LLM。
+    """
+    complete = complete or llm_pipeline.default_complete
+    today = today or datetime.now(TAIPEI).date()
+    summaries = [s for s in (load_daily(d) for d in period_days(period) if d <= today) if s]
+    prompt = build_prompt(period, summaries)
+    input_hash = hashlib.sha1(f"{llm_pipeline.MODEL}\0{prompt}".encode("utf-8")).hexdigest()[:16]
+
+    manifest = _read_json(MANIFEST_PATH, {})
+    entry = manifest.get(period, {})
+    path = digest_path(period)
+    if not force and entry.get("ok") and entry.get("input") == input_hash and os.path.exists(path):
+        return path, False
+
+    kind = "週報" if "-W" in period else "月報"
+    title = f"# {period_label(period)} AI 趨勢{kind}\n\n"
+    with tracing.span("digest", period=period, days=len(summaries),
+                      prompt_tokens=llm_pipeline.estimate_tokens(prompt)) as sp:
+        if not summaries:
+            content, ok = title + "這段期間沒有資料。\n", True
+        else:
+            try:
+                content, ok = title + complete(prompt).strip() + "\n", True
+            except Exception as e:
+                print(f"Error during LLM inference for {period}: {e}")
+                content, ok = title + fallback(period, summaries, e), False
+        sp.set(ok=ok)
+    write_atomic(path, content)
+    manifest = _read_json(MANIFEST_PATH, {})
+    manifest[period] = {"input": input_hash, "ok": ok, "days": len(summaries),
+                        "generated_at": datetime.now(TAIPEI).isoformat(timespec="seconds")}
+    write_atomic(MANIFEST_PATH, json.dumps(manifest, ensure_ascii=False, indent=2, sort_keys=True))
+    return path, True
+
+
+def completed_periods(start: date, today: date) -> list[str]:
+    """start 之後、今天之前已經結束的週與月"""
+    periods = []
+    d = start
+    while d < today:
+        for pid in (week_id(d), month_id(d)):
+            if pid not in periods and period_days(pid)[-1] < today:
+                periods.append(pid)
+        d += timedelta(days=1)
+    return periods
+
+
+def main():
+    parser = argparse.ArgumentParser(description="每日結構化摘要與週報 / 月報")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    d = sub.add_parser("daily", help="補齊或更新每日摘要（不呼叫 LLM）")
+    d.add_argument("--from", dest="date_from", help="YYYY-MM-DD（預設今天）")
+    d.add_argument("--to", dest="date_to", help="YYYY-MM-DD（預設今天）")
+    b = sub.add_parser("build", help="產生週報 / 月報；沒指定時產生上一個完整的週與月（沒變就略過）")
+    b.add_argument("period", nargs="*", help="例如 2026-W42、2026-10")
+    b.add_argument("--from", dest="date_from", help="產生這天之後所有已結束的週與月")
+    b.add_argument("--force", action="store_true", help="不檢查是否最新，重新呼叫 LLM")
+    args = parser.parse_args()
+
+    today = datetime.now(TAIPEI).date()
+    if args.cmd == "daily":
+        start = date.fromisoformat(args.date_from) if args.date_from else today
+        end = date.fromisoformat(args.date_to) if args.date_to else today
+        n = sum(1 for i in range((end - start).days + 1) if load_daily(start + timedelta(days=i)))
+        print(f"✅ {n} daily summaries up to date in {DAILY_DIR}")
+    else:
+        if args.period:
+            periods = args.period
+        elif args.date_from:
+            periods = completed_periods(date.fromisoformat(args.date_from), today)
+        else:
+            # 上一個完整的週（到上週日）與上一個完整的月
+            periods = [week_id(today - timedelta(days=today.isoweekday())),
+                       month_id(today.replace(day=1) - timedelta(days=1))]
+        with tracing.run("digest"):
+            for pid in periods:
+                path, built = build_period(pid, force=args.force, today=today)
+                print(f"{'✅ Generated' if built else 'Up to date'}: {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,398 @@
+import argparse
+import hashlib
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import tracing
+from bench import HOSTS, SOURCES, CJK_WORDS, git_commit, synth_markdown, synth_title
+from watermark import TAIPEI
+
+# 整條流程（fetch -> store -> generate -> build -> publish）在暫存工作區離線跑一遍：
+# SerpAPI、LLM、Graph API 都換成本機的替身服務，可調延遲、錯誤率與回應大小
+OUT_DIR = "tmp/e2e"
+STAGES = ["fetch", "store", "generate", "build", "publish"]
+# cli.py 的參數；digest 不在預設流程裡（要有完整的一週才會產生週報）
+STAGE_ARGS = {"digest": ["digest", "build"]}
+# 各階段以哪個 span 的 items 當處理筆數（吞吐量的分子）
+ITEM_SPANS = {"fetch": "fetch", "store": "load_batch", "generate": "load", "publish": "publish"}
+# 複製到工作區時略過的檔案（快取、trace、發文佇列都從空的開始）
+IGNORE = shutil.ignore_patterns(".git", "tmp", "__pycache__", "node_modules")
+
+# 各替身的預設值；size 的意義：serp 每頁幾則、llm 回應約幾個字元、graph 回應多塞幾 bytes
+DEFAULTS = {
+    "serp": {"latency_ms": 300, "error_rate": 0.0, "size": 10},
+    "llm": {"latency_ms": 2000, "error_rate": 0.0, "size": 3000},
+    "graph": {"latency_ms": 300, "error_rate": 0.0, "size": 0},
+}
+# synth_markdown 每個段落約 350 字元
+MD_SECTION_CHARS = 350
+# 退避與等待縮短，注入錯誤時不必真的等幾十秒；可用 --env 或環境變數覆寫
+FAST_RETRY_ENV = {
+    "LLM_BACKOFF": "0.5",
+    "PUBLISH_BACKOFF": "0.5",
+    "PUBLISH_MIN_INTERVAL": "0",
+    "PUBLISH_MAX_WAIT": "30",
+    # py_news 用台北日期寫電子報、post_to_facebook 用本機日期找檔案，時區不同時跨日會找不到
+    "TZ": "Asia/Taipei",
+}
+PAGE_ID = "e2e-page"
+
+
+class Stub:
+    """一個替身服務：設定加上請求數 / 注入的錯誤數 / 回應 bytes 的累計（thread-safe）"""
+
+    def __init__(self, name, latency_ms=0, error_rate=0.0, size=0, jitter=0.2, seed=0):
+        self.name = name
+        self.latency_ms = latency_ms
+        self.error_rate = error_rate
+        self.size = size
+        self.jitter = jitter
+        self.requests = self.errors = self.bytes = 0
+        self._lock = threading.Lock()
+        self._rng = random.Random(seed)
+
+    def config(self):
+        return {"latency_ms": self.latency_ms, "error_rate": self.error_rate, "size": self.size, "jitter": self.jitter}
+
+    def begin(self):
+        """等待模擬的延遲，回傳這次要不要失敗"""
+        with self._lock:
+            delay = self.latency_ms * (1 + self._rng.uniform(-self.jitter, self.jitter)) / 1000
+            fail = self._rng.random() < self.error_rate
+        if delay > 0:
+            time.sleep(delay)
+        return fail
+
+    def record(self, nbytes, failed):
+        with self._lock:
+            self.requests += 1
+            self.errors += failed
+            self.bytes += nbytes
+
+    def stats(self):
+        with self._lock:
+            return {"requests": self.requests, "errors": self.errors, "bytes": self.bytes}
+
+
+def _seed(*parts):
+    return int(hashlib.sha1("|".join(map(str, parts)).encode("utf-8")).hexdigest()[:12], 16)
+
+
+def serp_results(params, size, pages):
+    """
+    Google News 格式的假結果；同一個查詢與頁數每次都回一樣的新聞（重跑時由 store_news 去重），
+    發布時間落在最近 20 小時內（UTC，與 SerpAPI 相同的字串格式）。
+    """
+    q, gl = params.get("q", ""), params.get("gl", "")
+    start = int(params.get("start", 0) or 0)
+    rng = random.Random(_seed(q, gl, start))
+    now = datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0)
+    news = []
+    for i in range(size):
+        n = start + i
+        published = now - timedelta(minutes=rng.randint(0, 20 * 60))
+        news.append({
+            "position": n + 1,
+            "title": synth_title(rng),
+            "link": f"https://{rng.choice(HOSTS)}/e2e/{gl}/{_seed(q, n) % 10 ** 8}",
+            "source": rng.choice(SOURCES),
+            "snippet": "".join(rng.choice(CJK_WORDS) for _ in range(rng.randint(15, 40))) + "...",
+            "published_at": published.strftime("%Y-%m-%d %H:%M:%S UTC"),
+        })
+    res = {"search_metadata": {"status": "Success"}, "news_results": news}
+    if start // max(size, 1) + 1 < pages:
+        res["serpapi_pagination"] = {"next": f"start={start + size}"}
+    return res
+
+
+def make_handler(stubs, serp_pages, posts):
+    """路徑前綴分派：/serp/search、/llm/chat/completions、/graph/<page>/feed|posts"""
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def reply(self, stub, status, body, failed=False, headers=None):
+            payload = json.dumps(body, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(payload)))
+            for k, v in (headers or {}).items():
+                self.send_header(k, v)
+            self.end_headers()
+            self.wfile.write(payload)
+            stub.record(len(payload), failed)
+
+        def body(self):
+            n = int(self.headers.get("Content-Length") or 0)
+            return self.rfile.read(n) if n else b""
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            if url.path == "/serp/search":
+                stub = stubs["serp"]
+                if stub.begin():
+                    return self.reply(stub, 500, {"error": "e2e: injected failure"}, failed=True)
+                params = {k: v[0] for k, v in parse_qs(url.query).items()}
+                return self.reply(stub, 200, serp_results(params, stub.size, serp_pages))
+            if url.path.startswith("/graph/") and url.path.endswith("/posts"):
+                return self.graph(lambda: {"data": list(reversed(posts))})
+            self.send_error(404)
+
+        def do_POST(self):
+            url = urlparse(self.path)
+            raw = self.body()
+            if url.path == "/llm/chat/completions":
+                stub = stubs["llm"]
+                if stub.begin():
+                    return self.reply(stub, 500, {"error": {"message": "e2e: injected failure"}}, failed=True)
+                prompt = json.loads(raw)["messages"][-1]["content"]
+                md = synth_markdown(max(round(stub.size / MD_SECTION_CHARS), 1), seed=_seed(prompt))
+                return self.reply(stub, 200, {"object": "chat.completion",
+                                              "choices": [{"index": 0, "message": {"role": "assistant", "content": md}}]})
+            if url.path.startswith("/graph/") and url.path.endswith("/feed"):
+                page = url.path.split("/")[2]
+                message = parse_qs(raw.decode("utf-8")).get("message", [""])[0]
+
+                def post():
+                    post_id = f"{page}_{len(posts) + 1}"
+                    posts.append({"id": post_id, "message": message,
+                                  "created_time": datetime.now(timezone.utc).isoformat(timespec="seconds")})
+                    return {"id": post_id}
+
+                return self.graph(post)
+            self.send_error(404)
+
+        def graph(self, respond):
+            stub = stubs["graph"]
+            usage = {"X-App-Usage": json.dumps({"call_count": 1, "total_time": 1, "total_cputime": 1})}
+            if stub.begin():
+                return self.reply(stub, 500, {"error": {"message": "e2e: injected failure", "code": 2,
+                                                        "is_transient": True}}, failed=True, headers=usage)
+            body = respond()
+            if stub.size:
+                body["e2e_padding"] = "x" * stub.size
+            self.reply(stub, 200, body, headers=usage)
+
+    return Handler
+
+
+def serve(stubs, serp_pages=3, port=0):
+    """在背景執行緒啟動替身服務，回傳 (server, base_url, 已發出的貼文列表)"""
+    posts = []
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(stubs, serp_pages, posts))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}", posts
+
+
+def stub_env(base):
+    """讓各腳本改連替身服務的環境變數"""
+    return {
+        "SERP_URL": f"{base}/serp/search",
+        "SERA_TOKEN": "e2e",
+        "LLM_BASE_URL": f"{base}/llm",
+        "FB_GRAPH_URL": f"{base}/graph",
+        "FB_PAGE_ID": PAGE_ID,
+        "FB_ACCESS_TOKEN": "e2e",
+    }
+
+
+def make_workspace(src):
+    """把 repo 複製到暫存目錄（不含 .git 與 tmp/），各腳本在裡面用相對路徑讀寫"""
+    workdir = tempfile.mkdtemp(prefix="news-e2e-")
+    shutil.copytree(src, workdir, ignore=IGNORE, dirs_exist_ok=True)
+    return workdir
+
+
+def trace_summary(trace_dir, item_span=None):
+    """這個階段的 trace：處理筆數（item_span 的 items 合計，沒有 items 的 span 算 1 筆）與各外部呼叫的延遲"""
+    items, latencies, failed = None, {}, {}
+    for records in tracing.read_runs(trace_dir).values():
+        for r in records:
+            if r["type"] == "span" and r["name"] == item_span:
+                items = (items or 0) + r.get("counters", {}).get("items", 1)
+            elif r["type"] == "call":
+                latencies.setdefault(r["service"], []).append(r["latency_ms"])
+                failed[r["service"]] = failed.get(r["service"], 0) + ("error" in r)
+    calls = {
+        service: {"calls": len(lat), "errors": failed[service], "p50_ms": round(tracing.percentile(lat, 50), 1),
+                  "p90_ms": round(tracing.percentile(lat, 90), 1), "max_ms": round(max(lat), 1)}
+        for service, lat in sorted(latencies.items())
+    }
+    return items, calls
+
+
+def run_stage(workdir, stage, env, trace_dir, log):
+    argv = STAGE_ARGS.get(stage, [stage])
+    log.write(f"\n===== {' '.join(argv)} =====\n")
+    log.flush()
+    t0 = time.perf_counter()
+    proc = subprocess.run([sys.executable, os.path.join("scripts", "cli.py"), *argv], cwd=workdir,
+                          env={**env, "TRACE_DIR": trace_dir}, stdout=log, stderr=subprocess.STDOUT)
+    seconds = time.perf_counter() - t0
+    items, calls = trace_summary(trace_dir, ITEM_SPANS.get(stage))
+    return {
+        "stage": stage,
+        "exit": proc.returncode,
+        "seconds": round(seconds, 3),
+        "items": items,
+        "per_second": round(items / seconds, 1) if items and seconds else None,
+        "calls": calls,
+    }
+
+
+def stub_delta(before, after):
+    return {name: {k: after[name][k] - before[name][k] for k in after[name]} for name in after}
+
+
+def print_row(row):
+    calls = "  ".join(f"{s} {c['calls']}x p50 {c['p50_ms']:.0f} p90 {c['p90_ms']:.0f}"
+                      + (f" err {c['errors']}" if c["errors"] else "") for s, c in row["calls"].items())
+    items = "" if row["items"] is None else row["items"]
+    rate = "" if row["per_second"] is None else f"{row['per_second']}/s"
+    # 注入的錯誤以替身端的計數為準（Graph API 的錯誤回應在 tracing.external 裡不算例外）
+    injected = ", ".join(f"{name} {d['errors']}" for name, d in row["stubs"].items() if d["errors"])
+    flag = f"  injected errors: {injected}" if injected else ""
+    if row["exit"]:
+        flag += f"  <- exit {row['exit']}"
+    print(f"{row['stage']:<10} {row['seconds'] * 1000:>10.0f} ms {items:>7} {rate:>10}  {calls}{flag}")
+
+
+def run(stubs, stages=None, rounds=2, serp_pages=3, cold=False, extra_env=None, keep=False, src="."):
+    """
+    在同一個工作區把流程跑 rounds 次：第 1 輪是冷啟動，之後各輪量快取、水位與去重生效後的增量路徑
+    （cold=True 時每輪開始前清掉 SerpAPI / LLM 快取）。
+    """
+    stages = stages or STAGES
+    server, base, posts = serve(stubs, serp_pages)
+    workdir = make_workspace(src)
+    env = {**os.environ, **stub_env(base), "TRACE": "1"}
+    for k, v in FAST_RETRY_ENV.items():
+        env.setdefault(k, v)
+    env.update(extra_env or {})
+    result = {
+        "commit": git_commit(),
+        "run_at": datetime.now(TAIPEI).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "stubs": {name: stub.config() for name, stub in stubs.items()},
+        "serp_pages": serp_pages,
+        "env": {k: env[k] for k in sorted(set(FAST_RETRY_ENV) | set(extra_env or {}))},
+        "workdir": workdir,
+        "rounds": [],
+    }
+    log_path = os.path.join(workdir, "tmp", "e2e.log")
+    os.makedirs(os.path.dirname(log_path), exist_ok=True)
+    try:
+        with open(log_path, "a", encoding="utf-8") as log:
+            for n in range(1, rounds + 1):
+                if cold:
+                    for cache in ("serp_cache", "llm_cache"):
+                        shutil.rmtree(os.path.join(workdir, "tmp", cache), ignore_errors=True)
+                print(f"--- round {n}{' (cold cache)' if cold or n == 1 else ''} ---")
+                rows, t0 = [], time.perf_counter()
+                for stage in stages:
+                    before = {name: stub.stats() for name, stub in stubs.items()}
+                    row = run_stage(workdir, stage, env, os.path.join(workdir, "tmp", "e2e-traces", f"{n}-{stage}"), log)
+                    row["stubs"] = stub_delta(before, {name: stub.stats() for name, stub in stubs.items()})
+                    rows.append(row)
+                    print_row(row)
+                total = time.perf_counter() - t0
+                print(f"{'total':<10} {total * 1000:>10.0f} ms")
+                result["rounds"].append({"round": n, "seconds": round(total, 3), "stages": rows})
+        result["stub_totals"] = {name: stub.stats() for name, stub in stubs.items()}
+        result["posts"] = len(posts)
+    finally:
+        server.shutdown()
+        server.server_close()
+        if keep:
+            print(f"Workspace kept at {workdir} (log: {log_path})")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+    return result
+
+
+def build_stubs(args):
+    return {
+        name: Stub(name, latency_ms=getattr(args, f"{name}_latency"), error_rate=getattr(args, f"{name}_error_rate"),
+                   size=getattr(args, f"{name}_size"), jitter=args.jitter, seed=args.seed)
+        for name in DEFAULTS
+    }
+
+
+def parse_env(pairs):
+    env = {}
+    for pair in pairs or []:
+        key, sep, value = pair.partition("=")
+        if not sep:
+            raise SystemExit(f"--env expects KEY=VALUE, got {pair!r}")
+        env[key] = value
+    return env
+
+
+def main():
+    parser = argparse.ArgumentParser(description="整條流程的離線端對端測試（本機替身取代 SerpAPI / LLM / Graph API）")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    r = sub.add_parser("run", help="在暫存工作區跑 cli.py 各階段，回報各階段耗時與吞吐量")
+    s = sub.add_parser("serve", help="只啟動替身服務並印出環境變數，手動跑腳本用")
+    for p in (r, s):
+        for name, d in DEFAULTS.items():
+            p.add_argument(f"--{name}-latency", type=float, default=d["latency_ms"], help=f"{name} 延遲（毫秒）")
+            p.add_argument(f"--{name}-error-rate", type=float, default=d["error_rate"], help=f"{name} 失敗比例 0~1")
+            p.add_argument(f"--{name}-size", type=int, default=d["size"], help=f"{name} 回應大小（預設 {d['size']}）")
+        p.add_argument("--serp-pages", type=int, default=3, help="每個查詢有幾頁結果")
+        p.add_argument("--jitter", type=float, default=0.2, help="延遲的隨機浮動比例")
+        p.add_argument("--seed", type=int, default=0)
+    r.add_argument("--stage", action="append", choices=STAGES + list(STAGE_ARGS),
+                   help=f"只跑指定階段，可重複（預設 {' '.join(STAGES)}）")
+    r.add_argument("--rounds", type=int, default=2, help="同一個工作區跑幾輪（第 2 輪起是增量 / 快取路徑）")
+    r.add_argument("--cold", action="store_true", help="每輪開始前清掉 SerpAPI / LLM 快取")
+    r.add_argument("--env", action="append", metavar="KEY=VALUE",
+                   help="傳給各腳本的環境變數，例如 NEWS_CONCURRENCY=8、LLM_CONCURRENCY=2")
+    r.add_argument("--keep", action="store_true", help="保留工作區與執行紀錄")
+    r.add_argument("--out", help=f"結果檔（預設 {OUT_DIR}/<commit>-<時間>.json）")
+    s.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    stubs = build_stubs(args)
+    if args.cmd == "serve":
+        server, base, posts = serve(stubs, args.serp_pages, args.port)
+        for k, v in stub_env(base).items():
+            print(f"export {k}={v}")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.shutdown()
+            print(json.dumps({name: stub.stats() for name, stub in stubs.items()}, indent=2))
+        return
+
+    result = run(stubs, args.stage, args.rounds, args.serp_pages, args.cold, parse_env(args.env), args.keep)
+    out = args.out or os.path.join(
+        OUT_DIR, f"{result['commit'] or 'nogit'}-{datetime.now(TAIPEI).strftime('%Y%m%d%H%M%S')}.json")
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+    print(f"Results saved to {out}")
+    if any(row["exit"] for rnd in result["rounds"] for row in rnd["stages"]):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,362 @@
+import argparse
+import html
+import re
+import sys
+
+# 電子報 Markdown 的共用轉換，各種輸出都只掃過文件一次
+#   facebook：Facebook 貼文純文字（Unicode 粗體 / 斜體，取代原本 post_to_facebook 的多次 re.sub）
+#   html：一般 HTML（取代 enews.yml 裡的 python -c "import markdown..."）
+#   email：HTML，但樣式全部寫在 style 屬性裡（郵件軟體多半會拿掉 <style>）
+
+TARGETS = ("facebook", "html", "email")
+
+# --- Unicode 轉換表（import 時建一次）---
+ASCII = "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789"
+# 粗體 (Mathematical Bold)
+BOLD_CHARS = "𝐀𝐁𝐂𝐃𝐄𝐅𝐆𝐇𝐈𝐉𝐊𝐋𝐌𝐍𝐎𝐏𝐐𝐑𝐒𝐓𝐔𝐕𝐖𝐗𝐘𝐙𝐚𝐛𝐜𝐝𝐞𝐟𝐠𝐡𝐢𝐣𝐤𝐥𝐦𝐧𝐨𝐩𝐪𝐫𝐬𝐭𝐮𝐯𝐰𝐱𝐲𝐳𝟎𝟏𝟐𝟑𝟒𝟓𝟔𝟕𝟖𝟗"
+# 斜體 (Mathematical Italic，h 在 Unicode 裡是 ℎ；沒有斜體數字)
+ITALIC_CHARS = "𝐴𝐵𝐶𝐷𝐸𝐹𝐺𝐻𝐼𝐽𝐾𝐿𝑀𝑁𝑂𝑃𝑄𝑅𝑆𝑇𝑈𝑉𝑊𝑋𝑌𝑍𝑎𝑏𝑐𝑑𝑒𝑓𝑔ℎ𝑖𝑗𝑘𝑙𝑚𝑛𝑜𝑝𝑞𝑟𝑠𝑡𝑢𝑣𝑤𝑥𝑦𝑧0123456789"
+# 粗斜體 (Mathematical Bold Italic)，粗體裡的斜體用
+BOLD_ITALIC_CHARS = "𝑨𝑩𝑪𝑫𝑬𝑭𝑮𝑯𝑰𝑱𝑲𝑳𝑴𝑵𝑶𝑷𝑸𝑹𝑺𝑻𝑼𝑽𝑾𝑿𝒀𝒁𝒂𝒃𝒄𝒅𝒆𝒇𝒈𝒉𝒊𝒋𝒌𝒍𝒎𝒏𝒐𝒑𝒒𝒓𝒔𝒕𝒖𝒗𝒘𝒙𝒚𝒛𝟎𝟏𝟐𝟑𝟒𝟓𝟔𝟕𝟖𝟗"
+# 樣式以位元表示，TABLES[styles & 3] 即該用的轉換表
+STRONG, EM, DEL = 1, 2, 4
+STYLE_BITS = {"strong": STRONG, "em": EM, "del": DEL}
+TABLES = [
+    None,
+    str.maketrans(ASCII, BOLD_CHARS),
+    str.maketrans(ASCII, ITALIC_CHARS),
+    str.maketrans(ASCII, BOLD_ITALIC_CHARS),
+]
+# 刪除線
+STRIKE = "\u0336"
+
+HEADER_ICONS = {1: "📢", 2: "📌", 3: "🔹"}
+BLANK_LINES_RE = re.compile(r"\n{3,}")
+
+# --- 區塊（html / email 用，一行一個 token）---
+# 開頭不是這些字元的行一定是一般文字
+BLOCK_START = frozenset("#-*+>`0123456789 \t")
+FENCE_RE = re.compile(r"^\s*```")
+BLOCK_RE = re.compile(
+    r"(?P<fence>^\s*```)"
+    r"|(?P<heading>^(?P<hashes>#{1,6})\s+(?P<htext>.*?)\s*#*\s*$)"
+    r"|(?P<hr>^\s{0,3}(?:-\s*){3,}$|^\s{0,3}(?:\*\s*){3,}$)"
+    r"|(?P<bullet>^(?P<bindent>\s*)[-*+]\s+(?P<btext>.*)$)"
+    r"|(?P<ordered>^(?P<oindent>\s*)(?P<num>\d+)\.\s+(?P<otext>.*)$)"
+    r"|(?P<quote>^\s*>\s?(?P<qtext>.*)$)"
+    r"|(?P<blank>^\s*$)"
+)
+
+# --- 行內（一次掃過，內層再遞迴）---
+INLINE_HINT = re.compile(r"[`\[*_~]")
+INLINE_KINDS = {"stext": "strong", "etext": "em", "dtext": "del"}
+INLINE_PATTERN = (
+    r"(?P<code>`+)(?P<ctext>.+?)(?P=code)"
+    r"|\[(?P<ltext>(?:[^\[\]\n]|\[[^\]\n]*\])*)\]\((?P<url>[^)\s]*)(?:[ \t]+\"[^\"\n]*\")?\)"
+    r"|(?P<strong>\*\*|(?<!\w)__)(?=[^\s*_])(?P<stext>.+?)(?<=[^\s*_])(?P=strong)"
+    r"|(?P<em>\*|(?<!\w)_)(?=[^\s*_])(?P<etext>.+?)(?<=[^\s*_])(?P=em)(?!\w)"
+    r"|~~(?=\S)(?P<dtext>.+?)(?<=\S)~~"
+)
+# 先用字元類別跳過一般文字，只在可能是標記的位置嘗試各種規則
+INLINE_RE = re.compile(r"(?=[`\[*_~])(?:" + INLINE_PATTERN + ")")
+
+# Facebook 輸出不需要文件結構，整份文件用一個 regex 掃一次：
+# 行首（換行之後）的標題 / 分隔線 / 清單符號，加上行內標記；沒比對到的文字由 re.sub 直接複製。
+# 行首規則以換行字元開頭而不用 ^，regex 才能用開頭字元快速跳過一般文字
+FB_RE = re.compile(
+    r"(?=[\n`\[*_~])(?:\n(?:"
+    r"(?P<hashes>#{1,6})[ \t]+(?P<htext>[^\n]*?)[ \t#]*$"
+    r"|(?P<hr>[ \t]{0,3}(?:[-*][ \t]*){3,})$"
+    r"|[ \t]*(?P<bullet>[-*+])[ \t]+"
+    r"|[ \t]*(?P<ordered>\d+)\.[ \t]+"
+    r")|" + INLINE_PATTERN + ")",
+    re.MULTILINE,
+)
+
+
+def parse_inline(text: str) -> list:
+    """行內節點：("text", s) ("code", s) ("link", children, url) ("strong"/"em"/"del", children)"""
+    if not INLINE_HINT.search(text):
+        return [("text", text)]
+    nodes, pos = [], 0
+    for m in INLINE_RE.finditer(text):
+        start = m.start()
+        if start > pos:
+            nodes.append(("text", text[pos:start]))
+        # 各規則最後一個群組名稱都不同，用 lastgroup 判斷是哪一種
+        group = m.lastgroup
+        if group == "ctext":
+            nodes.append(("code", m[group]))
+        elif group == "url":
+            nodes.append(("link", parse_inline(m["ltext"]), m[group]))
+        else:
+            nodes.append((INLINE_KINDS[group], parse_inline(m[group])))
+        pos = m.end()
+    if pos < len(text):
+        nodes.append(("text", text[pos:]))
+    return nodes
+
+
+def tokenize(md: str) -> list[tuple]:
+    """
+    一行一個 token：(kind, arg, inline)
+      heading：arg 為層級；bullet / ordered：arg 為縮排；hr / code：arg 為原始行；quote / text：arg 為 None
+    """
+    tokens = []
+    in_code = False
+    for line in md.replace("\r\n", "\n").split("\n"):
+        if in_code:
+            if FENCE_RE.match(line):
+                in_code = False
+            else:
+                tokens.append(("code", line, None))
+            continue
+        if not line or line[0] not in BLOCK_START:
+            # 大部分的行：一般文字，不必跑區塊規則
+            if line:
+                tokens.append(("text", None, parse_inline(line)))
+            else:
+                tokens.append(("blank", None, None))
+            continue
+        m = BLOCK_RE.match(line)
+        kind = m.lastgroup if m else "text"
+        if kind == "fence":
+            in_code = True
+        elif kind == "heading":
+            tokens.append(("heading", len(m.group("hashes")), parse_inline(m.group("htext"))))
+        elif kind == "hr":
+            tokens.append(("hr", line.rstrip(), None))
+        elif kind == "bullet":
+            tokens.append(("bullet", len(m.group("bindent").expandtabs(4)), parse_inline(m.group("btext"))))
+        elif kind == "ordered":
+            tokens.append(("ordered", len(m.group("oindent").expandtabs(4)), parse_inline(m.group("otext"))))
+        elif kind == "quote":
+            tokens.append(("quote", None, parse_inline(m.group("qtext"))))
+        elif kind == "blank":
+            tokens.append(("blank", None, None))
+        else:
+            tokens.append(("text", None, parse_inline(line)))
+    return tokens
+
+
+# --- Facebook ---
+
+def _fb_text(s, styles, upper=False):
+    if upper:
+        s = s.upper()
+    table = TABLES[styles & 3]
+    if table:
+        s = s.translate(table)
+    if styles & DEL:
+        s = "".join(c + STRIKE for c in s)
+    return s
+
+
+def _fb_inline(nodes, styles=0, upper=False) -> str:
+    out = []
+    for node in nodes:
+        kind = node[0]
+        if kind == "text":
+            out.append(_fb_text(node[1], styles, upper))
+        elif kind == "code":
+            # FB 沒有等寬字，保留反引號
+            out.append(f"`{node[1]}`")
+        elif kind == "link":
+            # FB 會自動抓連結預覽，文字格式改成「文字: 網址」
+            out.append(f"{_fb_inline(node[1], styles, upper)}: {node[2]}")
+        else:
+            out.append(_fb_inline(node[1], styles | STYLE_BITS[kind], upper))
+    return "".join(out)
+
+
+def _fb_span(text, styles, upper=False) -> str:
+    # 常見情況是 **標題** 裡沒有其它標記，直接轉換；有巢狀標記才建節點
+    if not INLINE_HINT.search(text):
+        return _fb_text(text, styles, upper)
+    return _fb_inline(parse_inline(text), styles, upper)
+
+
+def _fb_replace(m) -> str:
+    group = m.lastgroup
+    if group == "htext":
+        # FB 不支援大字體，所以用粗體 + Emoji 裝飾；標題通常大寫較顯眼
+        icon = HEADER_ICONS.get(len(m["hashes"]), "▪️")
+        return f"\n\n{icon} {_fb_span(m[group], STRONG, upper=True)}\n"
+    if group == "bullet":
+        return "\n✅ "
+    if group == "ordered":
+        return "\n➔ "
+    if group == "hr":
+        return m[0].rstrip()
+    if group == "ctext":
+        return f"`{m[group]}`"
+    if group == "url":
+        return f"{_fb_span(m['ltext'], 0)}: {m[group]}"
+    return _fb_span(m[group], STYLE_BITS[INLINE_KINDS[group]])
+
+
+def to_facebook(md: str) -> str:
+    """
+    將 Markdown 轉換為適合 Facebook 發文的格式
+    利用 Unicode 字符模擬粗體、斜體，並優化結構。
+    """
+    # 前面補一個換行，第一行也能套用行首規則（最後 strip 掉）
+    text = FB_RE.sub(_fb_replace, "\n" + md.replace("\r\n", "\n"))
+    # 清理多餘空行
+    text = BLANK_LINES_RE.sub("\n\n", text)
+    return text.strip()
+
+
+# --- HTML ---
+
+# email 用的 inline 樣式；html 輸出不加樣式
+EMAIL_STYLES = {
+    "h1": "font-size:22px;margin:16px 0 8px;color:#24292f;",
+    "h2": "font-size:18px;margin:16px 0 8px;color:#24292f;",
+    "h3": "font-size:16px;margin:12px 0 6px;color:#24292f;",
+    "p": "margin:0 0 12px;line-height:1.6;",
+    "ul": "margin:0 0 12px;padding-left:20px;",
+    "ol": "margin:0 0 12px;padding-left:20px;",
+    "li": "margin:0 0 6px;line-height:1.6;",
+    "blockquote": "margin:0 0 12px;padding-left:12px;border-left:3px solid #d0d7de;color:#57606a;",
+    "pre": "background:#f6f8fa;padding:12px;border-radius:6px;overflow:auto;",
+    "code": "font-family:Menlo,Consolas,monospace;font-size:90%;",
+    "a": "color:#0366d6;",
+    "hr": "border:0;border-top:1px solid #d0d7de;margin:16px 0;",
+}
+
+
+class _Html:
+    def __init__(self, styles=None):
+        self.styles = styles or {}
+
+    def open(self, tag, attrs=""):
+        style = self.styles.get(tag)
+        if style:
+            attrs += f' style="{style}"'
+        return f"<{tag}{attrs}>"
+
+    def inline(self, nodes) -> str:
+        out = []
+        for node in nodes:
+            kind = node[0]
+            if kind == "text":
+                out.append(html.escape(node[1], quote=False))
+            elif kind == "code":
+                out.append(f"{self.open('code')}{html.escape(node[1], quote=False)}</code>")
+            elif kind == "link":
+                attrs = ' href="%s"' % html.escape(node[2], quote=True)
+                out.append(f"{self.open('a', attrs)}{self.inline(node[1])}</a>")
+            else:
+                out.append(f"{self.open(kind)}{self.inline(node[1])}</{kind}>")
+        return "".join(out)
+
+    def render(self, tokens) -> str:
+        out = []
+        para, quote, code = [], [], []
+        lists = []  # 目前開著的清單：[(tag, indent)]
+
+        def close_lists(indent=-1):
+            while lists and lists[-1][1] > indent:
+                out[-1] += "</li>"
+                out.append(f"</{lists.pop()[0]}>")
+
+        def flush():
+            if para:
+                out.append(f"{self.open('p')}{chr(10).join(para)}</p>")
+                para.clear()
+            if quote:
+                out.append(f"{self.open('blockquote')}\n{self.open('p')}{chr(10).join(quote)}</p>\n</blockquote>")
+                quote.clear()
+            if code:
+                out.append(f"{self.open('pre')}{self.open('code')}"
+                           f"{html.escape(chr(10).join(code), quote=False)}\n</code></pre>")
+                code.clear()
+
+        after_blank = False
+        for kind, arg, inline in tokens:
+            if kind in ("bullet", "ordered"):
+                flush()
+                tag = "ul" if kind == "bullet" else "ol"
+                close_lists(arg)
+                if lists and lists[-1][1] == arg and lists[-1][0] != tag:
+                    close_lists(arg - 1)
+                if lists and lists[-1][1] == arg:
+                    out[-1] += "</li>"
+                else:
+                    out.append(self.open(tag))
+                    lists.append((tag, arg))
+                out.append(f"{self.open('li')}{self.inline(inline)}")
+                after_blank = False
+                continue
+            if kind == "blank":
+                # 清單中間的空行不結束清單，看下一行是不是項目再決定
+                flush()
+                after_blank = True
+                continue
+            if kind == "text" and lists and not after_blank:
+                # 清單項目的續行
+                out[-1] += "\n" + self.inline(inline)
+                continue
+            if after_blank or kind in ("heading", "hr"):
+                close_lists()
+            after_blank = False
+            if kind != "code" and code:
+                flush()
+            if kind == "heading":
+                flush()
+                tag = f"h{arg}"
+                out.append(f"{self.open(tag)}{self.inline(inline)}</{tag}>")
+            elif kind == "hr":
+                flush()
+                out.append(self.open("hr")[:-1] + " />")
+            elif kind == "quote":
+                if para:
+                    flush()
+                quote.append(self.inline(inline))
+            elif kind == "code":
+                if para or quote:
+                    flush()
+                code.append(arg)
+            else:
+                if quote:
+                    flush()
+                para.append(self.inline(inline))
+        flush()
+        close_lists()
+        return "\n".join(out)
+
+
+def to_html(md: str) -> str:
+    return _Html().render(tokenize(md))
+
+
+def to_email_html(md: str) -> str:
+    return _Html(EMAIL_STYLES).render(tokenize(md))
+
+
+RENDERERS = {"facebook": to_facebook, "html": to_html, "email": to_email_html}
+
+
+def render(md: str, target: str) -> str:
+    return RENDERERS[target](md)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="電子報 Markdown 轉 Facebook 文字 / HTML / email HTML")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    for t in TARGETS:
+        p = sub.add_parser(t, help=f"輸出 {t} 格式")
+        p.add_argument("file", nargs="?", help="Markdown 檔（省略則讀 stdin）")
+    args = parser.parse_args()
+
+    if args.file:
+        with open(args.file, "r", encoding="utf-8") as f:
+            md = f.read()
+    else:
+        md = sys.stdin.read()
+    sys.stdout.write(render(md, args.cmd) + "\n")
+
+
+if __name__ == "__main__":
+    main()
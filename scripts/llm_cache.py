@@ -0,0 +1,77 @@
+import hashlib
+import json
+import os
+import sys
+import threading
+
+from serp_cache import ResponseCache
+
+CACHE_DIR = "tmp/llm_cache"
+
+
+def request_key(request: dict) -> str:
+    """model + messages + 生成參數的內容 hash；prompt 一個字不同就是不同的 key。"""
+    payload = json.dumps(request, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LLMCache(ResponseCache):
+    """
+    LLM 回應的內容定址快取，py_news 與 regen_py_news 共用。
+    分組摘要（map）的每一次呼叫也各自快取，只改 custom_prompt 時只會重算最後彙整那一步。
+    """
+
+    def key(self, request):
+        return request_key(request)
+
+    def describe(self, request):
+        messages = request.get("messages", [])
+        return {
+            "model": request.get("model"),
+            "params": request.get("params", {}),
+            "prompt_chars": sum(len(m.get("content", "")) for m in messages),
+            "prompt_head": (messages[-1].get("content", "")[:80] if messages else ""),
+        }
+
+    def cacheable(self, response):
+        return isinstance(response, str) and bool(response.strip())
+
+
+_default = None
+_default_lock = threading.Lock()
+
+
+def default_cache() -> LLMCache:
+    """
+    依環境變數建立共用快取：
+    LLM_CACHE_MODE（on / off / record / replay；off 或 record 可略過舊結果重新生成）、
+    LLM_CACHE_DIR、LLM_CACHE_TTL（秒，預設 7 天）、LLM_CACHE_MAX_MB。
+    """
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = LLMCache(
+                cache_dir=os.getenv("LLM_CACHE_DIR", CACHE_DIR),
+                ttl=int(os.getenv("LLM_CACHE_TTL", str(7 * 24 * 3600))),
+                max_bytes=int(float(os.getenv("LLM_CACHE_MAX_MB", "100")) * 1024 * 1024),
+                mode=os.getenv("LLM_CACHE_MODE", "on"),
+            )
+        return _default
+
+
+def main():
+    # 用法：python scripts/llm_cache.py [stats|prune|clear]
+    cmd = sys.argv[1] if len(sys.argv) > 1 else "stats"
+    cache = default_cache()
+    if cmd == "prune":
+        cache.evict()
+    elif cmd == "clear":
+        cache.clear()
+    elif cmd != "stats":
+        print(f"未知指令: {cmd}（可用 stats / prune / clear）")
+        sys.exit(1)
+    print(json.dumps(cache.stats(), ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+import math
+import os
+import random
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import tracing
+from llm_cache import default_cache
+from news_fetcher import RateLimiter
+
+MODEL = "gemma-3-27b-it"
+
+# 單次 prompt 的估計 token 上限；超過就改走 map-reduce
+TOKEN_BUDGET = int(os.getenv("LLM_TOKEN_BUDGET", "6000"))
+# map 階段同時進行的 LLM 呼叫數
+MAX_WORKERS = int(os.getenv("LLM_CONCURRENCY", "4"))
+# 單次 HTTP 請求的逾時秒數。實際上限：
+#   map：每輪的期限是 CALL_TIMEOUT x 輪數（工作數 / 併發數），期限內沒完成的組別改用原始標題；
+#        呼叫本身也帶著同一個期限，請求逾時取 min(CALL_TIMEOUT, 剩餘時間)，期限到了就不再重試
+#   單次 / reduce：沒有期限，最多 (RETRIES + 1) x CALL_TIMEOUT 加上重試間隔
+# g4f 的逾時由各 provider 自行處理，不保證遵守；要嚴格的上限請用 LLM_BASE_URL
+CALL_TIMEOUT = float(os.getenv("LLM_CALL_TIMEOUT", "180"))
+# 所有執行緒共用的呼叫頻率上限（每秒幾次，0 表示不限），快取命中不受限制
+RATE_LIMIT = float(os.getenv("LLM_RATE_LIMIT", "0"))
+# 失敗時重試次數，間隔以指數退避加上隨機抖動
+RETRIES = int(os.getenv("LLM_RETRIES", "2"))
+BACKOFF = float(os.getenv("LLM_BACKOFF", "5"))
+# 設定時改打 OpenAI 相容的 {LLM_BASE_URL}/chat/completions（自架模型或 e2e.py 的本機替身），不經過 g4f
+LLM_BASE_URL = os.getenv("LLM_BASE_URL")
+
+_limiter = RateLimiter(RATE_LIMIT)
+_session = None
+_session_lock = threading.Lock()
+
+MAP_PROMPT = (
+    "你是一個專業的 AI 產業分析師。以下是同一天的一組 AI 新聞，"
+    "請用繁體中文條列整理這組新聞的重點事件、關鍵公司與數據，以及它們反映的趨勢，"
+    "每點一到兩句，不要寫開場白與結語。"
+)
+REDUCE_HEADER = "以下是當日所有新聞分組整理後的重點："
+# 各組重點合起來仍太長時，再摘要一次用的標題
+COLLAPSE_TITLE = "第 {} 組重點"
+
+CJK_RE = re.compile(r"[㐀-䶿一-鿿぀-ヿ가-힯　-〿＀-￯]")
+
+
+def settings() -> dict:
+    """影響輸出內容的模型、prompt 與預算設定（newsletter.input_hash 用）"""
+    return {"model": MODEL, "map_prompt": MAP_PROMPT, "reduce_header": REDUCE_HEADER,
+            "collapse_title": COLLAPSE_TITLE, "token_budget": TOKEN_BUDGET}
+
+
+def estimate_tokens(text: str) -> int:
+    """粗估 token 數：中日韓字元約 1 字 1 token，其餘約 4 字元 1 token。"""
+    cjk = len(CJK_RE.findall(text))
+    return cjk + (len(text) - cjk) // 4 + 1
+
+
+def format_article(i: int, item: dict) -> str:
+    return f"## 文章 {i}: {item['title']}\n摘要: {item['summary']}"
+
+
+def chunk_articles(articles: list[dict], budget: int) -> list[list[tuple[int, dict]]]:
+    """依估計 token 數把文章貪婪地裝箱，每組不超過 budget（單篇過長則自成一組）。保留原本的文章編號。"""
+    chunks, current, used = [], [], 0
+    for i, item in enumerate(articles, 1):
+        cost = estimate_tokens(format_article(i, item))
+        if current and used + cost > budget:
+            chunks.append(current)
+            current, used = [], 0
+        current.append((i, item))
+        used += cost
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def _chat_completions(request, timeout) -> str:
+    """POST {LLM_BASE_URL}/chat/completions；各執行緒共用一個連線池"""
+    global _session
+    with _session_lock:
+        if _session is None:
+            from news_fetcher import build_session
+
+            _session = build_session(pool_size=max(MAX_WORKERS, 1))
+    headers = {}
+    if os.getenv("LLM_API_KEY"):
+        headers["Authorization"] = f"Bearer {os.getenv('LLM_API_KEY')}"
+    r = _session.post(LLM_BASE_URL.rstrip("/") + "/chat/completions", headers=headers, timeout=timeout,
+                      json={"model": request["model"], "messages": request["messages"]})
+    r.raise_for_status()
+    return r.json()["choices"][0]["message"]["content"]
+
+
+def _remaining(deadline):
+    """距離 deadline（time.monotonic() 時間）還有幾秒；沒有期限時為 CALL_TIMEOUT"""
+    if deadline is None:
+        return CALL_TIMEOUT
+    left = deadline - time.monotonic()
+    if left <= 0:
+        raise TimeoutError("LLM call deadline exceeded")
+    return min(CALL_TIMEOUT, left)
+
+
+def default_complete(prompt: str, deadline=None) -> str:
+    """
+    透過 g4f（或 LLM_BASE_URL）呼叫模型，結果存進 llm_cache（相同 model + messages + 參數直接回傳快取）。
+    每次呼叫各自建立 Client，可在多執行緒下使用。
+    deadline：time.monotonic() 的期限，過了就丟出 TimeoutError，不再重試（map 用，見 CALL_TIMEOUT）。
+    """
+    request = {
+        "model": MODEL,
+        "messages": [{"role": "user", "content": prompt}],
+        "params": {"web_search": False},
+    }
+
+    def call():
+        if not LLM_BASE_URL:
+            from g4f.client import Client
+
+        for attempt in range(RETRIES + 1):
+            _limiter.wait("llm://" + MODEL)
+            timeout = _remaining(deadline)
+            try:
+                with tracing.external("llm", model=MODEL, prompt_tokens=estimate_tokens(prompt), attempt=attempt) as info:
+                    if LLM_BASE_URL:
+                        content = _chat_completions(request, timeout)
+                    else:
+                        client = Client()
+                        response = client.chat.completions.create(
+                            model=request["model"],
+                            messages=request["messages"],
+                            timeout=timeout,
+                            **request["params"]
+                        )
+                        content = response.choices[0].message.content
+                    info["response_chars"] = len(content or "")
+                if content and content.strip():
+                    return content
+                raise RuntimeError("LLM 回傳空白內容")
+            except Exception as e:
+                if attempt == RETRIES:
+                    raise
+                delay = BACKOFF * 2 ** attempt * random.uniform(0.5, 1.5)
+                if deadline is not None and time.monotonic() + delay >= deadline:
+                    raise TimeoutError(f"LLM call failed ({e}); no time left to retry") from e
+                print(f"LLM call failed ({e}); retrying in {delay:.1f}s")
+                time.sleep(delay)
+
+    return default_cache().fetch(request, call)
+
+
+def _fallback_notes(chunk) -> str:
+    return "\n".join(f"- {item['title']}" for _, item in chunk)
+
+
+def _map(chunks, complete, pool) -> list[str]:
+    """每組各自摘要；失敗或逾時的組別退回原始標題，不讓單組拖垮整份電子報。"""
+    prompts = [MAP_PROMPT + "\n\n" + "\n".join(format_article(i, it) for i, it in chunk) for chunk in chunks]
+    # 整輪的期限：工作數 / 併發數 輪，每輪 CALL_TIMEOUT 秒。也傳給各呼叫：
+    # cancel 停不了已在執行的呼叫，要靠呼叫自己在期限到時放棄
+    timeout = CALL_TIMEOUT * math.ceil(len(prompts) / MAX_WORKERS)
+    deadline = time.monotonic() + timeout
+    futures = [pool.submit(complete, p, deadline=deadline) for p in prompts]
+    wait(futures, timeout=timeout)
+    notes = []
+    for chunk, fut in zip(chunks, futures):
+        if not fut.done():
+            fut.cancel()
+            print("Chunk timed out, using titles instead.")
+            notes.append(_fallback_notes(chunk))
+            continue
+        try:
+            notes.append(fut.result())
+        except Exception as e:
+            print(f"Chunk summarization failed: {e}")
+            notes.append(_fallback_notes(chunk))
+    return notes
+
+
+def _collapse(notes, complete, pool, budget) -> list[str]:
+    """各組摘要合起來仍超過 budget 時，再分組摘要一次，直到放得進最後一輪。"""
+    while len(notes) > 1 and estimate_tokens("\n\n".join(notes)) > budget:
+        groups = chunk_articles([{"title": "", "summary": n} for n in notes], budget)
+        if len(groups) == len(notes):
+            # 每組都只剩一份，無法再合併，直接截斷避免無限迴圈
+            per_note = max(budget // len(notes), 200)
+            return [n[:per_note] for n in notes]
+        merged = [[(i, {"title": COLLAPSE_TITLE.format(i), "summary": it["summary"]}) for i, it in g] for g in groups]
+        notes = _map(merged, complete, pool)
+    return notes
+
+
+def generate(articles: list[dict], intro: str, outro: str, complete=None, budget=None) -> str:
+    """
+    產生電子報內容。
+
+    文章總量在 budget 內時與原本一樣一次送出；超過時先分組平行摘要（map），
+    再用各組重點產生最後的電子報（reduce）。intro / outro 是原本 prompt 的開頭與結尾指示。
+    complete(prompt, deadline=None)：map 呼叫會帶 deadline（見 default_complete）。
+    """
+    complete = complete or default_complete
+    budget = budget or TOKEN_BUDGET
+    body = "\n".join(format_article(i, it) for i, it in enumerate(articles, 1))
+    prompt = "\n".join([intro, body, outro])
+    if estimate_tokens(prompt) <= budget:
+        with tracing.span("llm_single", prompt_tokens=estimate_tokens(prompt)):
+            return complete(prompt)
+
+    chunks = chunk_articles(articles, max(budget - estimate_tokens(MAP_PROMPT), budget // 2))
+    print(f"Prompt too large for one call ({estimate_tokens(prompt)} tokens est.); "
+          f"summarizing {len(chunks)} chunks with up to {MAX_WORKERS} workers.")
+    pool = ThreadPoolExecutor(max_workers=MAX_WORKERS)
+    try:
+        with tracing.span("llm_map", chunks=len(chunks)):
+            notes = _map(chunks, complete, pool)
+            notes = _collapse(notes, complete, pool, budget - estimate_tokens(intro + outro))
+    finally:
+        # 不等逾時的呼叫結束
+        pool.shutdown(wait=False, cancel_futures=True)
+    reduce_prompt = "\n".join([intro, REDUCE_HEADER, "\n\n".join(notes), outro])
+    with tracing.span("llm_reduce", prompt_tokens=estimate_tokens(reduce_prompt)):
+        return complete(reduce_prompt)
@@ -0,0 +1,238 @@
+import argparse
+import hashlib
+import json
+import os
+import random
+import re
+import unicodedata
+from datetime import date, timedelta
+
+from dedup_index import INDEX_DIR, day_files, key_digest
+
+LSH_PATH = os.path.join(INDEX_DIR, "lsh.jsonl")
+
+# 64 個 MinHash，切成 16 band x 4 row，Jaccard 約 0.5 以上才容易撞到同一個 bucket
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+# 判定門檻（以 data/ 裡實際的配對校準）：
+#   標題 + 摘要的相似度 >= THRESHOLD 只是候選；很多網站的摘要是固定的網站介紹
+#   （日經中文網、MoneyDJ…），兩篇無關的新聞全文相似度也能到 0.7，但標題幾乎沒有重疊（< 0.1）。
+#   所以還要標題相似度 >= TITLE_THRESHOLD（真正的轉載 / 改寫標題多在 0.45 以上），
+#   或全文相似度 >= STRONG_THRESHOLD（實測 0.78 以上的都是同一則新聞）
+THRESHOLD = 0.5
+TITLE_THRESHOLD = 0.4
+STRONG_THRESHOLD = 0.8
+# 索引只保留最近 N 天（轉載通常集中在幾天內），檔案大小不會隨歷史無限成長
+WINDOW_DAYS = 30
+
+_PRIME = (1 << 61) - 1
+_MASK = (1 << 32) - 1
+_rng = random.Random(20251105)
+_PERMS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(NUM_PERM)]
+
+CJK_RE = re.compile(r"[㐀-䶿一-鿿぀-ヿ가-힯]+")
+WORD_RE = re.compile(r"[a-z0-9]+")
+
+
+def shingles(text: str) -> set[str]:
+  """中日韓文字取相鄰兩字（bigram），英數取整個單字。"""
+  text = unicodedata.normalize("NFKC", text or "").lower()
+  out = set()
+  for run in CJK_RE.findall(text):
+    if len(run) == 1:
+      out.add(run)
+    out.update(run[i:i + 2] for i in range(len(run) - 1))
+  out.update(WORD_RE.findall(CJK_RE.sub(" ", text)))
+  return out
+
+
+def item_text(item: dict) -> str:
+  return f"{item.get('title') or ''} {item.get('summary') or ''}"
+
+
+def signature(sh: set[str]) -> list[int] | None:
+  if not sh:
+    return None
+  hs = [int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "big") for s in sh]
+  return [min(((a * h + b) % _PRIME) & _MASK for h in hs) for a, b in _PERMS]
+
+
+def similarity(s1: list[int], s2: list[int]) -> float:
+  return sum(1 for x, y in zip(s1, s2) if x == y) / NUM_PERM
+
+
+def fingerprint(item: dict):
+  """(標題 + 摘要的簽章, 標題的簽章)；沒有文字的部分為 None"""
+  return signature(shingles(item_text(item))), signature(shingles(item.get("title") or ""))
+
+
+def is_near_dup(text_sim: float, title_sim: float | None) -> bool:
+  """title_sim 為 None（舊索引沒有標題簽章）時只接受很高的全文相似度"""
+  if text_sim >= STRONG_THRESHOLD:
+    return True
+  return text_sim >= THRESHOLD and title_sim is not None and title_sim >= TITLE_THRESHOLD
+
+
+def _bands(sig):
+  return [hash((b, tuple(sig[b * ROWS:(b + 1) * ROWS]))) for b in range(BANDS)]
+
+
+def _encode(sig):
+  return "".join(f"{v:08x}" for v in sig)
+
+
+def _decode(s):
+  return [int(s[i:i + 8], 16) for i in range(0, len(s), 8)]
+
+
+def cluster_seed(item: dict) -> str:
+  """群組 id 取自群組第一篇的 URL（沒有就用標題），跨次執行是穩定的。"""
+  return "c" + key_digest(item.get("canonical_url") or item.get("url") or item.get("title") or "")
+
+
+class LSHIndex:
+  """
+  近似重複索引：MinHash 簽章 + banding LSH（只用全文簽章分 bucket）。
+  檔案每行 {"c": cluster_id, "d": 日期, "s": 全文簽章 hex, "t": 標題簽章 hex}，
+  載入時丟掉超過 WINDOW_DAYS 的舊資料。
+  """
+
+  def __init__(self, path=LSH_PATH, window_days=WINDOW_DAYS, today=None):
+    self.path = path
+    self.entries = []
+    self.buckets = {}
+    cutoff = ((today or date.today()) - timedelta(days=window_days)).isoformat()
+    if os.path.exists(path):
+      with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+          try:
+            e = json.loads(line)
+          except json.JSONDecodeError:
+            continue
+          if e.get("d", "") >= cutoff:
+            self._insert(e["c"], e["d"], _decode(e["s"]), _decode(e["t"]) if e.get("t") else None)
+
+  def __len__(self):
+    return len(self.entries)
+
+  def _insert(self, cid, day, sig, title_sig=None):
+    idx = len(self.entries)
+    self.entries.append((cid, day, sig, title_sig))
+    for b in _bands(sig):
+      self.buckets.setdefault(b, []).append(idx)
+
+  def query(self, sig, title_sig=None):
+    """
+    回傳最相似且判定為近似重複（is_near_dup）的 (cluster_id, day, similarity)，沒有就 None；
+    只比對同 bucket 的候選。
+    """
+    seen = set()
+    best = None
+    for b in _bands(sig):
+      for idx in self.buckets.get(b, ()):
+        if idx in seen:
+          continue
+        seen.add(idx)
+        cid, day, other, other_title = self.entries[idx]
+        sim = similarity(sig, other)
+        if sim < THRESHOLD or (best is not None and sim <= best[2]):
+          continue
+        title_sim = similarity(title_sig, other_title) if title_sig and other_title else None
+        if is_near_dup(sim, title_sim):
+          best = (cid, day, sim)
+    return best
+
+  def add(self, cid, day, sig, title_sig=None):
+    self._insert(cid, day, sig, title_sig)
+
+  def save(self):
+    os.makedirs(os.path.dirname(self.path), exist_ok=True)
+    tmp = self.path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+      for cid, day, sig, title_sig in self.entries:
+        e = {"c": cid, "d": day, "s": _encode(sig)}
+        if title_sig:
+          e["t"] = _encode(title_sig)
+        f.write(json.dumps(e) + "\n")
+    os.replace(tmp, self.path)
+
+
+def cluster_items(items: list[dict], index: LSHIndex, day: str) -> list[dict]:
+  """
+  幫每篇加上 cluster_id。已有 cluster_id 的視為處理過；
+  與當日已保留的文章近似重複者，整篇（含 summary、published_at）併進代表文章的 related 而不單獨保留。
+  """
+  kept = []
+  reps = {}  # 當日 cluster_id -> 代表文章
+  for it in items:
+    if it.get("cluster_id"):
+      reps.setdefault(it["cluster_id"], it)
+      kept.append(it)
+
+  for it in items:
+    if it.get("cluster_id"):
+      continue
+    sig, title_sig = fingerprint(it)
+    if sig is None:
+      kept.append(it)
+      continue
+    hit = index.query(sig, title_sig)
+    if hit is not None and hit[0] in reps:
+      rep = reps[hit[0]]
+      related = rep.setdefault("related", [])
+      if all(r.get("url") != it.get("url") for r in related):
+        # 當日檔是唯一的儲存處，轉載的欄位要全部留著
+        related.append({k: v for k, v in it.items() if k not in ("cluster_id", "related")})
+      continue
+    cid = hit[0] if hit is not None else cluster_seed(it)
+    it = {**it, "cluster_id": cid}
+    index.add(cid, day, sig, title_sig)
+    reps.setdefault(cid, it)
+    kept.append(it)
+  return kept
+
+
+def build_lsh(data_dir="data", path=LSH_PATH, window_days=WINDOW_DAYS):
+  """用 data/ 最近 window_days 天的資料重建索引（不改動 data/ 的檔案）。"""
+  from store_news import load_json
+
+  files = day_files(data_dir)
+  if not files:
+    return 0, 0
+  latest = date.fromisoformat(os.path.basename(files[-1])[:-len(".json")])
+  cutoff = (latest - timedelta(days=window_days)).isoformat()
+  index = LSHIndex(path=os.devnull)
+  index.path = path
+  clusters = 0
+  for p in files:
+    d = os.path.basename(p)[:-len(".json")]
+    if d < cutoff:
+      continue
+    for it in load_json(p):
+      sig, title_sig = fingerprint(it)
+      if sig is None:
+        continue
+      hit = index.query(sig, title_sig)
+      cid = it.get("cluster_id") or (hit[0] if hit else cluster_seed(it))
+      clusters += hit is None
+      index.add(cid, d, sig, title_sig)
+  index.save()
+  return len(index), clusters
+
+
+def main():
+  parser = argparse.ArgumentParser(description="近似重複新聞（MinHash + LSH）索引")
+  sub = parser.add_subparsers(dest="cmd", required=True)
+  b = sub.add_parser("build", help="用最近幾天的 data/ 重建 LSH 索引")
+  b.add_argument("--data-dir", default="data")
+  b.add_argument("--days", type=int, default=WINDOW_DAYS)
+  args = parser.parse_args()
+
+  if args.cmd == "build":
+    n, clusters = build_lsh(args.data_dir, window_days=args.days)
+    print(f"✅ Indexed {n} signatures in {clusters} clusters to {LSH_PATH}")
+
+
+if __name__ == "__main__":
+  main()
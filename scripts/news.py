@@ -1,37 +1,15 @@
 import os
-import time
-import requests
-from datetime import date, datetime, timezone, timedelta
 import re
-import pandas as pd
-from bs4 import BeautifulSoup
-import json
+from datetime import datetime, timedelta, timezone
 from zoneinfo import ZoneInfo
 
-sera_token = os.getenv("SERA_TOKEN")
-### google trend
-start = datetime.now()
-print(start)
-
-def sera_google_search(keyword, start_date, end_date):
-  params = {
-      "engine": "google",
-      "q": keyword,
-      "gl": "tw",
-      "hl": "zh-tw",
-      "tbm": "nws",
-      "time_range": "Custom",
-      "start_date": start_date,
-      "end_date": end_date,
-      "api_key": sera_token
-      }
-  url = "https://serpapi.com/search"
-  r = requests.get(url, params=params)
-  return r.json()
+import tracing
+from news_fetcher import fetch_all
+from serp_cache import default_cache
+from store_news import new_batch_path, write_batch
+from watermark import Watermarks, pending_path
 
-
-from datetime import datetime, timedelta, timezone
-import re
+# 匯入時不做任何事：日期、環境變數都在 main() 裡才讀，SerpAPI 金鑰由 news_fetcher 呼叫時讀 SERA_TOKEN
 
 def parse_relative_time_flexible(relative_str, scrape_time=None):
     if scrape_time is None:
@@ -73,58 +51,101 @@ def parse_relative_time_flexible(relative_str, scrape_time=None):
 
     raise ValueError(f"無法解析時間格式: {relative_str}")
 
-print('【*************Google - 爬蟲開始*************】')
-
-today = datetime.now(timezone(timedelta(hours=8)))
-day = timedelta(days=1)
-last_day = today - 1*day
-last_day2 = today - 2*day
-
-start_date = f'{last_day2.month}/{last_day2.day}/{last_day2.year}'
-end_date = f'{last_day.month}/{last_day.day}/{last_day.year}'
-
-ai_keywords = ["AI"]
-test = []
-for key_word in ai_keywords:
-
-    for language in ['TW']:
-        # news_soup = news_search(key_word, start_date, end_date, 1,  region = language)
-        news_soup = sera_google_search(key_word, start_date, end_date)
-
-        all_news = []
-
-        for i in news_soup['news_results']:
-          if 'stories' in i:
-            for j in i['stories']:
-              all_news.append(j)
-          else:
-            all_news.append(i)
-
-        for i in all_news:
-          one_news = {}
-          link_g = i['link']
-          src_g = i['source']
-          title_g = i['title']
-          beginning_g = i['snippet']
-          published_at = i['published_at']
-
-          one_news['title'] = title_g
-          one_news['url'] = link_g
-          one_news['source'] = src_g
-          one_news['published_at'] = str(datetime.strptime(published_at.replace(' UTC', ''), '%Y-%m-%d %H:%M:%S').replace(tzinfo=ZoneInfo("UTC")).astimezone(ZoneInfo("Asia/Taipei")))
-          one_news['summary'] = beginning_g
-          test.append(one_news)
-
-
-print('【*************Google - 爬蟲結束*************】')
-import os
-
-file_path = "tmp/news_batch.json"
-os.makedirs(os.path.dirname(file_path), exist_ok=True)  # 自動建立資料夾
-
-with open(file_path, 'w', encoding='utf-8') as f:
-    json.dump(test, f, ensure_ascii=False, indent=2)
-
-END = datetime.now()
-print(END)
-print(END-start)
+def serp_date(dt):
+    return f'{dt.month}/{dt.day}/{dt.year}'
+
+def to_taipei(published_at):
+    return str(datetime.strptime(published_at.replace(' UTC', ''), '%Y-%m-%d %H:%M:%S').replace(tzinfo=ZoneInfo("UTC")).astimezone(ZoneInfo("Asia/Taipei")))
+
+def main():
+    ### google trend
+    start = datetime.now()
+    print(start)
+
+    print('【*************Google - 爬蟲開始*************】')
+
+    today = datetime.now(timezone(timedelta(hours=8)))
+    day = timedelta(days=1)
+    last_day = today - 1*day
+    last_day2 = today - 2*day
+
+    start_date = serp_date(last_day2)
+    end_date = serp_date(last_day)
+
+    # 關鍵字與語系可用環境變數覆寫，逗號分隔，例如 NEWS_KEYWORDS="AI,生成式AI,LLM"
+    ai_keywords = [k.strip() for k in os.getenv("NEWS_KEYWORDS", "AI").split(",") if k.strip()]
+    languages = [l.strip() for l in os.getenv("NEWS_LANGUAGES", "TW").split(",") if l.strip()]
+    max_pages = int(os.getenv("NEWS_MAX_PAGES", "1"))
+    max_workers = int(os.getenv("NEWS_CONCURRENCY", "4"))
+    rate_per_host = float(os.getenv("NEWS_RATE_LIMIT", "5"))  # 每秒對同一 host 的請求數上限
+    # 增量抓取：有水位的組合只抓水位之後（到今天）的新聞，可以每小時跑；NEWS_WATERMARK=0 回到固定的兩天視窗
+    use_watermark = os.getenv("NEWS_WATERMARK", "1") not in ("0", "false", "off")
+
+    windows = {}
+    if use_watermark:
+        marks = Watermarks()
+        for key_word in ai_keywords:
+            for language in languages:
+                since = marks.since(key_word, language, today)
+                if since is not None:
+                    windows[(key_word, language)] = (serp_date(since), serp_date(today), since)
+                    print(f"{key_word}/{language}: 從 {since.isoformat(timespec='minutes')} 之後開始抓")
+
+    with tracing.span("fetch", keywords=len(ai_keywords), languages=len(languages), max_pages=max_pages,
+                      incremental=len(windows)) as sp:
+        fetched = fetch_all(ai_keywords, languages, start_date, end_date,
+                            max_pages=max_pages, max_workers=max_workers,
+                            rate_per_host=rate_per_host, windows=windows)
+        sp.add("items", sum(len(r) for _, _, r, _ in fetched))
+
+    test = []
+    with tracing.span("parse") as sp:
+        for key_word, language, all_news, _ in fetched:
+            print(f"{key_word}/{language}: {len(all_news)} 則")
+
+            for i in all_news:
+              one_news = {}
+              link_g = i['link']
+              src_g = i['source']
+              title_g = i['title']
+              beginning_g = i['snippet']
+              published_at = i['published_at']
+
+              one_news['title'] = title_g
+              one_news['url'] = link_g
+              one_news['source'] = src_g
+              one_news['published_at'] = to_taipei(published_at)
+              one_news['summary'] = beginning_g
+              one_news['keyword'] = key_word
+              test.append(one_news)
+        sp.add("items", len(test))
+
+
+    # 每個 worker（例如依 keyword 分片的平行工作）各寫自己的批次檔，不會互相覆蓋
+    file_path = new_batch_path()
+
+    if use_watermark:
+        # 新水位先存在批次檔旁邊，等 store_news.py 存檔成功才生效
+        # 結果沒有依時間排序：沒翻完的查詢不推進水位（mark 為 None，見 fetch_query）
+        pending = Watermarks(pending_path(file_path))
+        for key_word, language, _, mark in fetched:
+            pending.advance(key_word, language, mark)
+        pending.save()
+
+    print('【*************Google - 爬蟲結束*************】')
+    print(f"SerpAPI 快取: {default_cache().stats()}")
+
+    with tracing.span("write") as sp:
+        # 先寫暫存檔再 rename，store_news 不會讀到寫一半的批次
+        write_batch(file_path, test)
+        print(f"Batch saved to {file_path}")
+        sp.add("items", len(test))
+        sp.add("bytes_written", tracing.file_size(file_path))
+
+    END = datetime.now()
+    print(END)
+    print(END-start)
+
+if __name__ == "__main__":
+    with tracing.run("news"):
+        main()
@@ -0,0 +1,190 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from urllib.parse import urlparse
+
+import tracing
+from serp_cache import default_cache
+from watermark import TAIPEI, parse_published
+
+# 可用 SERP_URL 指到其他相容的端點（例如 e2e.py 的本機替身）
+SERP_URL = os.getenv("SERP_URL", "https://serpapi.com/search")
+
+# 語系代碼 -> SerpAPI 的 gl / hl 參數
+LANGUAGES = {
+    "TW": {"gl": "tw", "hl": "zh-tw"},
+    "HK": {"gl": "hk", "hl": "zh-tw"},
+    "CN": {"gl": "cn", "hl": "zh-cn"},
+    "US": {"gl": "us", "hl": "en"},
+    "JP": {"gl": "jp", "hl": "ja"},
+    "KR": {"gl": "kr", "hl": "ko"},
+}
+
+# Google News 每頁筆數（SerpAPI 用 start 做 offset 翻頁）
+PAGE_SIZE = 10
+
+# 時間範圍包含今天的查詢結果還會變動，快取只沿用這麼久（秒），方便每小時跑一次
+LIVE_TTL = int(os.getenv("SERP_CACHE_LIVE_TTL", "1800"))
+
+
+class RateLimiter:
+    """每個 host 各自排隊的限速器，保證同一 host 兩次請求間隔 >= 1/per_second 秒（thread-safe）。"""
+
+    def __init__(self, per_second):
+        self.interval = 1.0 / per_second if per_second and per_second > 0 else 0.0
+        self._lock = threading.Lock()
+        self._next_slot = {}
+
+    def wait(self, url):
+        if not self.interval:
+            return
+        host = urlparse(url).netloc
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(host, 0.0))
+            self._next_slot[host] = slot + self.interval
+        delay = slot - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+
+def build_session(pool_size=10):
+    """建立可重用連線的 Session，連線池大小需 >= 併發數，否則連線會被丟棄重建。"""
+    # requests 約 100 ms，只在真的要連線時才載入（llm_pipeline 只用到 RateLimiter）
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def sera_google_search(keyword, start_date, end_date, language="TW", start=0, session=None, limiter=None):
+    lang = LANGUAGES.get(language, LANGUAGES["TW"])
+    params = {
+        "engine": "google",
+        "q": keyword,
+        "gl": lang["gl"],
+        "hl": lang["hl"],
+        "tbm": "nws",
+        "time_range": "Custom",
+        "start_date": start_date,
+        "end_date": end_date,
+        "api_key": os.getenv("SERA_TOKEN"),
+    }
+    if start:
+        params["start"] = start
+
+    def fetch():
+        # 只有真的要連網才排隊限速，快取命中不受影響
+        if limiter is not None:
+            limiter.wait(SERP_URL)
+        with tracing.external("serpapi", q=keyword, language=language, start=start) as call:
+            r = (session or build_session(1)).get(SERP_URL, params=params, timeout=30)
+            call["status"] = r.status_code
+            call["bytes"] = len(r.content)
+            return r.json()
+
+    return default_cache().fetch(params, fetch, ttl=LIVE_TTL if _is_live(end_date) else None)
+
+
+def _is_live(end_date):
+    try:
+        return datetime.strptime(end_date, "%m/%d/%Y").date() >= datetime.now(TAIPEI).date()
+    except ValueError:
+        return False
+
+
+def flatten_news_results(news_results):
+    """news_results 裡有些是 stories 群組，攤平成單篇新聞列表。"""
+    all_news = []
+    for i in news_results:
+        if "stories" in i:
+            all_news.extend(i["stories"])
+        else:
+            all_news.append(i)
+    return all_news
+
+
+def fetch_query(keyword, language, start_date, end_date, max_pages=1, session=None, limiter=None, since=None):
+    """
+    抓單一 (keyword, language) 的多頁結果，沒有下一頁就提早停止。
+    since（有時區的 datetime）：只保留 published_at >= since 的新聞。
+    Google News 的結果不是依時間排序，所以不會因為某一頁都比 since 舊就停止翻頁。
+
+    回傳 (results, mark)；mark 是可以安全推進的水位：翻完所有頁時為看到的最新 published_at
+    （時間範圍內的新聞都看過了）。受 max_pages 限制沒翻完時為 None：結果沒有依時間排序，
+    沒翻到的頁可能有任何時間的新聞，推進水位會讓它們永遠抓不到；下次沿用舊水位
+    （最多往回 watermark.MAX_LOOKBACK），重複的交給 store_news 去重。
+    第一頁就失敗或沒有可解析的時間時也是 None。
+    """
+    results = []
+    newest = None
+    exhausted = False
+    for page in range(max_pages):
+        res = sera_google_search(keyword, start_date, end_date, language=language,
+                                 start=page * PAGE_SIZE, session=session, limiter=limiter)
+        if "error" in res and not res.get("news_results"):
+            # SerpAPI 查無結果也會回 error，第一頁以外視為正常結束
+            if page == 0:
+                print(f"⚠️ {keyword}/{language}: {res['error']}")
+                return results, None
+            exhausted = True
+            break
+        page_results = res.get("news_results") or []
+        page_news = flatten_news_results(page_results)
+        tracing.count("pages")
+        published = [p for p in (parse_published(n.get("published_at")) for n in page_news) if p]
+        if published:
+            newest = max(published) if newest is None else max(newest, *published)
+        if since is not None:
+            # 沒有時間的保留，交給 store_news 去重
+            fresh = [n for n in page_news if (parse_published(n.get("published_at")) or since) >= since]
+            tracing.count("stale_items", len(page_news) - len(fresh))
+            results.extend(fresh)
+        else:
+            results.extend(page_news)
+        if not page_results or "next" not in res.get("serpapi_pagination", {}):
+            exhausted = True
+            break
+    if not exhausted:
+        tracing.count("truncated")
+        return results, None
+    return results, newest
+
+
+def fetch_all(keywords, languages, start_date, end_date, max_pages=1, max_workers=4, rate_per_host=5.0,
+              windows=None):
+    """
+    併發抓取所有 keyword x language 組合。
+
+    windows：{(keyword, language): (start_date, end_date, since)}，有的組合改用自己的時間範圍與水位
+    （增量抓取），沒有的沿用 start_date / end_date。
+    回傳 [(keyword, language, results, mark), ...]，順序與輸入一致（mark 見 fetch_query）；
+    單一組合失敗只會印出錯誤並回傳空列表（mark 為 None），不會中斷其他組合。
+    """
+    windows = windows or {}
+    jobs = [(k, lang) for k in keywords for lang in languages]
+    session = build_session(pool_size=max(max_workers, 1))
+    limiter = RateLimiter(rate_per_host)
+
+    def run(job):
+        keyword, language = job
+        start, end, since = windows.get(job, (start_date, end_date, None))
+        try:
+            return fetch_query(keyword, language, start, end, max_pages=max_pages,
+                               session=session, limiter=limiter, since=since)
+        except Exception as e:
+            print(f"❌ {keyword}/{language} 抓取失敗: {e}")
+            return [], None
+
+    try:
+        with ThreadPoolExecutor(max_workers=max(max_workers, 1)) as pool:
+            outputs = list(pool.map(run, jobs))
+    finally:
+        session.close()
+    return [(k, lang, res, mark) for (k, lang), (res, mark) in zip(jobs, outputs)]
@@ -0,0 +1,278 @@
+import argparse
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date, datetime, timedelta
+from zoneinfo import ZoneInfo
+
+import digest
+import llm_pipeline
+import ranking
+import rollups
+import storage
+import tracing
+from dedup_index import file_hash
+from store_news import load_json as load_day, log_path
+
+# 設定時區
+TAIPEI = ZoneInfo("Asia/Taipei")
+
+DATA_DIR = "data"
+OUT_DIR = "eletters"
+# 記錄每份電子報是用哪份資料、哪個 prompt 產生的，用來判斷要不要重新生成
+MANIFEST_PATH = os.path.join(OUT_DIR, "manifest.json")
+
+OUTRO = "\n請以 Markdown 格式，內容可加入Emoji。"
+
+
+def intro_for(day: date) -> str:
+    return (
+        f"你是一個專業的 AI 產業專家，經營一個專業的粉絲社群，粉絲社群名稱叫做 AI . FREE News，"
+        f"依據最新的AI重點新聞進行綜合整理跟分析，每天會去撰寫分享AI趨勢洞察。"
+        f"請根據以下內容，生成一份關於 {day.strftime('%Y年%m月%d日')} 的每日 AI 趨勢洞察分析，"
+        f"在文末請用幾句話總結趨勢並鼓勵讀者繼續跟 AI . FREE Team 繼續探索AI的世界。"
+    )
+
+
+def trends_for(day: date) -> str:
+    """
+    data/_index/rollups.json 算出的近期量化趨勢（升溫詞、來源變化），附在 intro 後面給模型參考。
+    """
+    summary = rollups.Rollups().summary(day)
+    if not summary:
+        return ""
+    return f"\n\n以下是近期新聞量的統計，可作為判斷趨勢的參考（不必逐條引用）：\n{summary}\n"
+
+
+def outro_for(custom_prompt=None) -> str:
+    # 如果有自訂 prompt，附加在格式要求之前
+    if custom_prompt and custom_prompt.strip():
+        return f"\n\n## 額外需求：\n{custom_prompt}\n" + OUTRO
+    return OUTRO
+
+
+def data_path(day: date) -> str:
+    return os.path.join(DATA_DIR, f"{day.isoformat()}.json")
+
+
+def out_path(day: date) -> str:
+    return os.path.join(OUT_DIR, f"{day.isoformat()}.md")
+
+
+# Helper 函數：載入 JSON 檔案
+def load_json(path):
+    # 當日檔可能還有尚未 compact 的 .jsonl 紀錄，交給 store_news 一起讀
+    if storage.find(path) is None and not os.path.exists(log_path(path)):
+        print(f"Warning: File not found at {path}. Returning empty list.")
+        return []
+    return load_day(path)
+
+
+def prompt_frame(day: date, custom_prompt=None, trends="") -> tuple[str, str]:
+    """送給模型的 (intro, outro)；intro 後面接趨勢摘要。render 與 input_hash 共用，兩邊不會不一致"""
+    return intro_for(day) + trends, outro_for(custom_prompt)
+
+
+def input_hash(day: date, custom_prompt=None, trends="") -> str:
+    """
+    資料內容 + 完整 prompt 開頭結尾 + 模型 / prompt 模板 / 挑選參數 的 hash；
+    任何一項改變，這天的電子報就需要重新生成。
+    趨勢摘要用 manifest 記下的那份，不重算：rollups.json 每天都在變，重算會讓舊日期一直被判定過期。
+    """
+    settings = json.dumps({"llm": llm_pipeline.settings(), "ranking": ranking.settings()},
+                          ensure_ascii=False, sort_keys=True)
+    h = hashlib.sha1()
+    for part in (file_hash(data_path(day)), *prompt_frame(day, custom_prompt, trends), settings):
+        h.update(part.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()[:16]
+
+
+def render(day: date, custom_prompt=None, strict=False, trends="") -> tuple[str, bool]:
+    """
+    產生某一天的電子報內容，回傳 (markdown, 是否為 LLM 正常產生)。
+    strict=True 時 LLM 失敗直接丟出例外（給 backfill 重試）；否則與原本一樣退回原始摘要。
+    trends 是附在 intro 後面的趨勢摘要（見 Manifest.trends）。
+    """
+    print(f"Attempting to load data from: {data_path(day)}")
+    with tracing.span("load", day=day.isoformat()) as sp:
+        articles = load_json(data_path(day))
+        sp.add("items", len(articles))
+        sp.add("bytes_read", storage.size(data_path(day)) + tracing.file_size(log_path(data_path(day))))
+    title = f"# {day.strftime('%Y年%m月%d日')} 每日電子報\n\n"
+    if not articles:
+        print("No articles found for yesterday. Exiting.")
+        # 即使沒有文章，也要生成一個空的電子報檔案，避免 workflow 失敗
+        return title + "抱歉，沒有找到昨日的文章資料來生成電子報。\n", True
+
+    candidates = [a for a in articles if "title" in a and "summary" in a]
+    if not candidates:
+        print("No valid title or summary found in yesterday's data. Exiting.")
+        return title + "抱歉，昨日的文章資料中沒有找到有效的標題或摘要。\n", True
+
+    # 依相關度、來源多樣性與新鮮度挑出前 K 篇；只限篇數，放不進一次呼叫時由 llm_pipeline 改走 map-reduce
+    intro, outro = prompt_frame(day, custom_prompt, trends)
+    with tracing.span("rank", candidates=len(candidates)) as sp:
+        selected = ranking.select_articles(candidates)
+        sp.add("items", len(selected))
+    if len(selected) < len(candidates):
+        print(f"Selected {len(selected)} of {len(candidates)} articles for the prompt.")
+    filtered_data = [{"title": a["title"], "summary": a["summary"]} for a in selected]
+
+    print("Sending prompt to LLM...")
+    try:
+        with tracing.span("generate", articles=len(filtered_data)):
+            content = llm_pipeline.generate(filtered_data, intro, outro)
+        print("LLM response received.")
+        return content, True
+    except Exception as e:
+        if strict:
+            raise
+        print(f"Error during LLM inference: {e}")
+        content = (
+            title + "抱歉，由於 LLM 推論失敗，未能生成完整的電子報內容。\n"
+            f"錯誤訊息：{e}\n\n原始資料摘要：\n"
+        )
+        for item in candidates:
+            content += f"- **{item['title']}**: {item['summary']}\n"
+        return content, False
+
+
+def write_atomic(path, text):
+    """先寫暫存檔再 rename，中途失敗不會留下寫一半的檔案。"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+
+class Manifest:
+    """eletters/manifest.json：{日期: {"input": hash, "ok": bool, "trends": ..., "custom_prompt": ..., "generated_at": ...}}"""
+
+    def __init__(self, path=MANIFEST_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self.entries = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                self.entries = json.load(f)
+
+    def get(self, day: date) -> dict:
+        return self.entries.get(day.isoformat(), {})
+
+    def trends(self, day: date) -> str:
+        """這天第一次產生時的趨勢摘要；重新生成沿用同一份，沒有紀錄才從 rollups 算"""
+        entry = self.get(day)
+        return entry["trends"] if "trends" in entry else trends_for(day)
+
+    def is_up_to_date(self, day: date) -> bool:
+        entry = self.get(day)
+        return (
+            os.path.exists(out_path(day))
+            and entry.get("ok", False)
+            and entry.get("input") == input_hash(day, entry.get("custom_prompt"), entry.get("trends", ""))
+        )
+
+    def record(self, day: date, custom_prompt, ok, trends=""):
+        with self._lock:
+            entry = {"input": input_hash(day, custom_prompt, trends), "ok": ok, "trends": trends,
+                     "generated_at": datetime.now(TAIPEI).isoformat(timespec="seconds")}
+            if custom_prompt and custom_prompt.strip():
+                entry["custom_prompt"] = custom_prompt
+            self.entries[day.isoformat()] = entry
+            write_atomic(self.path, json.dumps(self.entries, ensure_ascii=False, indent=2, sort_keys=True))
+
+
+def generate_for_date(day: date, custom_prompt=None, strict=False, manifest=None) -> str:
+    """產生並寫入 eletters/YYYY-MM-DD.md，回傳檔案路徑。"""
+    manifest = manifest or Manifest()
+    trends = manifest.trends(day)
+    with tracing.span("render", day=day.isoformat()) as sp:
+        content, ok = render(day, custom_prompt, strict=strict, trends=trends)
+        sp.set(ok=ok)
+    md_filename = out_path(day)
+    with tracing.span("write") as sp:
+        write_atomic(md_filename, content)
+        manifest.record(day, custom_prompt, ok, trends)
+        sp.add("bytes_written", len(content.encode("utf-8")))
+    # 順便存每日結構化摘要，週報 / 月報只讀這些摘要（python scripts/digest.py build）
+    with tracing.span("digest_daily"):
+        try:
+            digest.write_daily(day, content)
+        except Exception as e:
+            print(f"Warning: failed to write daily digest summary: {e}")
+    print(f"Daily newsletter saved to: {md_filename}")
+    return md_filename
+
+
+def backfill(start: date, end: date, workers=4, force=False, retries=3, backoff=30.0) -> dict:
+    """
+    平行重建一段日期的電子報。已是最新（資料與 prompt 都沒變）的日期會略過；
+    每個日期失敗時以指數退避重試，最後仍失敗就保留原檔，下次 backfill 會再補。
+    LLM 呼叫頻率由 llm_pipeline 的全域限速器（LLM_RATE_LIMIT）控制。
+    """
+    manifest = Manifest()
+    days = [start + timedelta(days=i) for i in range((end - start).days + 1)]
+    todo = [d for d in days if force or not manifest.is_up_to_date(d)]
+    result = {"skipped": len(days) - len(todo), "done": [], "failed": []}
+    print(f"Backfill {start} ~ {end}: {len(todo)} to generate, {result['skipped']} up to date")
+
+    def run(day):
+        # 重新生成時沿用這天先前的自訂 prompt
+        custom_prompt = manifest.get(day).get("custom_prompt")
+        for attempt in range(retries + 1):
+            try:
+                return generate_for_date(day, custom_prompt, strict=True, manifest=manifest)
+            except Exception as e:
+                if attempt == retries:
+                    raise
+                delay = backoff * 2 ** attempt * random.uniform(0.5, 1.5)
+                print(f"{day}: {e}; retrying in {delay:.0f}s")
+                time.sleep(delay)
+
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as pool:
+        futures = {pool.submit(run, d): d for d in todo}
+        for fut in as_completed(futures):
+            day = futures[fut]
+            try:
+                fut.result()
+                result["done"].append(day.isoformat())
+            except Exception as e:
+                print(f"❌ {day}: {e}")
+                result["failed"].append(day.isoformat())
+    result["done"].sort()
+    result["failed"].sort()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="電子報生成 / 批次回補")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    b = sub.add_parser("backfill", help="平行重建一段日期的電子報")
+    b.add_argument("--from", dest="date_from", required=True, help="YYYY-MM-DD")
+    b.add_argument("--to", dest="date_to", help="YYYY-MM-DD（預設今天）")
+    b.add_argument("--workers", type=int, default=4)
+    b.add_argument("--retries", type=int, default=3)
+    b.add_argument("--force", action="store_true", help="不檢查是否最新，全部重建")
+    args = parser.parse_args()
+
+    if args.cmd == "backfill":
+        start = date.fromisoformat(args.date_from)
+        end = date.fromisoformat(args.date_to) if args.date_to else datetime.now(TAIPEI).date()
+        t0 = time.perf_counter()
+        with tracing.run("backfill"):
+            result = backfill(start, end, workers=args.workers, force=args.force, retries=args.retries)
+        print(f"✅ Generated {len(result['done'])}, skipped {result['skipped']}, "
+              f"failed {len(result['failed'])} in {time.perf_counter() - t0:.1f}s")
+        if result["failed"]:
+            print("Failed dates: " + ", ".join(result["failed"]))
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
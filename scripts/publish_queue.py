@@ -0,0 +1,446 @@
+import argparse
+import hashlib
+import json
+import os
+import random
+import sqlite3
+import time
+from contextlib import closing
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+import requests
+
+import tracing
+
+TAIPEI = ZoneInfo("Asia/Taipei")
+
+# 發文 outbox：一篇一列，記錄狀態、重試次數與發出後的 post id（CI 以 actions/cache 保存）
+DB_PATH = "tmp/publish_queue.sqlite3"
+GRAPH_URL = os.getenv("FB_GRAPH_URL", "https://graph.facebook.com/v20.0")
+
+# 同一篇最多嘗試幾次，之後標成 failed 需要手動 retry
+MAX_ATTEMPTS = int(os.getenv("PUBLISH_MAX_ATTEMPTS", "5"))
+# 重試間隔基準（秒），實際為 BACKOFF * 2^(n-1) 再乘上 0.5~1.5 的隨機值
+BACKOFF = float(os.getenv("PUBLISH_BACKOFF", "10"))
+MAX_BACKOFF = 3600
+# 兩次發文的最短間隔（秒）；用量升高時 Pacer 會自動拉長
+MIN_INTERVAL = float(os.getenv("PUBLISH_MIN_INTERVAL", "2"))
+MAX_INTERVAL = float(os.getenv("PUBLISH_MAX_INTERVAL", "120"))
+# 一次 drain 最多等多久（秒），要等更久的留到下次執行
+MAX_WAIT = float(os.getenv("PUBLISH_MAX_WAIT", "300"))
+# 取出後多久內其它 worker 不會再拿（需大於請求逾時）
+LEASE = 120
+
+# Graph API 的錯誤碼：限流 / 暫時性錯誤可重試，其餘（權杖失效、權限不足、參數錯誤）重試也沒用
+RATE_LIMIT_CODES = {4, 17, 32, 613, 80001}
+TRANSIENT_CODES = {1, 2}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS posts (
+    id INTEGER PRIMARY KEY,
+    idempotency_key TEXT NOT NULL UNIQUE,
+    page_id TEXT NOT NULL,
+    message TEXT NOT NULL,
+    link TEXT,
+    source TEXT,
+    scheduled_at REAL NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL DEFAULT 0,
+    post_id TEXT,
+    last_error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS posts_due ON posts (status, scheduled_at, next_attempt_at);
+"""
+
+# pending：等待發出；sending：已送出請求但結果不明（逾時、5xx、程式中斷），重試前要先查是否已發出；
+# done：已發出；failed：不可重試的錯誤或次數用完；canceled：手動取消
+ACTIVE = ("pending", "sending")
+
+
+def idempotency_key(page_id, message, source=None):
+    """同一粉專、同一來源、同一內容只會發一次；重跑 workflow 不會重複發文"""
+    h = hashlib.sha1()
+    for part in (page_id, source or "", message):
+        h.update(part.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+def page_token(page_id):
+    """FB_PAGE_TOKENS='{"page_id": "token"}' 可設定多個粉專，否則用 FB_ACCESS_TOKEN。權杖不存進資料庫。"""
+    tokens = json.loads(os.getenv("FB_PAGE_TOKENS") or "{}")
+    return tokens.get(page_id) or os.getenv("FB_ACCESS_TOKEN")
+
+
+def parse_time(s):
+    """ISO 字串（沒時區視為台灣時間）-> epoch 秒"""
+    dt = datetime.fromisoformat(s)
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=TAIPEI)
+    return dt.timestamp()
+
+
+def format_time(ts):
+    return datetime.fromtimestamp(ts, TAIPEI).strftime("%Y-%m-%d %H:%M:%S") if ts else "-"
+
+
+class Outbox:
+    """SQLite 發文佇列；每次操作一個短交易，多個 worker 同時 drain 也只會有一個拿到同一篇。"""
+
+    def __init__(self, path=None):
+        self.path = path or os.getenv("PUBLISH_QUEUE_DB", DB_PATH)
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self.conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def enqueue(self, page_id, message, source=None, link=None, scheduled_at=None):
+        """加入佇列，回傳 (id, 是否新加入)；同一 idempotency key 已存在時不重複加入"""
+        key = idempotency_key(page_id, message, source)
+        now = time.time()
+        cur = self.conn.execute(
+            "INSERT OR IGNORE INTO posts (idempotency_key, page_id, message, link, source, scheduled_at,"
+            " created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (key, page_id, message, link, source, scheduled_at or now, now, now),
+        )
+        row = self.conn.execute("SELECT id FROM posts WHERE idempotency_key = ?", (key,)).fetchone()
+        return row["id"], cur.rowcount == 1
+
+    def get(self, item_id):
+        return self.conn.execute("SELECT * FROM posts WHERE id = ?", (item_id,)).fetchone()
+
+    def list(self, status=None):
+        if status:
+            return self.conn.execute("SELECT * FROM posts WHERE status = ? ORDER BY id", (status,)).fetchall()
+        return self.conn.execute("SELECT * FROM posts ORDER BY id").fetchall()
+
+    def due(self, now=None):
+        """到了發文時間、也過了重試等待的項目，依排程時間排序"""
+        now = now or time.time()
+        return self.conn.execute(
+            "SELECT * FROM posts WHERE status IN (?, ?) AND scheduled_at <= ? AND next_attempt_at <= ?"
+            " ORDER BY scheduled_at, id",
+            (*ACTIVE, now, now),
+        ).fetchall()
+
+    def count_active(self):
+        return self.conn.execute("SELECT COUNT(*) FROM posts WHERE status IN (?, ?)", ACTIVE).fetchone()[0]
+
+    def next_due_at(self):
+        row = self.conn.execute(
+            "SELECT MIN(MAX(scheduled_at, next_attempt_at)) AS t FROM posts WHERE status IN (?, ?)", ACTIVE
+        ).fetchone()
+        return row["t"]
+
+    def claim(self, row):
+        """
+        pending/sending -> sending，加一次嘗試次數並設租約（LEASE 秒內其它 worker 不會再拿到）；
+        別的 worker 已經拿走時回傳 False
+        """
+        now = time.time()
+        cur = self.conn.execute(
+            "UPDATE posts SET status = 'sending', attempts = attempts + 1, next_attempt_at = ?, updated_at = ?"
+            " WHERE id = ? AND status = ? AND attempts = ?",
+            (now + LEASE, now, row["id"], row["status"], row["attempts"]),
+        )
+        return cur.rowcount == 1
+
+    def mark(self, item_id, status, **fields):
+        fields["status"] = status
+        fields["updated_at"] = time.time()
+        cols = ", ".join(f"{k} = ?" for k in fields)
+        self.conn.execute(f"UPDATE posts SET {cols} WHERE id = ?", (*fields.values(), item_id))
+
+    def retry(self, item_id):
+        """手動重試 failed / canceled 的項目（次數歸零）"""
+        self.mark(item_id, "pending", attempts=0, next_attempt_at=0, last_error=None)
+
+    def cancel(self, item_id):
+        self.conn.execute(
+            "UPDATE posts SET status = 'canceled', updated_at = ? WHERE id = ? AND status IN (?, ?)",
+            (time.time(), item_id, *ACTIVE),
+        )
+
+
+def _usage(entry):
+    """{"call_count": 28, "total_time": 25, "total_cputime": 25, ...} -> (最高百分比, 恢復前要等的分鐘數)"""
+    if not isinstance(entry, dict):
+        return 0, 0
+    regain = entry.get("estimated_time_to_regain_access") or 0
+    pct = max((entry.get(k) or 0 for k in ("call_count", "total_time", "total_cputime")), default=0)
+    return pct, regain
+
+
+def parse_usage_headers(headers):
+    """
+    Graph API 用量標頭 -> (最高百分比, 恢復前要等的分鐘數)；沒有標頭時回傳 None
+      X-App-Usage / X-Page-Usage：一個 dict
+      X-Business-Use-Case-Usage：{"<business id>": [dict, ...]}
+    """
+    entries = []
+    for name in ("x-app-usage", "x-page-usage", "x-business-use-case-usage"):
+        if name not in headers:
+            continue
+        try:
+            value = json.loads(headers[name])
+        except ValueError:
+            continue
+        if name == "x-business-use-case-usage" and isinstance(value, dict):
+            for items in value.values():
+                entries.extend(items if isinstance(items, list) else [])
+        else:
+            entries.append(value)
+    if not entries:
+        return None
+    usages = [_usage(e) for e in entries]
+    return max(u[0] for u in usages), max(u[1] for u in usages)
+
+
+class Pacer:
+    """
+    依 Graph API 回應的用量標頭調整發文間隔：
+      X-App-Usage、X-Page-Usage、X-Business-Use-Case-Usage 取最高的百分比，
+      50% 以下用最短間隔，之後依平方曲線拉長到 MAX_INTERVAL；
+      有 estimated_time_to_regain_access（分鐘）時等到恢復為止。
+    """
+
+    def __init__(self, min_interval=MIN_INTERVAL, max_interval=MAX_INTERVAL):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.usage = 0
+        self.regain_at = 0.0
+        self.last = 0.0
+
+    def update(self, headers):
+        usage = parse_usage_headers(headers)
+        if usage is None:
+            return
+        self.usage, regain = usage
+        if regain:
+            self.regain_at = max(self.regain_at, time.time() + regain * 60)
+
+    def interval(self):
+        frac = min(max(self.usage / 100, 0), 1)
+        if frac <= 0.5:
+            return self.min_interval
+        return self.min_interval + (self.max_interval - self.min_interval) * ((frac - 0.5) / 0.5) ** 2
+
+    def delay(self, now=None):
+        """距離下一次可以送出還要等幾秒"""
+        now = now or time.time()
+        return max(self.last + self.interval() - now, self.regain_at - now, 0)
+
+    def sent(self):
+        self.last = time.time()
+
+
+class GraphError(Exception):
+    def __init__(self, kind, message, status=None, code=None):
+        super().__init__(message)
+        self.kind = kind  # rate_limited / transient / permanent
+        self.status = status
+        self.code = code
+
+
+def classify(response):
+    """Graph API 回應 -> None（成功）或 GraphError"""
+    if response.status_code == 200:
+        return None
+    try:
+        error = response.json().get("error", {})
+    except ValueError:
+        error = {}
+    code = error.get("code")
+    message = error.get("message") or response.text[:200]
+    if code in RATE_LIMIT_CODES or response.status_code == 429:
+        kind = "rate_limited"
+    elif code in TRANSIENT_CODES or error.get("is_transient") or response.status_code >= 500:
+        kind = "transient"
+    else:
+        kind = "permanent"
+    return GraphError(kind, f"HTTP {response.status_code} code={code}: {message}", response.status_code, code)
+
+
+def backoff_delay(attempts):
+    return min(BACKOFF * 2 ** max(attempts - 1, 0), MAX_BACKOFF) * random.uniform(0.5, 1.5)
+
+
+class Publisher:
+    """用同一個 Session（連線池）把佇列送到 Graph API"""
+
+    def __init__(self, outbox, session=None, pacer=None, graph_url=None, max_wait=MAX_WAIT):
+        from news_fetcher import build_session
+
+        self.outbox = outbox
+        self.session = session or build_session(pool_size=2)
+        self.pacer = pacer or Pacer()
+        self.graph_url = (graph_url or GRAPH_URL).rstrip("/")
+        self.max_wait = max_wait
+
+    def close(self):
+        self.session.close()
+
+    def _request(self, method, path, endpoint, **kwargs):
+        with tracing.external("graph_api", endpoint=endpoint) as call:
+            r = self.session.request(method, f"{self.graph_url}/{path}", timeout=30, **kwargs)
+            call["status"] = r.status_code
+            call["usage"] = self.pacer.usage
+        self.pacer.update(r.headers)
+        return r
+
+    def find_existing(self, row, token):
+        """
+        上次送出後結果不明時，先查粉專最近的貼文，有相同內容就視為已發出（避免重試造成重複貼文）。
+        回傳 post id 或 None；查詢失敗時丟出 GraphError。
+        讀取貼文與發文需要的權限不同，查詢被拒（403、權限不足）不代表貼文發不出去，
+        所以一律當成可重試的錯誤（限流除外）；不直接改發，避免重複貼文，次數用完才標成 failed。
+        """
+        r = self._request("GET", f"{row['page_id']}/posts", "posts",
+                          params={"fields": "id,message,created_time", "limit": 25,
+                                  "since": int(row["created_at"]) - 60, "access_token": token})
+        error = classify(r)
+        if error:
+            kind = "rate_limited" if error.kind == "rate_limited" else "transient"
+            raise GraphError(kind, f"查詢是否已發出失敗（貼文可能已經發出）: {error}", error.status, error.code)
+        message = row["message"].strip()
+        for post in r.json().get("data", []):
+            if (post.get("message") or "").strip() == message:
+                return post["id"]
+        return None
+
+    def publish(self, row):
+        """送出一篇；成功回傳 post id，失敗丟出 GraphError 或 requests 的例外"""
+        token = page_token(row["page_id"])
+        if not token:
+            raise GraphError("permanent", f"缺少粉專 {row['page_id']} 的存取權杖（FB_ACCESS_TOKEN / FB_PAGE_TOKENS）")
+        if row["status"] == "sending":
+            existing = self.find_existing(row, token)
+            if existing:
+                return existing
+        data = {"message": row["message"], "access_token": token}
+        if row["link"]:
+            data["link"] = row["link"]
+        r = self._request("POST", f"{row['page_id']}/feed", "feed", data=data)
+        self.pacer.sent()
+        error = classify(r)
+        if error:
+            raise error
+        return r.json().get("id")
+
+    def drain(self, deadline=None) -> dict:
+        """
+        把到期的項目依序送出，直到佇列清空或下一次要等超過 max_wait。
+        回傳各結果的數量：{"done": n, "retry": n, "failed": n, "deferred": n}
+        """
+        deadline = deadline or time.time() + self.max_wait
+        stats = {"done": 0, "retry": 0, "failed": 0, "deferred": 0}
+        while True:
+            rows = self.outbox.due()
+            if not rows:
+                next_at = self.outbox.next_due_at()
+                # 重試等待在時限內就等，否則留給下次執行
+                if next_at is None or next_at > deadline:
+                    stats["deferred"] = self.outbox.count_active()
+                    return stats
+                time.sleep(max(next_at - time.time(), 0))
+                continue
+            row = rows[0]
+            wait = self.pacer.delay()
+            if time.time() + wait > deadline:
+                stats["deferred"] = self.outbox.count_active()
+                return stats
+            if wait > 0:
+                if wait >= 1:
+                    print(f"Pacing: waiting {wait:.1f}s (usage {self.pacer.usage}%)")
+                time.sleep(wait)
+            if not self.outbox.claim(row):
+                continue
+            attempts = row["attempts"] + 1
+            with tracing.span("publish", post=row["id"], page=row["page_id"], attempt=attempts) as sp:
+                try:
+                    post_id = self.publish(row)
+                except (GraphError, requests.exceptions.RequestException) as e:
+                    kind = e.kind if isinstance(e, GraphError) else "unknown"
+                    sp.set(error_kind=kind)
+                    if kind == "permanent" or attempts >= MAX_ATTEMPTS:
+                        self.outbox.mark(row["id"], "failed", last_error=str(e))
+                        stats["failed"] += 1
+                        print(f"❌ Post {row['id']} failed: {e}")
+                        continue
+                    delay = backoff_delay(attempts)
+                    if kind == "rate_limited":
+                        delay = max(delay, self.pacer.delay())
+                    # 連線中斷 / 逾時 / 5xx 時請求可能已經發出，保持 sending，重試前先查是否已存在
+                    status = "sending" if kind in ("unknown", "transient") else "pending"
+                    self.outbox.mark(row["id"], status, last_error=str(e), next_attempt_at=time.time() + delay)
+                    stats["retry"] += 1
+                    print(f"⚠️ Post {row['id']} attempt {attempts} failed ({e}); retrying in {delay:.1f}s")
+                    continue
+                self.outbox.mark(row["id"], "done", post_id=post_id, last_error=None)
+                sp.set(post_id=post_id)
+                stats["done"] += 1
+                print(f"✅ Post {row['id']} published: {post_id}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Facebook 發文佇列")
+    parser.add_argument("--db", default=None, help=f"佇列資料庫（預設 PUBLISH_QUEUE_DB 或 {DB_PATH}）")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    e = sub.add_parser("enqueue", help="把 Markdown 檔轉成貼文加入佇列")
+    e.add_argument("file")
+    e.add_argument("--page", default=os.getenv("FB_PAGE_ID"), help="粉專 ID（預設 FB_PAGE_ID）")
+    e.add_argument("--at", help="排程時間，ISO 格式，沒時區視為台灣時間")
+    e.add_argument("--link")
+    d = sub.add_parser("drain", help="送出到期的貼文")
+    d.add_argument("--max-wait", type=float, default=MAX_WAIT, help="最多等幾秒（限流、重試）")
+    ls = sub.add_parser("list", help="列出佇列")
+    ls.add_argument("--status")
+    for name, help_text in (("retry", "重試 failed 的項目"), ("cancel", "取消尚未發出的項目")):
+        p = sub.add_parser(name, help=help_text)
+        p.add_argument("id", type=int)
+    args = parser.parse_args()
+
+    with closing(Outbox(args.db)) as outbox:
+        if args.cmd == "enqueue":
+            import formatter
+
+            if not args.page:
+                parser.error("缺少 --page 或 FB_PAGE_ID")
+            with open(args.file, "r", encoding="utf-8") as f:
+                message = formatter.to_facebook(f.read())
+            at = parse_time(args.at) if args.at else None
+            item_id, added = outbox.enqueue(args.page, message, source=os.path.basename(args.file),
+                                            link=args.link, scheduled_at=at)
+            print(f"{'Queued' if added else 'Already queued'} #{item_id}")
+        elif args.cmd == "drain":
+            with tracing.run("publish_queue"):
+                publisher = Publisher(outbox, max_wait=args.max_wait)
+                try:
+                    stats = publisher.drain()
+                finally:
+                    publisher.close()
+            print(f"done={stats['done']} retry={stats['retry']} failed={stats['failed']} deferred={stats['deferred']}")
+            if stats["failed"]:
+                raise SystemExit(1)
+        elif args.cmd == "list":
+            for row in outbox.list(args.status):
+                print(f"#{row['id']:<4} {row['status']:<9} page={row['page_id']} at={format_time(row['scheduled_at'])} "
+                      f"attempts={row['attempts']} post={row['post_id'] or '-'} {row['source'] or ''}"
+                      + (f"\n      {row['last_error']}" if row["last_error"] else ""))
+        elif args.cmd == "retry":
+            outbox.retry(args.id)
+        elif args.cmd == "cancel":
+            outbox.cancel(args.id)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+import math
+import os
+from datetime import datetime
+
+from llm_pipeline import estimate_tokens, format_article
+from search_index import tokenize
+
+# 每天最多送幾篇給模型（0 表示不限篇數；有指定 budget 時仍受 budget 限制）
+TOP_K = int(os.getenv("NEWSLETTER_TOP_K", "40"))
+# 各項分數的權重：與當日主題的相關度（TF-IDF 中心性）、新鮮度
+W_CENTRALITY = 0.7
+W_RECENCY = 0.3
+# 新鮮度半衰期（小時），以當天最新一篇為基準
+HALF_LIFE_HOURS = 24
+# MMR：越小越重視與已選文章的差異
+MMR_LAMBDA = 0.7
+# 同一來源每多選一篇，分數乘上這個係數
+SOURCE_DECAY = 0.8
+
+
+def settings() -> dict:
+    """影響挑選結果的參數（newsletter.input_hash 用）"""
+    return {"top_k": TOP_K, "w_centrality": W_CENTRALITY, "w_recency": W_RECENCY,
+            "half_life_hours": HALF_LIFE_HOURS, "mmr_lambda": MMR_LAMBDA, "source_decay": SOURCE_DECAY}
+
+
+def _vector(item: dict) -> dict:
+    """title 權重加倍的 TF-IDF 前的詞頻向量"""
+    tf = {}
+    for field, weight in (("title", 2), ("summary", 1)):
+        for group in tokenize(item.get(field) or ""):
+            for tok in group:
+                tf[tok] = tf.get(tok, 0) + weight
+    return tf
+
+
+def _tfidf(vectors: list[dict]) -> list[dict]:
+    n = len(vectors)
+    df = {}
+    for v in vectors:
+        for t in v:
+            df[t] = df.get(t, 0) + 1
+    out = []
+    for v in vectors:
+        w = {t: (1 + math.log(c)) * math.log(1 + n / df[t]) for t, c in v.items()}
+        norm = math.sqrt(sum(x * x for x in w.values())) or 1.0
+        out.append({t: x / norm for t, x in w.items()})
+    return out
+
+
+def _cosine(a: dict, b: dict) -> float:
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(x * b.get(t, 0.0) for t, x in a.items())
+
+
+def _parse_time(s):
+    try:
+        return datetime.fromisoformat(str(s).replace(" UTC", "+00:00"))
+    except (TypeError, ValueError):
+        return None
+
+
+def score_articles(articles: list[dict]) -> tuple[list[float], list[dict]]:
+    """回傳 (每篇的相關分數, TF-IDF 向量)。"""
+    vecs = _tfidf([_vector(a) for a in articles])
+    centroid = {}
+    for v in vecs:
+        for t, x in v.items():
+            centroid[t] = centroid.get(t, 0.0) + x / len(vecs)
+    norm = math.sqrt(sum(x * x for x in centroid.values())) or 1.0
+    centroid = {t: x / norm for t, x in centroid.items()}
+
+    times = [_parse_time(a.get("published_at")) for a in articles]
+    latest = max((t for t in times if t), default=None)
+    scores = []
+    for v, t in zip(vecs, times):
+        if latest and t:
+            age = max((latest - t).total_seconds() / 3600, 0)
+            recency = 0.5 ** (age / HALF_LIFE_HOURS)
+        else:
+            recency = 0.5
+        scores.append(W_CENTRALITY * _cosine(v, centroid) + W_RECENCY * recency)
+    return scores, vecs
+
+
+def select_articles(articles: list[dict], k=None, budget=None) -> list[dict]:
+    """
+    依相關度挑出多樣化的前 k 篇（MMR + 來源多樣性），且 prompt 總長不超過 budget（估計 token）。
+    k 為 None 時用 TOP_K；第一篇一定會選，即使單篇就超過 budget。
+    回傳依挑選順序（重要的在前）排列的文章。
+    """
+    k = TOP_K if k is None else k
+    if len(articles) <= 1 or (not k and budget is None):
+        return list(articles)
+    # k 為 0 時不限篇數，只看 budget
+    k = k or len(articles)
+
+    scores, vecs = score_articles(articles)
+    remaining = set(range(len(articles)))
+    # 每篇與已選文章的最大相似度，每選一篇只更新一次
+    redundancy = [0.0] * len(articles)
+    chosen = []
+    per_source = {}
+    used = 0
+    while remaining and len(chosen) < k:
+        best, best_val = None, None
+        for i in remaining:
+            val = MMR_LAMBDA * scores[i] - (1 - MMR_LAMBDA) * redundancy[i]
+            val *= SOURCE_DECAY ** per_source.get(articles[i].get("source"), 0)
+            if best_val is None or val > best_val:
+                best, best_val = i, val
+        remaining.discard(best)
+        cost = estimate_tokens(format_article(len(chosen) + 1, articles[best]))
+        if budget is not None and chosen and used + cost > budget:
+            # 放不下這篇就略過，繼續看較短的候選
+            continue
+        chosen.append(best)
+        used += cost
+        src = articles[best].get("source")
+        per_source[src] = per_source.get(src, 0) + 1
+        for i in remaining:
+            redundancy[i] = max(redundancy[i], _cosine(vecs[i], vecs[best]))
+    return [articles[i] for i in chosen]
@@ -0,0 +1,222 @@
+import argparse
+import json
+import math
+import os
+from datetime import date, timedelta
+
+from dedup_index import INDEX_DIR, day_files
+from search_index import tokenize
+
+# 每日統計：{"version": 1, "days": {日期: {"n": 篇數, "source": {...}, "keyword": {...}, "term": {...}}}}
+# 隨 data/ 一起 commit；store_news.py 每次只加上新收錄的文章
+ROLLUP_PATH = os.path.join(INDEX_DIR, "rollups.json")
+VERSION = 1
+DIMENSIONS = ("source", "keyword", "term")
+
+# 近期視窗與比較基準（天）
+WINDOW_DAYS = 7
+BASELINE_DAYS = 28
+# 超出視窗 + 基準範圍的日子，term 只保留前幾名（檔案大小不隨歷史無限成長）
+TERM_KEEP = 50
+# 近期出現少於這個次數的不算升溫
+MIN_BURST_COUNT = 3
+STOP_TERMS = {
+  "ai", "the", "and", "of", "to", "in", "for", "on", "with", "a", "an", "is",
+  "人工", "工智", "智慧", "宣布", "推出", "發表", "表示", "什麼", "如何", "不是",
+}
+
+
+def item_terms(item: dict) -> set:
+  """標題的詞：中文取 bigram、英數取整個單字（與全文檢索相同的切法），每篇每個詞只算一次"""
+  terms = set()
+  for group in tokenize(item.get("title") or ""):
+    for tok in group:
+      if len(tok) > 1 and not tok.isdigit() and tok not in STOP_TERMS:
+        terms.add(tok)
+  return terms
+
+
+def _days(end: date, n: int) -> list[str]:
+  return [(end - timedelta(days=i)).isoformat() for i in range(n)]
+
+
+def merge_bigrams(rows):
+  """
+  相鄰的中文 bigram 篇數相同時接成一個詞（「伺服」+「服器」-> 「伺服器」），只用在顯示。
+  rows 是 bursts() 的結果，維持原本順序。
+  """
+  rows = list(rows)
+  merged = True
+  while merged:
+    merged = False
+    for i, a in enumerate(rows):
+      for j, b in enumerate(rows):
+        if i != j and a[1] == b[1] and a[0][-1] == b[0][0] and not a[0].isascii() and not b[0].isascii():
+          rows[i] = (a[0] + b[0][1:],) + tuple(a[1:])
+          del rows[j]
+          merged = True
+          break
+      if merged:
+        break
+  return rows
+
+
+class Rollups:
+  """
+  每日的來源 / 關鍵字 / 標題詞篇數。
+  更新只碰新收錄的文章；查詢只讀視窗內的日子，兩者都與歷史長度無關。
+  """
+
+  def __init__(self, path=ROLLUP_PATH):
+    self.path = path
+    self.days = {}
+    if os.path.exists(path):
+      with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+      if data.get("version") == VERSION:
+        self.days = data["days"]
+
+  def add(self, day: str, items) -> int:
+    bucket = self.days.setdefault(day, {"n": 0, "source": {}, "keyword": {}, "term": {}})
+    n = 0
+    for it in items:
+      n += 1
+      for dim, values in (("source", [it.get("source")]), ("keyword", [it.get("keyword")]), ("term", item_terms(it))):
+        counts = bucket[dim]
+        for v in values:
+          if v:
+            counts[v] = counts.get(v, 0) + 1
+    bucket["n"] += n
+    return n
+
+  def prune(self, today: date):
+    """比 視窗 + 基準 更早的日子，term 只留前 TERM_KEEP 名"""
+    cutoff = (today - timedelta(days=WINDOW_DAYS + BASELINE_DAYS)).isoformat()
+    for day, bucket in self.days.items():
+      if day < cutoff and len(bucket["term"]) > TERM_KEEP:
+        top = sorted(bucket["term"].items(), key=lambda kv: (-kv[1], kv[0]))[:TERM_KEEP]
+        bucket["term"] = dict(top)
+
+  def save(self, today: date | None = None):
+    if today is not None:
+      self.prune(today)
+    os.makedirs(os.path.dirname(self.path), exist_ok=True)
+    tmp = self.path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+      json.dump({"version": VERSION, "days": self.days}, f, ensure_ascii=False, separators=(",", ":"), sort_keys=True)
+    os.replace(tmp, self.path)
+
+  # ---- 查詢 ----
+
+  def volume(self, end: date, days: int) -> int:
+    return sum(self.days.get(d, {}).get("n", 0) for d in _days(end, days))
+
+  def counts(self, dim: str, end: date, days: int) -> dict:
+    """end（含）往前 days 天的合計"""
+    out = {}
+    for d in _days(end, days):
+      for k, c in self.days.get(d, {}).get(dim, {}).items():
+        out[k] = out.get(k, 0) + c
+    return out
+
+  def top(self, dim: str, end: date, days=WINDOW_DAYS, n=10) -> list[tuple[str, int]]:
+    return sorted(self.counts(dim, end, days).items(), key=lambda kv: (-kv[1], kv[0]))[:n]
+
+  def bursts(self, dim: str, end: date, window=WINDOW_DAYS, baseline=BASELINE_DAYS, n=10,
+             min_count=MIN_BURST_COUNT) -> list[tuple[str, int, float, float]]:
+    """
+    近 window 天相對前 baseline 天的升溫程度，回傳 [(名稱, 近期篇數, 預期篇數, 分數)]。
+    預期篇數 = 基準期篇數 x 近期總量 / 基準期總量（扣掉整體量的起伏）；
+    分數 = (近期 - 預期) / sqrt(預期 + 1)，類似 Poisson 的 z 分數，全新出現的詞也不會無限大。
+    """
+    recent = self.counts(dim, end, window)
+    base_end = end - timedelta(days=window)
+    base = self.counts(dim, base_end, baseline)
+    n_recent, n_base = self.volume(end, window), self.volume(base_end, baseline)
+    scale = n_recent / n_base if n_base else 0.0
+    out = []
+    for k, c in recent.items():
+      if c < min_count:
+        continue
+      expected = base.get(k, 0) * scale
+      out.append((k, c, round(expected, 1), round((c - expected) / math.sqrt(expected + 1), 2)))
+    out.sort(key=lambda r: (-r[3], r[0]))
+    return [r for r in out if r[3] > 0][:n]
+
+  def summary(self, end: date, window=WINDOW_DAYS, baseline=BASELINE_DAYS, n=6) -> str:
+    """給 LLM prompt 的量化趨勢摘要（幾行文字）；視窗內沒有資料回傳空字串"""
+    n_recent = self.volume(end, window)
+    if not n_recent:
+      return ""
+    n_base = self.volume(end - timedelta(days=window), baseline)
+    start = end - timedelta(days=window - 1)
+    line = f"近 {window} 天（{start.strftime('%m/%d')}–{end.strftime('%m/%d')}）共 {n_recent} 篇"
+    if n_base:
+      avg = n_base * window / baseline
+      line += f"，前 {baseline} 天平均每 {window} 天 {avg:.0f} 篇（{(n_recent - avg) / avg:+.0%}）"
+    lines = [line + "。"]
+    for dim, label in (("term", "升溫關鍵詞"), ("source", "報導增加的來源")):
+      rising = self.bursts(dim, end, window, baseline, n * 2)
+      rising = (merge_bigrams(rising) if dim == "term" else rising)[:n]
+      if rising:
+        lines.append(f"{label}：" + "、".join(f"{k}（{c} 篇，平常約 {e:g}）" for k, c, e, _ in rising))
+    top = self.top("source", end, window, n)
+    if top:
+      lines.append("主要來源：" + "、".join(f"{k} {c}" for k, c in top))
+    return "\n".join(lines)
+
+
+def rebuild(data_dir="data", path=ROLLUP_PATH) -> Rollups:
+  """從頭掃過整個 data/ 重建（第一次使用或統計規則改變時）"""
+  from store_news import load_json
+
+  r = Rollups(path)
+  r.days = {}
+  last = None
+  for p in day_files(data_dir):
+    day = os.path.basename(p)[:-len(".json")]
+    items = []
+    for it in load_json(p):
+      items.append(it)
+      items.extend(dict(rel, keyword=it.get("keyword")) for rel in it.get("related", []))
+    r.add(day, items)
+    last = day
+  r.save(date.fromisoformat(last) if last else None)
+  return r
+
+
+def main():
+  parser = argparse.ArgumentParser(description="來源 / 關鍵字 / 標題詞的每日統計與升溫偵測")
+  sub = parser.add_subparsers(dest="cmd", required=True)
+  b = sub.add_parser("rebuild", help="掃描整個 data/ 重建統計")
+  b.add_argument("--data-dir", default="data")
+  for name, help_text in (("top", "視窗內篇數最多的項目"), ("bursts", "相對基準期升溫最多的項目")):
+    q = sub.add_parser(name, help=help_text)
+    q.add_argument("--dim", choices=DIMENSIONS, default="term")
+    q.add_argument("--end", help="YYYY-MM-DD（預設最後一天有資料的日子）")
+    q.add_argument("--days", type=int, default=WINDOW_DAYS)
+    q.add_argument("-n", type=int, default=10)
+  s = sub.add_parser("summary", help="給 prompt 用的趨勢摘要")
+  s.add_argument("--end", help="YYYY-MM-DD（預設最後一天有資料的日子）")
+  args = parser.parse_args()
+
+  if args.cmd == "rebuild":
+    r = rebuild(args.data_dir)
+    print(f"✅ Rolled up {sum(b['n'] for b in r.days.values())} items over {len(r.days)} days to {ROLLUP_PATH}")
+    return
+  r = Rollups()
+  if not r.days:
+    raise SystemExit(f"{ROLLUP_PATH} is empty; run python scripts/rollups.py rebuild first")
+  end = date.fromisoformat(args.end) if args.end else date.fromisoformat(max(r.days))
+  if args.cmd == "top":
+    for k, c in r.top(args.dim, end, args.days, args.n):
+      print(f"{c:>6}  {k}")
+  elif args.cmd == "bursts":
+    for k, c, e, score in r.bursts(args.dim, end, args.days, n=args.n):
+      print(f"{score:>7.2f}  {c:>5} vs {e:<6g} {k}")
+  else:
+    print(r.summary(end))
+
+
+if __name__ == "__main__":
+  main()
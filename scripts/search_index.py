@@ -0,0 +1,292 @@
+import argparse
+import json
+import math
+import os
+import re
+import shutil
+import time
+import unicodedata
+
+from dedup_index import day_files, file_hash, key_digest
+
+DATA_DIR = "data"
+# 靜態索引檔，跟著 data/ 一起 commit，前端可以直接抓（與當日檔相同的 raw 網址）：
+#   _search/manifest.json        {"shards": 32, "hash": "fnv1a32", "months": {月份: {"days", "n_docs", "total_len"}}}
+#   _search/YYYY-MM/docs.json    {doc_id: {"d": 日期, "t": 標題, "u": 網址, "s": 來源, "p": 發布時間, "l": 長度}}
+#   _search/YYYY-MM/tNN.json     {term: {doc_id: [位置, ...]}}，NN = shard_of(term)
+# store_news 每次只重建當月的 segment，內容沒變的檔案不會重寫
+SEARCH_DIR = os.path.join(DATA_DIR, "_search")
+MANIFEST_PATH = os.path.join(SEARCH_DIR, "manifest.json")
+
+# 每個月一個 segment，segment 內依 term hash 分成 SHARDS 個檔，前端查一個詞只需載入對應分片。
+# hash 用 UTF-8 bytes 的 32-bit FNV-1a，瀏覽器幾行 JS 就能算出同樣的分片（md5 沒有內建）
+SHARDS = 32
+SHARD_HASH = "fnv1a32"
+# 各欄位的位置起點，欄位之間留空隙避免片語跨欄位誤配
+FIELD_OFFSETS = {"title": 0, "summary": 1000, "source": 2000}
+TITLE_BOOST = 2
+K1 = 1.2
+B = 0.75
+
+TOKEN_RE = re.compile(r"[㐀-䶿一-鿿぀-ヿ가-힯]+|[a-z0-9]+")
+CJK_RE = re.compile(r"[㐀-䶿一-鿿぀-ヿ가-힯]")
+
+
+def tokenize(text: str) -> list[list[str]]:
+  """
+  切成「片語」列表：連續的中日韓文字取 bigram（單字則保留單字），英數取整個單字。
+  一個片語內的 token 位置相連，例如「台積電」-> [["台積", "積電"]]。
+  """
+  text = unicodedata.normalize("NFKC", text or "").lower()
+  groups = []
+  for run in TOKEN_RE.findall(text):
+    if CJK_RE.match(run):
+      groups.append([run] if len(run) == 1 else [run[i:i + 2] for i in range(len(run) - 1)])
+    else:
+      groups.append([run])
+  return groups
+
+
+def shard_of(term: str) -> str:
+  h = 0x811C9DC5
+  for b in term.encode("utf-8"):
+    h = ((h ^ b) * 0x01000193) & 0xFFFFFFFF
+  return f"{h % SHARDS:02d}"
+
+
+def month_of(day: str) -> str:
+  return day[:7]
+
+
+def _write_json(path, obj):
+  """內容與既有檔案相同就不寫，沒變的分片不會出現在 git 變更裡"""
+  payload = json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+  try:
+    with open(path, "rb") as f:
+      if f.read() == payload:
+        return False
+  except FileNotFoundError:
+    pass
+  tmp = path + ".tmp"
+  with open(tmp, "wb") as f:
+    f.write(payload)
+  os.replace(tmp, path)
+  return True
+
+
+def _read_json(path, default):
+  if not os.path.exists(path):
+    return default
+  with open(path, "r", encoding="utf-8") as f:
+    return json.load(f)
+
+
+def index_doc(item: dict) -> tuple[dict, int]:
+  """回傳 (term -> 位置列表, 文件長度)。"""
+  postings = {}
+  length = 0
+  for field, offset in FIELD_OFFSETS.items():
+    pos = offset
+    for group in tokenize(item.get(field) or ""):
+      for tok in group:
+        postings.setdefault(tok, []).append(pos)
+        pos += 1
+      length += len(group)
+  return postings, length
+
+
+def build_month(month: str, day_paths: list[str]) -> dict:
+  """重建單一月份的 segment（只讀該月的每日檔），回傳該月的統計。"""
+  from store_news import item_key, load_json
+
+  seg_dir = os.path.join(SEARCH_DIR, month)
+  docs = {}
+  shards = {}
+  total_len = 0
+  for p in day_paths:
+    day = os.path.basename(p)[:-len(".json")]
+    for it in load_json(p):
+      doc_id = key_digest(item_key(it))
+      if doc_id in docs:
+        continue
+      postings, length = index_doc(it)
+      docs[doc_id] = {
+        "d": day,
+        "t": it.get("title", ""),
+        "u": it.get("canonical_url") or it.get("url", ""),
+        "s": it.get("source", ""),
+        "p": it.get("published_at", ""),
+        "l": length,
+      }
+      total_len += length
+      for term, positions in postings.items():
+        shards.setdefault(shard_of(term), {}).setdefault(term, {})[doc_id] = positions
+
+  os.makedirs(seg_dir, exist_ok=True)
+  files = {"docs.json": docs, **{f"t{shard}.json": terms for shard, terms in shards.items()}}
+  for name in os.listdir(seg_dir):
+    if name not in files:
+      os.remove(os.path.join(seg_dir, name))
+  for name, obj in files.items():
+    _write_json(os.path.join(seg_dir, name), obj)
+  return {"n_docs": len(docs), "total_len": total_len}
+
+
+def update(data_dir=DATA_DIR, force=False, only_months=None):
+  """
+  只重建有日期檔變動的月份；成本與變動月份大小成正比，與整個歷史無關。
+  only_months：只檢查這些月份（store_news 寫入當日時用），其他月份沿用 manifest。
+  """
+  manifest = {} if force else _read_json(MANIFEST_PATH, {})
+  months = manifest.get("months", {})
+  if manifest.get("shards", SHARDS) != SHARDS or manifest.get("hash") != SHARD_HASH:
+    months = {}
+
+  by_month = {}
+  for p in day_files(data_dir):
+    day = os.path.basename(p)[:-len(".json")]
+    if only_months is None or month_of(day) in only_months:
+      by_month.setdefault(month_of(day), {})[day] = (p, file_hash(p))
+
+  os.makedirs(SEARCH_DIR, exist_ok=True)
+  rebuilt = []
+  for month, days in sorted(by_month.items()):
+    hashes = {d: h for d, (_, h) in days.items()}
+    if months.get(month, {}).get("days") == hashes:
+      continue
+    stats = build_month(month, [p for p, _ in days.values()])
+    months[month] = {"days": hashes, **stats}
+    rebuilt.append(month)
+
+  for month in set(months) - set(by_month) if only_months is None else ():
+    shutil.rmtree(os.path.join(SEARCH_DIR, month), ignore_errors=True)
+    months.pop(month)
+
+  _write_json(MANIFEST_PATH, {"shards": SHARDS, "hash": SHARD_HASH, "months": months})
+  return rebuilt
+
+
+class Searcher:
+  """讀取靜態索引檔做查詢，分片檔載入後會快取在記憶體。"""
+
+  def __init__(self, search_dir=SEARCH_DIR):
+    self.search_dir = search_dir
+    self.manifest = _read_json(os.path.join(search_dir, "manifest.json"), {"months": {}})
+    self._shards = {}
+    self._docs = {}
+
+  def _shard(self, month, term):
+    key = (month, shard_of(term))
+    if key not in self._shards:
+      self._shards[key] = _read_json(os.path.join(self.search_dir, month, f"t{key[1]}.json"), {})
+    return self._shards[key].get(term, {})
+
+  def _month_docs(self, month):
+    if month not in self._docs:
+      self._docs[month] = _read_json(os.path.join(self.search_dir, month, "docs.json"), {})
+    return self._docs[month]
+
+  def search(self, query: str, date_from=None, date_to=None, k=10) -> list[dict]:
+    groups = []
+    for quoted, plain in re.findall(r'"([^"]+)"|(\S+)', query):
+      if quoted:
+        # 引號內視為一個片語
+        groups.append([tok for g in tokenize(quoted) for tok in g])
+      else:
+        groups.extend(tokenize(plain))
+    groups = [g for g in groups if g]
+    if not groups:
+      return []
+
+    months = [m for m in sorted(self.manifest["months"])
+              if (not date_from or m >= date_from[:7]) and (not date_to or m <= date_to[:7])]
+    n_docs = sum(self.manifest["months"][m]["n_docs"] for m in months)
+    total_len = sum(self.manifest["months"][m]["total_len"] for m in months)
+    if not n_docs:
+      return []
+    avgdl = total_len / n_docs
+
+    terms = {tok for g in groups for tok in g}
+    postings = {t: {} for t in terms}
+    for m in months:
+      for t in terms:
+        postings[t].update(self._shard(m, t))
+
+    # 所有片語都要出現（AND），片語內的 token 位置需相連
+    candidates = None
+    for g in groups:
+      docs = set(postings[g[0]])
+      for t in g[1:]:
+        docs &= set(postings[t])
+      docs = {d for d in docs if _phrase_match([postings[t][d] for t in g])}
+      candidates = docs if candidates is None else candidates & docs
+      if not candidates:
+        return []
+
+    results = []
+    for doc_id in candidates:
+      doc = None
+      for m in months:
+        doc = self._month_docs(m).get(doc_id)
+        if doc:
+          break
+      if doc is None:
+        continue
+      if (date_from and doc["d"] < date_from) or (date_to and doc["d"] > date_to):
+        continue
+      score = 0.0
+      for t in terms:
+        positions = postings[t].get(doc_id)
+        if not positions:
+          continue
+        df = len(postings[t])
+        idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+        tf = sum(TITLE_BOOST if p < FIELD_OFFSETS["summary"] else 1 for p in positions)
+        score += idf * tf * (K1 + 1) / (tf + K1 * (1 - B + B * doc["l"] / avgdl))
+      results.append({"score": round(score, 4), "id": doc_id, "date": doc["d"], "title": doc["t"],
+                      "url": doc["u"], "source": doc["s"], "published_at": doc["p"]})
+    results.sort(key=lambda r: (r["score"], r["published_at"]), reverse=True)
+    return results[:k]
+
+
+def _phrase_match(position_lists) -> bool:
+  if len(position_lists) == 1:
+    return True
+  following = [set(p) for p in position_lists[1:]]
+  return any(all(start + i + 1 in s for i, s in enumerate(following)) for start in position_lists[0])
+
+
+def main():
+  parser = argparse.ArgumentParser(description="新聞全文檢索（BM25）")
+  sub = parser.add_subparsers(dest="cmd", required=True)
+  b = sub.add_parser("build", help="重建整個索引")
+  b.add_argument("--data-dir", default=DATA_DIR)
+  u = sub.add_parser("update", help="只更新有變動的月份")
+  u.add_argument("--data-dir", default=DATA_DIR)
+  q = sub.add_parser("search", help="查詢")
+  q.add_argument("query")
+  q.add_argument("--from", dest="date_from", help="YYYY-MM-DD")
+  q.add_argument("--to", dest="date_to", help="YYYY-MM-DD")
+  q.add_argument("-k", type=int, default=10)
+  q.add_argument("--json", action="store_true", help="輸出 JSON")
+  args = parser.parse_args()
+
+  if args.cmd in ("build", "update"):
+    t0 = time.perf_counter()
+    rebuilt = update(args.data_dir, force=args.cmd == "build")
+    print(f"✅ Indexed {len(rebuilt)} month(s) in {time.perf_counter() - t0:.2f}s: {', '.join(rebuilt) or '-'}")
+    return
+
+  t0 = time.perf_counter()
+  results = Searcher().search(args.query, args.date_from, args.date_to, args.k)
+  elapsed = (time.perf_counter() - t0) * 1000
+  if args.json:
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+    return
+  for r in results:
+    print(f"{r['score']:7.3f}  {r['date']}  [{r['source']}] {r['title']}\n         {r['url']}")
+  print(f"-- {len(results)} result(s) in {elapsed:.1f} ms")
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,205 @@
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from datetime import datetime
+
+CACHE_DIR = "tmp/serp_cache"
+
+# 模式：
+#   on     - 有未過期快取就用，沒有才打 API 並寫回（預設）
+#   off    - 完全不讀寫快取
+#   record - 一律打 API，但把回應寫進快取（重新錄製）
+#   replay - 只讀快取、忽略 TTL，完全不連網；沒錄到的查詢會丟 CacheMiss
+MODES = {"on", "off", "record", "replay"}
+
+# 不參與 key 計算的參數（token 不同不影響結果）
+IGNORED_PARAMS = {"api_key"}
+
+
+class CacheMiss(KeyError):
+    pass
+
+
+def _norm_date(s):
+    """SerpAPI 的 M/D/YYYY 轉成 YYYY-MM-DD，讓 8/1/2026 與 08/01/2026 是同一個 key。"""
+    try:
+        return datetime.strptime(str(s).strip(), "%m/%d/%Y").date().isoformat()
+    except ValueError:
+        return str(s).strip()
+
+
+def normalize_params(params: dict) -> dict:
+    out = {}
+    for k, v in params.items():
+        if k in IGNORED_PARAMS or v in (None, ""):
+            continue
+        if k in ("start_date", "end_date"):
+            v = _norm_date(v)
+        elif k == "q":
+            v = " ".join(str(v).split()).lower()
+        elif k == "start" and int(v) == 0:
+            continue
+        out[k] = str(v)
+    return out
+
+
+def cache_key(params: dict) -> str:
+    payload = json.dumps(normalize_params(params), sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    以正規化查詢參數為 key 的磁碟快取，一個查詢一個 JSON 檔，超過容量時依最後使用時間淘汰。
+    子類別可覆寫 key / describe / cacheable 來快取其他種類的請求（例如 llm_cache）。
+    """
+
+    def __init__(self, cache_dir=CACHE_DIR, ttl=24 * 3600, max_bytes=200 * 1024 * 1024, mode="on"):
+        if mode not in MODES:
+            raise ValueError(f"未知的快取模式: {mode}")
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.mode = mode
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def key(self, params):
+        return cache_key(params)
+
+    def describe(self, params):
+        """寫進快取檔、方便人工檢查的請求摘要"""
+        return normalize_params(params)
+
+    def cacheable(self, response):
+        # SerpAPI 的錯誤（額度用完、查無結果等）不快取
+        return isinstance(response, dict) and "error" not in response
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def get(self, params, ttl=None):
+        """ttl 可針對單一查詢縮短有效期限（例如還在持續更新的時間範圍）"""
+        path = self._path(self.key(params))
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        if self.mode != "replay" and time.time() - entry.get("fetched_at", 0) > ttl:
+            return None
+        os.utime(path)  # 更新使用時間，淘汰時較晚被移除
+        return entry["response"]
+
+    def put(self, params, response):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self._path(self.key(params))
+        entry = {"params": self.describe(params), "fetched_at": time.time(), "response": response}
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(entry, f, ensure_ascii=False)
+        os.replace(tmp, path)
+        self.evict()
+
+    def fetch(self, params, fetch_fn, ttl=None):
+        """查快取，沒命中就呼叫 fetch_fn() 取得回應並寫回（cacheable 為 False 的不寫）。"""
+        if self.mode == "off":
+            return fetch_fn()
+        if self.mode != "record":
+            cached = self.get(params, ttl=ttl)
+            if cached is not None:
+                self.hits += 1
+                return cached
+            if self.mode == "replay":
+                raise CacheMiss(f"replay 模式下沒有錄到這個查詢: {self.describe(params)}")
+        self.misses += 1
+        response = fetch_fn()
+        if self.cacheable(response):
+            self.put(params, response)
+        return response
+
+    def _entries(self):
+        if not os.path.isdir(self.cache_dir):
+            return []
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".json"):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+        return entries
+
+    def evict(self):
+        """刪掉過期項目（replay 模式除外），總量仍超過 max_bytes 時從最久沒用的開始刪。"""
+        with self._lock:
+            entries = sorted(self._entries())
+            now = time.time()
+            total = sum(size for _, size, _ in entries)
+            for mtime, size, path in entries:
+                expired = self.mode != "replay" and now - mtime > self.ttl
+                if not expired and total <= self.max_bytes:
+                    continue
+                try:
+                    os.remove(path)
+                    total -= size
+                except FileNotFoundError:
+                    pass
+
+    def clear(self):
+        for _, _, path in self._entries():
+            os.remove(path)
+
+    def stats(self):
+        entries = self._entries()
+        return {
+            "mode": self.mode,
+            "entries": len(entries),
+            "bytes": sum(size for _, size, _ in entries),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+_default = None
+_default_lock = threading.Lock()
+
+
+def default_cache() -> ResponseCache:
+    """依環境變數 SERP_CACHE_MODE / SERP_CACHE_DIR / SERP_CACHE_TTL / SERP_CACHE_MAX_MB 建立共用快取。"""
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = ResponseCache(
+                cache_dir=os.getenv("SERP_CACHE_DIR", CACHE_DIR),
+                ttl=int(os.getenv("SERP_CACHE_TTL", str(24 * 3600))),
+                max_bytes=int(float(os.getenv("SERP_CACHE_MAX_MB", "200")) * 1024 * 1024),
+                mode=os.getenv("SERP_CACHE_MODE", "on"),
+            )
+        return _default
+
+
+def main():
+    # 用法：python scripts/serp_cache.py [stats|prune|clear]
+    cmd = sys.argv[1] if len(sys.argv) > 1 else "stats"
+    cache = default_cache()
+    if cmd == "prune":
+        cache.evict()
+    elif cmd == "clear":
+        cache.clear()
+    elif cmd != "stats":
+        print(f"未知指令: {cmd}（可用 stats / prune / clear）")
+        sys.exit(1)
+    print(json.dumps(cache.stats(), ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+import argparse
+import gzip
+import json
+import os
+
+# 有 zstandard 才能讀寫 .json.zst；沒有時 gzip 一樣可用（標準函式庫）
+try:
+  import zstandard
+except ImportError:
+  zstandard = None
+
+# 當日檔的儲存格式：
+#   json    indent=2 純文字（舊行為，diff 好讀）
+#   compact 不縮排的 .json
+#   gzip    不縮排 + gzip 的 .json.gz
+#   zstd    不縮排 + zstd 的 .json.zst（需要 pip install zstandard）
+# 推到 main 的 data/ 必須是 json 或 compact：網站與外部使用者直接抓 raw 的 data/YYYY-MM-DD.json，
+# 壓縮格式只適合本機或封存用的目錄。
+# 沒設定時沿用既有檔案的格式（新檔用 json），本機跑 canonical migrate 之類不會把壓縮檔改回純文字
+FORMATS = ("json", "compact", "gzip", "zstd")
+STORE_FORMAT = os.getenv("STORE_FORMAT")
+EXTS = {"gzip": ".gz", "zstd": ".zst"}
+ZSTD_LEVEL = 19
+
+
+def variants(path):
+  """邏輯路徑 data/YYYY-MM-DD.json 可能對應的實體檔，讀取時依序嘗試。"""
+  return [path] + [path + ext for ext in EXTS.values()]
+
+
+def find(path):
+  """實際存在的實體檔路徑，沒有就回傳 None。"""
+  for p in variants(path):
+    if os.path.exists(p):
+      return p
+  return None
+
+
+def size(path):
+  """實體檔大小（壓縮後），給 tracing 記錄 bytes_read / bytes_written。"""
+  p = find(path)
+  return os.path.getsize(p) if p else 0
+
+
+def format_of(path):
+  """實體檔目前的格式；不存在回傳 None。"""
+  p = find(path)
+  if p is None:
+    return None
+  for fmt, ext in EXTS.items():
+    if p.endswith(ext):
+      return fmt
+  with open(p, "rb") as f:
+    return "compact" if f.read(2) == b"[{" else "json"
+
+
+def _require_zstd():
+  if zstandard is None:
+    raise RuntimeError("STORE_FORMAT=zstd 需要 zstandard 套件：pip install zstandard")
+
+
+def read_bytes(path):
+  """解壓後的內容；檔案不存在回傳 None。"""
+  p = find(path)
+  if p is None:
+    return None
+  with open(p, "rb") as f:
+    raw = f.read()
+  if p.endswith(EXTS["gzip"]):
+    return gzip.decompress(raw)
+  if p.endswith(EXTS["zstd"]):
+    _require_zstd()
+    return zstandard.ZstdDecompressor().decompress(raw)
+  return raw
+
+
+def encode(data, fmt=None):
+  """依格式序列化；回傳 (實體檔副檔名, bytes)。"""
+  fmt = fmt or "json"
+  if fmt not in FORMATS:
+    raise ValueError(f"Unknown STORE_FORMAT {fmt!r}; expected one of {', '.join(FORMATS)}")
+  if fmt == "json":
+    return "", json.dumps(data, ensure_ascii=False, indent=2).encode("utf-8")
+  raw = json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+  if fmt == "gzip":
+    # mtime=0：內容相同時輸出也相同，不會產生沒有意義的 git 變更
+    return EXTS["gzip"], gzip.compress(raw, compresslevel=9, mtime=0)
+  if fmt == "zstd":
+    _require_zstd()
+    return EXTS["zstd"], zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(raw)
+  return "", raw
+
+
+def write_json(path, data, fmt=None):
+  """寫入邏輯路徑 path 的指定格式，並刪掉其他格式的舊檔；回傳實體檔路徑。"""
+  ext, payload = encode(data, fmt or STORE_FORMAT or format_of(path))
+  target = path + ext
+  tmp = f"{target}.{os.getpid()}.tmp"
+  with open(tmp, "wb") as f:
+    f.write(payload)
+  os.replace(tmp, target)
+  for p in variants(path):
+    if p != target and os.path.exists(p):
+      os.remove(p)
+  return target
+
+
+def legacy_bytes(path):
+  """
+  內容以舊版 indent=2 格式表示的 bytes，給 file_hash 用：
+  同樣的資料不論存成哪種格式，hash 都不變，換格式不會讓 bundle / 電子報全部重建。
+  """
+  raw = read_bytes(path)
+  if raw is None:
+    return None
+  if format_of(path) == "json":
+    # indent=2 的舊格式直接用原始 bytes，不必解析
+    return raw
+  return json.dumps(json.loads(raw), ensure_ascii=False, indent=2).encode("utf-8")
+
+
+def migrate(paths, fmt):
+  """把 paths（邏輯路徑）全部轉成 fmt；回傳 (轉換的檔數, 轉換前 bytes, 轉換後 bytes)。"""
+  converted = before = after = 0
+  for path in paths:
+    p = find(path)
+    if p is None:
+      continue
+    before += os.path.getsize(p)
+    target = write_json(path, json.loads(read_bytes(path)), fmt)
+    after += os.path.getsize(target)
+    converted += 1
+  return converted, before, after
+
+
+def main():
+  from dedup_index import day_files
+  from store_news import DATA_DIR, store_lock
+
+  parser = argparse.ArgumentParser(description="data/ 當日檔的儲存格式轉換")
+  sub = parser.add_subparsers(dest="cmd", required=True)
+  p_mig = sub.add_parser("migrate", help="把所有當日檔轉成指定格式（.jsonl 紀錄檔不動）")
+  p_mig.add_argument("format", nargs="?", default=STORE_FORMAT or "compact", choices=FORMATS)
+  p_mig.add_argument("--dir", default=DATA_DIR)
+  sub.add_parser("stat", help="各格式的檔數與大小")
+  args = parser.parse_args()
+
+  if args.cmd == "migrate":
+    with store_lock():
+      n, before, after = migrate(day_files(args.dir), args.format)
+    ratio = after / before if before else 1
+    print(f"✅ Migrated {n} day files to {args.format}: {before:,} -> {after:,} bytes ({ratio:.0%})")
+  else:
+    counts = {}
+    for path in day_files(DATA_DIR):
+      p = find(path)
+      if p is None:
+        continue
+      ext = os.path.splitext(p)[1]
+      n, total = counts.get(ext, (0, 0))
+      counts[ext] = (n + 1, total + os.path.getsize(p))
+    for ext, (n, total) in sorted(counts.items()):
+      print(f"{ext}\t{n} files\t{total:,} bytes")
+
+
+if __name__ == "__main__":
+  main()
@@ -1,65 +1,204 @@
 import json  
 import os  
-from datetime import datetime  
+from contextlib import contextmanager
+from datetime import date, datetime  
 from zoneinfo import ZoneInfo  
-from urllib.parse import urlparse, urlunparse, parse_qsl, urlencode  
+import glob
 import hashlib
+import socket
+import sys
+try:
+  import fcntl
+except ImportError:  # Windows：不上鎖，只適合單一 worker
+  fcntl = None
+
+import canonical
+from canonical import canonicalize_url
+from dedup_index import KeyIndex
+from near_dup import LSHIndex, cluster_items
+import rollups
+import search_index
+import storage
+import tracing
+import watermark
 
 TAIPEI = ZoneInfo("Asia/Taipei")  
 DATA_DIR = "data"  
+# 舊版單一批次檔（仍會讀取）；新版每個 worker 各寫一個 tmp/batches/<時間>-<worker>.json
 BATCH_PATH = "tmp/news_batch.json"
+BATCH_DIR = "tmp/batches"
+# 同一台機器上多個 store 同時跑時，用這個檔案互斥（讀-合併-寫整段都在鎖內）
+LOCK_PATH = "tmp/store.lock"
+# json：每次重寫整個當日檔（舊行為）；jsonl：只 append 新增或變更的紀錄，之後再 compact
+STORE_MODE = os.getenv("STORE_MODE", "json")
 
-# 保留常見必要參數，其它像 utm_*, fbclid 會移除
-KEEP_QUERY_KEYS = {"id", "cid", "sid", "ref"} # 可自行調整
+# 短網址 / Google News 包裝連結連線展開（預設關閉，結果快取在 tmp/redirect_cache）
+RESOLVE_REDIRECTS = os.getenv("CANON_RESOLVE", "0") in ("1", "true", "on")
 
 def ensure_dirs():
   os.makedirs(DATA_DIR, exist_ok=True)  
   os.makedirs(os.path.dirname(BATCH_PATH), exist_ok=True)
+  os.makedirs(BATCH_DIR, exist_ok=True)
+
+def today_str():
+  return datetime.now(TAIPEI).date().isoformat() # YYYY-MM-DD
 
 def today_path(): 
-  today = datetime.now(TAIPEI).date().isoformat() # YYYY-MM-DD
-  return os.path.join(DATA_DIR, f"{today}.json")
+  return os.path.join(DATA_DIR, f"{today_str()}.json")
 
-def load_json(path):
-  if not os.path.exists(path):
+def log_path(path):
+  """當日檔 data/YYYY-MM-DD.json 對應的 append-only 紀錄檔 data/YYYY-MM-DD.jsonl"""
+  return os.path.splitext(path)[0] + ".jsonl"
+
+def _load_json_file(path):
+  # path 是邏輯路徑；實際可能是 .json、.json.gz 或 .json.zst（見 storage.py）
+  stored = storage.find(path)
+  if stored is None:
+    return []
+  try:
+    return json.loads(storage.read_bytes(path))
+  except (json.JSONDecodeError, UnicodeDecodeError, EOFError, OSError):
+    # 檔案損壞就備份並重建
+    backup = stored + ".corrupt"
+    os.replace(stored, backup)
     return []
+
+def read_jsonl(path):
+  records = []
   with open(path, "r", encoding="utf-8") as f:
-    try:
-      return json.load(f)  
-    except json.JSONDecodeError: 
-      # 檔案損壞就備份並重建
-      backup = path + ".corrupt"
-      os.replace(path, backup)  
-      return []
+    for line in f:
+      line = line.strip()
+      if not line:
+        continue
+      try:
+        records.append(json.loads(line))
+      except json.JSONDecodeError:
+        # 寫到一半中斷的最後一行，略過
+        continue
+  return records
+
+def fold_log(base: list[dict], records: list[dict]) -> list[dict]:
+  """把 jsonl 紀錄依序套到 base 上：同 key 後者覆蓋前者，{"_deleted": key} 表示刪除。"""
+  m = {item_key(it): it for it in base}
+  for rec in records:
+    if "_deleted" in rec:
+      m.pop(rec["_deleted"], None)
+    else:
+      m[item_key(rec)] = rec
+  return sorted(m.values(), key=sort_key, reverse=True)
+
+def load_json(path):
+  # .json（legacy 或 compact 後的檢視檔）加上尚未 compact 的 .jsonl 紀錄
+  data = _load_json_file(path)
+  log = log_path(path)
+  if path.endswith(".json") and os.path.exists(log):
+    data = fold_log(data, read_jsonl(log))
+  return data
+
+def sort_key(item):
+  return item.get("published_at") or item.get("scraped_at") or ""
 
 def save_json(path, data):  
   # 依 published_at（或 scraped_at）排序，最新在前  
-  def sort_key(item):  
-    return item.get("published_at") or item.get("scraped_at") or ""  
   data_sorted = sorted(data, key=sort_key, reverse=True)  
-  with open(path, "w", encoding="utf-8") as f:  
-    json.dump(data_sorted, f, ensure_ascii=False, indent=2)
+  # 依 STORE_FORMAT 寫成 .json / .json.gz / .json.zst；先寫暫存檔再 rename，中途當掉不會留下寫一半的當日檔
+  storage.write_json(path, data_sorted)
+
+def new_batch_path(worker=None):
+  """這個 worker 本次的批次檔路徑；檔名以時間開頭，依字典序處理就是依抓取順序。"""
+  worker = worker or os.getenv("NEWS_WORKER_ID") or f"{socket.gethostname()}-{os.getpid()}"
+  stamp = datetime.now(TAIPEI).strftime("%Y%m%d%H%M%S%f")
+  return os.path.join(BATCH_DIR, f"{stamp}-{worker}.json")
 
-def canonicalize_url(u: str) -> str:
+def write_batch(path, items):
+  # 同樣先寫暫存檔（不是 .json 結尾，store 不會讀到寫一半的批次）
+  os.makedirs(os.path.dirname(path), exist_ok=True)
+  tmp = f"{path}.{os.getpid()}.tmp"
+  with open(tmp, "w", encoding="utf-8") as f:
+    json.dump(items, f, ensure_ascii=False, indent=2)
+  os.replace(tmp, path)
+
+def load_batch(path):
+  """
+  批次檔的內容。損壞或不是 JSON 陣列時改名成 .corrupt、刪掉它的待生效水位並回傳 None：
+  這批沒有存進任何東西，水位不能推進，下次抓取會重抓同一段時間。
+  """
   try:
-    p = urlparse(u.strip())
-    # 小寫網域、保留 path、移除 fragment
-    netloc = p.netloc.lower()  
-    path = p.path  
-    # 過濾追蹤參數  
-    q_pairs = [(k, v) for k, v in parse_qsl(p.query, keep_blank_values=True)]  
-    filtered = []  
-
-    for k, v in q_pairs:
-      kl = k.lower()
-      if kl.startswith("utm_") or kl in {"fbclid", "gclid", "igshid", "spm"}:
-        continue  
-      if kl in KEEP_QUERY_KEYS:  
-        filtered.append((k, v))  
-    query = urlencode(filtered, doseq=True)  
-    return urlunparse((p.scheme, netloc, path, "", query, ""))  
-  except Exception:  
-    return u.strip()
+    with open(path, "r", encoding="utf-8") as f:
+      items = json.load(f)
+  except FileNotFoundError:
+    return None
+  except (json.JSONDecodeError, UnicodeDecodeError, OSError):
+    items = None
+  if isinstance(items, list):
+    return items
+  os.replace(path, path + ".corrupt")
+  marks = watermark.pending_path(path)
+  if os.path.exists(marks):
+    os.remove(marks)
+  return None
+
+def pending_batches():
+  paths = sorted(glob.glob(os.path.join(BATCH_DIR, "*.json")))
+  if os.path.exists(BATCH_PATH):
+    paths.insert(0, BATCH_PATH)
+  return paths
+
+@contextmanager
+def store_lock(path=LOCK_PATH):
+  """跨行程的互斥鎖（fcntl.flock），行程結束時系統會自動釋放。"""
+  os.makedirs(os.path.dirname(path), exist_ok=True)
+  with open(path, "a") as f:
+    if fcntl is not None:
+      with tracing.span("wait_lock"):
+        fcntl.flock(f, fcntl.LOCK_EX)
+    try:
+      yield
+    finally:
+      if fcntl is not None:
+        fcntl.flock(f, fcntl.LOCK_UN)
+
+def snapshot(items: list[dict]) -> dict:
+  """key -> 序列化內容，用來找出本次新增或變更的紀錄。"""
+  return {item_key(it): json.dumps(it, sort_keys=True, ensure_ascii=False) for it in items}
+
+def append_changes(path, before: dict, items: list[dict]) -> int:
+  """只把和 before 不同的紀錄（以及消失的 key）append 到 .jsonl，回傳寫入筆數。"""
+  lines = []
+  after_keys = set()
+  for it in items:
+    k = item_key(it)
+    after_keys.add(k)
+    line = json.dumps(it, sort_keys=True, ensure_ascii=False)
+    if before.get(k) != line:
+      lines.append(line)
+  for k in before.keys() - after_keys:
+    lines.append(json.dumps({"_deleted": k}, ensure_ascii=False))
+  if lines:
+    with open(log_path(path), "a", encoding="utf-8") as f:
+      f.write("\n".join(lines) + "\n")
+  return len(lines)
+
+def compact(path):
+  """把 .jsonl 折疊進當日檔（排序；格式依 STORE_FORMAT），然後刪除 .jsonl。"""
+  log = log_path(path)
+  if not os.path.exists(log):
+    return False
+  save_json(path, load_json(path))
+  os.remove(log)
+  return True
+
+def compact_all(data_dir=DATA_DIR, exclude=()):
+  done = []
+  for name in sorted(os.listdir(data_dir)):
+    if not name.endswith(".jsonl"):
+      continue
+    path = os.path.join(data_dir, name[:-len(".jsonl")] + ".json")
+    if path in exclude:
+      continue
+    if compact(path):
+      done.append(path)
+  return done
 
 def norm_title(t: str | None) -> str:
   if not t:
@@ -67,9 +206,11 @@ def norm_title(t: str | None) -> str:
   return " ".join(t.split()).lower()
   
 def item_key(item: dict) -> str:  
-  """優先用規範化 URL；沒有 URL 才退回 title 做 hash。"""  
+  """優先用規範化 URL（已存的 canonical_url 直接採用，不重算）；沒有 URL 才退回 title 做 hash。"""  
   url = item.get("url", "")  
   title = item.get("title", "")  
+  if item.get("canonical_url"):
+    return "u:" + item["canonical_url"]
   if url:  
     return "u:" + canonicalize_url(url)  
   if title:  
@@ -81,13 +222,34 @@ def enrich(item: dict) -> dict:
   out = dict(item)  
   # 填寫 scraped_at（台北時區）  
   out.setdefault("scraped_at", datetime.now(TAIPEI).isoformat(timespec="seconds"))  
-  # 補 canonical_url，之後方便比對  
+  # 補 canonical_url，之後方便比對（短網址展開過的用展開後的網址）  
   if "url" in out and out["url"]:  
-    out["canonical_url"] = canonicalize_url(out["url"])  
+    out["canonical_url"] = canonicalize_url(out.get("resolved_url") or out["url"])  
+  return out
+
+def all_keys(items: list[dict]) -> set:
+  """當日檔裡所有文章（含併進 related 的轉載）的 key"""
+  keys = set()
+  for it in items:
+    keys.add(item_key(it))
+    for r in it.get("related", []):
+      keys.add(item_key(r))
+  return keys
+
+def new_records(before: set, items: list[dict]) -> list[dict]:
+  """本次新收錄的文章（含轉載，關鍵字沿用代表文章），rollups 只需要統計這些"""
+  out = []
+  for it in items:
+    if item_key(it) not in before:
+      out.append(it)
+    for r in it.get("related", []):
+      if item_key(r) not in before:
+        out.append(dict(r, keyword=it.get("keyword")))
   return out
 
-def merge_dedup(existing: list[dict], batch: list[dict]) -> list[dict]:  
+def merge_dedup(existing: list[dict], batch: list[dict], seen=None) -> list[dict]:  
   # 建 key -> item 的 map（existing 優先保留，但用 batch 覆蓋較新的欄位）  
+  # seen：跨日索引（KeyIndex），不在當日檔但已在其他日收錄過的就略過
   m = {}  
   for it in existing:  
     m[item_key(it)] = it
@@ -95,6 +257,8 @@ def merge_dedup(existing: list[dict], batch: list[dict]) -> list[dict]:
   for it in batch:
     e = enrich(it)
     k = item_key(e)
+    if k not in m and seen is not None and k in seen:
+      continue
     if k in m:
         # 合併：保留舊值，若 batch 有提供補充欄位則覆蓋
         merged = {**m[k], **{kk: vv for kk, vv in e.items() if vv not in (None, "", [])}}
@@ -105,28 +269,119 @@ def merge_dedup(existing: list[dict], batch: list[dict]) -> list[dict]:
 
 def main():  
   ensure_dirs()
- 
-  # 讀本次批次
-  batch = load_json(BATCH_PATH)
-  if not isinstance(batch, list):
-    print("Batch file should be a JSON array. Got something else; abort.")
+
+  # python scripts/store_news.py compact：把所有 .jsonl（含今天）折疊回 .json
+  if len(sys.argv) > 1 and sys.argv[1] == "compact":
+    with store_lock():
+      for p in compact_all():
+        print(f"Compacted {p}")
+    return
+
+  with tracing.run("store_news"), store_lock():
+    store()
+
+def store():
+  # 讀所有 worker 的批次（在鎖內列出；之後才寫好的批次留給下一次）
+  batch, consumed = [], []
+  with tracing.span("load_batch") as sp:
+    for path in pending_batches():
+      items = load_batch(path)
+      if items is None:
+        print(f"Batch file {path} is corrupt or not a JSON array; moved to .corrupt and its watermarks dropped.")
+        continue
+      batch.extend(items)
+      consumed.append(path)
+      sp.add("bytes_read", tracing.file_size(path))
+    sp.add("batches", len(consumed))
+    sp.add("items", len(batch))
+  if not consumed:
+    print("No batch files found; nothing to store.")
     return
   # 讀當日累積檔
+  day = today_str()
   out_path = today_path()
-  existing = load_json(out_path)
+  with tracing.span("load_day", day=day) as sp:
+    existing = load_json(out_path)
+    before = snapshot(existing) if STORE_MODE == "jsonl" else None
+    existing_keys = all_keys(existing)
+    sp.add("bytes_read", storage.size(out_path) + tracing.file_size(log_path(out_path)))
+    sp.add("items", len(existing))
+
+  if RESOLVE_REDIRECTS:
+    with tracing.span("resolve_redirects") as sp:
+      resolved = canonical.resolve_redirects(it.get("url", "") for it in batch)
+      for it in batch:
+        if it.get("url") in resolved:
+          it["resolved_url"] = resolved[it["url"]]
+      sp.add("items", len(resolved))
+
+  if canonical.read_version() != canonical.RULES_VERSION:
+    print("⚠️ canonical_url rules changed; run python scripts/canonical.py migrate")
+
+  # 跨日索引（第一次使用請先跑 python scripts/dedup_index.py build）
+  with tracing.span("load_index"):
+    index = KeyIndex()
   
   # 合併去重
-  merged = merge_dedup(existing, batch)
+  with tracing.span("merge_dedup") as sp:
+    merged = merge_dedup(existing, batch, seen=index)
+    sp.add("items", len(merged))
+
+  # 近似重複分群：轉載、改寫標題的同一則新聞併入代表文章的 related
+  with tracing.span("cluster") as sp:
+    lsh = LSHIndex(today=date.fromisoformat(day))
+    merged = cluster_items(merged, lsh, day)
+    sp.add("items", len(merged))
 
   # 寫回
-  save_json(out_path, merged)
+  with tracing.span("save", mode=STORE_MODE) as sp:
+    if STORE_MODE == "jsonl":
+      n = append_changes(out_path, before, merged)
+      print(f"Appended {n} records to {log_path(out_path)}")
+      sp.add("items", n)
+      # 前幾天的紀錄檔不會再有寫入，順便 compact 成 .json 給前端讀
+      for p in compact_all(exclude={out_path}):
+        print(f"Compacted {p}")
+      sp.add("bytes_written", tracing.file_size(log_path(out_path)))
+    else:
+      save_json(out_path, merged)
+      sp.add("items", len(merged))
+      sp.add("bytes_written", storage.size(out_path))
 
-  # 清空本次批次檔（可選）
-  try:
-    os.remove(BATCH_PATH)
-  except FileNotFoundError:
-    pass
-  print(f"✅ Saved {len(merged)} items to {out_path}")
+  # 更新跨日索引（只 append 新 key）
+  with tracing.span("update_index"):
+    for it in merged:
+      index.add(item_key(it), day)
+      for r in it.get("related", []):
+        index.add(item_key(r), day)
+    index.flush()
+    lsh.save()
+
+  # 來源 / 關鍵字 / 標題詞的每日統計：只加上這次新收錄的文章（第一次使用時從整個 data/ 建立）
+  with tracing.span("rollups") as sp:
+    if os.path.exists(rollups.ROLLUP_PATH):
+      stats = rollups.Rollups()
+      sp.add("items", stats.add(day, new_records(existing_keys, merged)))
+      stats.save(date.fromisoformat(day))
+    else:
+      print(f"Building {rollups.ROLLUP_PATH} from the whole archive")
+      rollups.rebuild(DATA_DIR)
+
+  # news.py 這幾批抓到的 published_at 水位，存檔成功才生效
+  if watermark.commit_pending([watermark.pending_path(p) for p in consumed]):
+    print(f"Updated crawl watermarks in {watermark.WATERMARK_PATH}")
+
+  # 全文檢索只重建當月的 segment
+  with tracing.span("search_index"):
+    search_index.update(DATA_DIR, only_months={search_index.month_of(day)})
+
+  # 只刪這次處理過的批次檔
+  for path in consumed:
+    try:
+      os.remove(path)
+    except FileNotFoundError:
+      pass
+  print(f"✅ Saved {len(merged)} items from {len(consumed)} batches to {out_path}")
 
 if __name__ == "__main__":  
   main()
@@ -0,0 +1,294 @@
+import argparse
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+TRACE_DIR = "tmp/traces"
+# TRACE=0 關閉（span 仍可使用，只是不寫檔）
+ENABLED = os.getenv("TRACE", "1") not in ("0", "false", "off")
+# 最多保留幾次執行的紀錄，超過從最舊的刪
+KEEP_RUNS = int(os.getenv("TRACE_KEEP", "500"))
+
+_lock = threading.Lock()
+_local = threading.local()
+_run = None
+
+
+class Span:
+    """一個計時區段；attrs 放任意屬性，counters 用 add() 累加（items、bytes_read、bytes_written 等）。"""
+
+    def __init__(self, name, parent, attrs):
+        self.name = name
+        self.parent = parent
+        self.attrs = dict(attrs)
+        self.counters = {}
+        self.id = None
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+        return self
+
+    def add(self, key, n=1):
+        with _lock:
+            self.counters[key] = self.counters.get(key, 0) + n
+        return self
+
+
+class _Run:
+    def __init__(self, script, path):
+        self.script = script
+        self.path = path
+        self.id = os.path.splitext(os.path.basename(path))[0]
+        self.next_id = 0
+        self.root = None
+
+    def emit(self, record):
+        record = {"run": self.id, "script": self.script, **record}
+        line = json.dumps(record, ensure_ascii=False, default=str)
+        with _lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+    def new_id(self):
+        with _lock:
+            self.next_id += 1
+            return self.next_id
+
+
+def _stack():
+    if not hasattr(_local, "stack"):
+        _local.stack = []
+    return _local.stack
+
+
+def current():
+    """目前執行緒最內層的 span；工作執行緒沒有自己的 span 時掛在整個 run 底下。"""
+    stack = _stack()
+    if stack:
+        return stack[-1]
+    return _run.root if _run else None
+
+
+@contextmanager
+def span(name, **attrs):
+    """
+    with span("merge_dedup", items=len(batch)) as sp: ...
+    記錄 wall / CPU 時間（CPU 為目前執行緒的 thread_time），結束時寫一行 JSON。
+    """
+    parent = current()
+    sp = Span(name, parent, attrs)
+    run = _run
+    if run:
+        sp.id = run.new_id()
+    stack = _stack()
+    stack.append(sp)
+    t0, c0 = time.perf_counter(), time.thread_time()
+    started = time.time()
+    error = None
+    try:
+        yield sp
+    except BaseException as e:
+        error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        wall = time.perf_counter() - t0
+        cpu = time.thread_time() - c0
+        stack.pop()
+        if run:
+            record = {
+                "type": "span", "id": sp.id, "parent": parent.id if parent else None,
+                "name": name, "start": round(started, 3),
+                "wall_ms": round(wall * 1000, 3), "cpu_ms": round(cpu * 1000, 3),
+                "thread": threading.current_thread().name,
+            }
+            if sp.attrs:
+                record["attrs"] = sp.attrs
+            if sp.counters:
+                record["counters"] = sp.counters
+            if error:
+                record["error"] = error
+            run.emit(record)
+
+
+@contextmanager
+def external(service, **attrs):
+    """外部呼叫（SerpAPI、LLM、Graph API）的延遲，寫成 type=call 的紀錄。"""
+    t0 = time.perf_counter()
+    parent = current()
+    info = dict(attrs)
+    error = None
+    try:
+        yield info
+    except BaseException as e:
+        error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        if _run:
+            record = {"type": "call", "service": service, "parent": parent.id if parent else None,
+                      "latency_ms": round((time.perf_counter() - t0) * 1000, 3)}
+            if info:
+                record["attrs"] = info
+            if error:
+                record["error"] = error
+            _run.emit(record)
+
+
+def count(key, n=1):
+    """累加到目前的 span（沒有 span 時忽略）"""
+    sp = current()
+    if sp is not None:
+        sp.add(key, n)
+
+
+def file_size(path):
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+@contextmanager
+def run(script, trace_dir=None):
+    """
+    一次執行一個 JSON lines 檔：tmp/traces/YYYYmmdd-HHMMSS-<script>-<pid>.jsonl。
+    最外層的 span 名稱就是 script，其餘 span 都掛在它底下。
+    """
+    global _run
+    if not ENABLED or _run is not None:
+        with span(script) as sp:
+            yield sp
+        return
+    trace_dir = trace_dir or os.getenv("TRACE_DIR", TRACE_DIR)
+    os.makedirs(trace_dir, exist_ok=True)
+    prune(trace_dir, KEEP_RUNS - 1)
+    stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+    _run = _Run(script, os.path.join(trace_dir, f"{stamp}-{script}-{os.getpid()}.jsonl"))
+    try:
+        with span(script) as root:
+            _run.root = root
+            yield root
+    finally:
+        _run = None
+
+
+def prune(trace_dir, keep):
+    # 檔名以時間開頭，字典序即時間序
+    names = sorted(n for n in os.listdir(trace_dir) if n.endswith(".jsonl"))
+    for name in names[:max(len(names) - keep, 0)]:
+        try:
+            os.remove(os.path.join(trace_dir, name))
+        except FileNotFoundError:
+            pass
+
+
+def read_runs(trace_dir=TRACE_DIR, script=None):
+    """{run_id: [records]}，依時間排序"""
+    runs = {}
+    if not os.path.isdir(trace_dir):
+        return runs
+    for name in sorted(os.listdir(trace_dir)):
+        if not name.endswith(".jsonl"):
+            continue
+        records = []
+        with open(os.path.join(trace_dir, name), "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except json.JSONDecodeError:
+                    continue
+        if records and (script is None or records[0].get("script") == script):
+            runs[name[:-len(".jsonl")]] = records
+    return runs
+
+
+def percentile(values, p):
+    values = sorted(values)
+    if not values:
+        return None
+    k = (len(values) - 1) * p / 100
+    lo = int(k)
+    hi = min(lo + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (k - lo)
+
+
+def summarize(runs: dict) -> dict:
+    """
+    依 (script, span 名稱) 與 (script, 外部服務) 彙整各次執行的耗時分布。
+    span 在同一次執行中出現多次時先加總，讓每次執行各貢獻一個數字。
+    """
+    stages, calls = {}, {}
+    for records in runs.values():
+        per_run = {}
+        for r in records:
+            if r["type"] == "span":
+                key = (r["script"], r["name"])
+                agg = per_run.setdefault(key, {"wall_ms": 0.0, "cpu_ms": 0.0, "n": 0, "counters": {}})
+                agg["wall_ms"] += r["wall_ms"]
+                agg["cpu_ms"] += r["cpu_ms"]
+                agg["n"] += 1
+                for c, v in r.get("counters", {}).items():
+                    agg["counters"][c] = agg["counters"].get(c, 0) + v
+            elif r["type"] == "call":
+                calls.setdefault((r["script"], r["service"]), []).append(r["latency_ms"])
+        for key, agg in per_run.items():
+            stages.setdefault(key, []).append(agg)
+
+    out = {"runs": len(runs), "stages": [], "calls": []}
+    for (script, name), aggs in sorted(stages.items()):
+        walls = [a["wall_ms"] for a in aggs]
+        counters = {}
+        for a in aggs:
+            for c, v in a["counters"].items():
+                counters.setdefault(c, []).append(v)
+        out["stages"].append({
+            "script": script, "name": name, "runs": len(aggs),
+            "p50_ms": percentile(walls, 50), "p90_ms": percentile(walls, 90),
+            "p99_ms": percentile(walls, 99), "max_ms": max(walls),
+            "cpu_p50_ms": percentile([a["cpu_ms"] for a in aggs], 50),
+            "last_ms": walls[-1],
+            "counters_p50": {c: percentile(v, 50) for c, v in counters.items()},
+        })
+    for (script, service), lat in sorted(calls.items()):
+        out["calls"].append({
+            "script": script, "service": service, "calls": len(lat),
+            "p50_ms": percentile(lat, 50), "p90_ms": percentile(lat, 90),
+            "p99_ms": percentile(lat, 99), "max_ms": max(lat),
+        })
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description="各次執行的 trace 彙整")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    s = sub.add_parser("summary", help="各階段耗時的百分位數（跨多次執行）")
+    s.add_argument("--dir", default=os.getenv("TRACE_DIR", TRACE_DIR))
+    s.add_argument("--script", help="只看某支程式，例如 news / store_news / py_news")
+    s.add_argument("--last", type=int, default=0, help="只看最近 N 次執行")
+    s.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    if args.cmd == "summary":
+        runs = read_runs(args.dir, args.script)
+        if args.last:
+            runs = dict(list(runs.items())[-args.last:])
+        result = summarize(runs)
+        if args.json:
+            print(json.dumps(result, ensure_ascii=False, indent=2))
+            return
+        print(f"{result['runs']} runs in {args.dir}")
+        print(f"{'script':<16} {'stage':<24} {'runs':>5} {'p50':>10} {'p90':>10} {'p99':>10} {'last':>10}  (ms)")
+        for r in result["stages"]:
+            print(f"{r['script']:<16} {r['name']:<24} {r['runs']:>5} {r['p50_ms']:>10.1f} "
+                  f"{r['p90_ms']:>10.1f} {r['p99_ms']:>10.1f} {r['last_ms']:>10.1f}")
+        if result["calls"]:
+            print(f"\n{'script':<16} {'external call':<24} {'calls':>5} {'p50':>10} {'p90':>10} {'p99':>10} {'max':>10}  (ms)")
+            for r in result["calls"]:
+                print(f"{r['script']:<16} {r['service']:<24} {r['calls']:>5} {r['p50_ms']:>10.1f} "
+                      f"{r['p90_ms']:>10.1f} {r['p99_ms']:>10.1f} {r['max_ms']:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+import argparse
+import json
+import os
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+from dedup_index import INDEX_DIR
+
+TAIPEI = ZoneInfo("Asia/Taipei")
+# 已存進 data/ 的水位（隨 data/ 一起 commit）
+WATERMARK_PATH = os.path.join(INDEX_DIR, "watermarks.json")
+
+# 往回多抓一段時間：Google News 晚收錄、時間稍早的新聞不會因水位而漏掉（重複的由 store_news 去重）
+OVERLAP = timedelta(minutes=int(os.getenv("NEWS_WATERMARK_OVERLAP_MIN", "60")))
+# 水位太舊（很久沒跑）時最多往回抓幾天
+MAX_LOOKBACK = timedelta(days=int(os.getenv("NEWS_MAX_LOOKBACK_DAYS", "7")))
+
+
+def query_key(keyword, language):
+  return f"{keyword}|{language}"
+
+
+def parse_published(s):
+  """SerpAPI 的 'YYYY-MM-DD HH:MM:SS UTC' 或 ISO 字串 -> 有時區的 datetime；解析不了回傳 None"""
+  if not s:
+    return None
+  s = str(s).strip()
+  try:
+    if s.endswith(" UTC"):
+      return datetime.strptime(s[:-4], "%Y-%m-%d %H:%M:%S").replace(tzinfo=ZoneInfo("UTC"))
+    dt = datetime.fromisoformat(s)
+    return dt if dt.tzinfo else dt.replace(tzinfo=TAIPEI)
+  except ValueError:
+    return None
+
+
+class Watermarks:
+  """
+  每個 keyword|language 已收錄到的最新 published_at。
+  檔案格式：{"AI|TW": "2026-08-20T09:00:00+08:00", ...}
+  """
+
+  def __init__(self, path=WATERMARK_PATH):
+    self.path = path
+    self.marks = {}
+    if os.path.exists(path):
+      with open(path, "r", encoding="utf-8") as f:
+        self.marks = {k: datetime.fromisoformat(v) for k, v in json.load(f).items()}
+
+  def get(self, keyword, language):
+    return self.marks.get(query_key(keyword, language))
+
+  def since(self, keyword, language, now=None):
+    """這次要抓的起點（水位減掉重疊時間，最多往回 MAX_LOOKBACK）；沒有水位回傳 None"""
+    mark = self.get(keyword, language)
+    if mark is None:
+      return None
+    now = now or datetime.now(TAIPEI)
+    return max(mark - OVERLAP, now - MAX_LOOKBACK)
+
+  def advance(self, keyword, language, published):
+    """只會往前推"""
+    if published is None:
+      return
+    k = query_key(keyword, language)
+    if k not in self.marks or published > self.marks[k]:
+      self.marks[k] = published
+
+  def update(self, other: "Watermarks"):
+    for k, v in other.marks.items():
+      if k not in self.marks or v > self.marks[k]:
+        self.marks[k] = v
+
+  def save(self, path=None):
+    path = path or self.path
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+      json.dump({k: v.astimezone(TAIPEI).isoformat() for k, v in sorted(self.marks.items())},
+                f, ensure_ascii=False, indent=2)
+    os.replace(tmp, path)
+
+
+def pending_path(batch_path):
+  """
+  批次檔旁的待生效水位（tmp/batches/xxx.json -> xxx.marks）。
+  news.py 抓完先寫這裡，store_news.py 存檔成功後才併進正式水位，避免存檔失敗卻跳過那段新聞。
+  """
+  return os.path.splitext(batch_path)[0] + ".marks"
+
+
+def commit_pending(pending_paths, path=WATERMARK_PATH):
+  """store_news 存檔成功後呼叫：把這幾批的新水位併進正式水位檔"""
+  pending_paths = [p for p in pending_paths if os.path.exists(p)]
+  if not pending_paths:
+    return False
+  marks = Watermarks(path)
+  for p in pending_paths:
+    marks.update(Watermarks(p))
+  marks.save()
+  for p in pending_paths:
+    os.remove(p)
+  return True
+
+
+def main():
+  parser = argparse.ArgumentParser(description="增量抓取的 published_at 水位")
+  sub = parser.add_subparsers(dest="cmd", required=True)
+  sub.add_parser("show", help="列出各 keyword|language 的水位")
+  r = sub.add_parser("reset", help="刪除水位，下次回到固定的兩天視窗")
+  r.add_argument("key", nargs="?", help="只刪某個 keyword|language")
+  args = parser.parse_args()
+
+  marks = Watermarks()
+  if args.cmd == "show":
+    for k, v in sorted(marks.marks.items()):
+      print(f"{k}\t{v.astimezone(TAIPEI).isoformat()}")
+  elif args.cmd == "reset":
+    if args.key:
+      marks.marks.pop(args.key, None)
+    else:
+      marks.marks = {}
+    marks.save()
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# 腳本都放在 scripts/ 底下、彼此直接 import，測試照同樣的方式載入
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scripts"))
@@ -0,0 +1,62 @@
+import json
+import os
+
+import pytest
+
+pd = pytest.importorskip("pandas")
+
+import archive_export  # noqa: E402
+import storage  # noqa: E402
+from archive_export import daily_counts, export, load, source_counts  # noqa: E402
+
+
+def news(n, source, published):
+    return {"title": f"news {n}", "url": f"https://a.com/{n}", "source": source,
+            "published_at": published, "scraped_at": "2026-08-01T09:00:00+08:00"}
+
+
+def write_day(day, items):
+    storage.write_json(os.path.join("data", f"{day}.json"), items, "json")
+
+
+@pytest.fixture
+def data(tmp_path, monkeypatch):
+    # data/、data/_archive 都是相對路徑
+    monkeypatch.chdir(tmp_path)
+    os.makedirs("data")
+    write_day("2026-07-31", [news(1, "中央社", "2026-07-31 01:00:00+00:00")])
+    write_day("2026-08-01", [news(2, "中央社", "2026-08-01 01:00:00+00:00"), news(3, "鉅亨網", "2026-08-01 02:00:00+00:00")])
+    return tmp_path
+
+
+def test_export_is_incremental(data):
+    assert export("data") == ["2026-07-31", "2026-08-01"]
+    assert os.path.exists(archive_export.partition_path("2026-08-01"))
+    assert export("data") == []
+
+    write_day("2026-08-01", [news(2, "中央社", "2026-08-01 01:00:00+00:00")])
+    assert export("data") == ["2026-08-01"]
+    assert export("data", force=True) == ["2026-07-31", "2026-08-01"]
+
+
+def test_format_change_reexports_everything(data):
+    export("data")
+    with open(archive_export.MANIFEST_PATH, encoding="utf-8") as f:
+        manifest = json.load(f)
+    manifest["format"] = "other"
+    with open(archive_export.MANIFEST_PATH, "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    assert export("data") == ["2026-07-31", "2026-08-01"]
+
+
+def test_load_filters_dates_and_keeps_types(data):
+    export("data")
+    df = load("2026-08-01", "2026-08-01")
+    assert list(df["title"]) == ["news 2", "news 3"]
+    assert isinstance(df["source"].dtype, pd.CategoricalDtype)
+    assert str(df["published_at"].dt.tz) == "Asia/Taipei"
+    assert df["published_at"].iloc[0].hour == 9
+
+    assert load("2026-09-01").empty
+    assert source_counts().to_dict() == {"中央社": 2, "鉅亨網": 1}
+    assert daily_counts().loc["2026-08-01"].to_dict() == {"articles": 2, "sources": 2}
@@ -0,0 +1,62 @@
+import json
+import os
+
+import pytest
+
+import storage
+from build_bundles import MANIFEST_PATH, build
+
+
+def news(n, published):
+    return {"title": f"news {n}", "url": f"https://a.com/{n}", "canonical_url": f"https://a.com/{n}",
+            "published_at": published}
+
+
+def write_day(day, items):
+    storage.write_json(os.path.join("data", f"{day}.json"), items, "json")
+
+
+def read(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+@pytest.fixture
+def data(tmp_path, monkeypatch):
+    # data/、data/bundles 都是相對路徑
+    monkeypatch.chdir(tmp_path)
+    os.makedirs("data")
+    # 7/31、8/2 同一個 ISO 週（W31），8/3 是下一週；同一篇轉到隔天只算一次
+    write_day("2026-07-31", [news(1, "2026-07-31 01:00")])
+    write_day("2026-08-02", [news(2, "2026-08-02 01:00"), news(1, "2026-07-31 01:00")])
+    write_day("2026-08-03", [news(3, "2026-08-03 01:00")])
+    return tmp_path
+
+
+def test_bundles_group_by_week_and_month(data):
+    assert build() == 4
+    manifest = read(MANIFEST_PATH)
+    assert manifest["dates"]["2026-08-02"]["count"] == 2
+    assert sorted(manifest["weeks"]) == ["2026-W31", "2026-W32"]
+    week = manifest["weeks"]["2026-W31"]
+    assert (week["start"], week["end"], week["count"]) == ("2026-07-31", "2026-08-02", 2)
+    assert [it["title"] for it in read(os.path.join("data", week["file"]))] == ["news 2", "news 1"]
+    assert manifest["months"]["2026-08"]["days"] == ["2026-08-02", "2026-08-03"]
+
+
+def test_rebuild_only_groups_with_changed_days(data):
+    build()
+    assert build() == 0
+
+    write_day("2026-08-03", [news(3, "2026-08-03 01:00"), news(4, "2026-08-03 02:00")])
+    # 只有 W32 與 2026-08
+    assert build() == 2
+    assert read(MANIFEST_PATH)["weeks"]["2026-W32"]["count"] == 2
+
+    os.remove(os.path.join("data", "bundles", "month-2026-07.json"))
+    assert build() == 1
+
+
+def test_force_ignores_manifest(data):
+    build()
+    assert build(force=True) == 4
@@ -0,0 +1,71 @@
+import json
+import os
+
+import pytest
+
+import build_site
+from build_site import build
+
+
+@pytest.fixture
+def site(tmp_path, monkeypatch):
+    monkeypatch.setattr(build_site, "PAGE_SIZE", 2)
+    md_dir = tmp_path / "eletters"
+    md_dir.mkdir()
+    for day in ("2026-08-01", "2026-08-02", "2026-08-03"):
+        (md_dir / f"{day}.md").write_text(f"# {day} 每日電子報\n\n今天的重點是 **AI**。\n", encoding="utf-8")
+    return md_dir, md_dir / "site"
+
+
+def index_items(site_dir):
+    items = []
+    for n in (1, 2):
+        with open(os.path.join(site_dir, f"index-{n}.json"), encoding="utf-8") as f:
+            items += json.load(f)["items"]
+    return items
+
+
+def test_build_uses_stable_names_and_versions_in_index(site):
+    md_dir, site_dir = site
+    assert build(str(md_dir), str(site_dir)) == (3, 0)
+    assert sorted(os.listdir(site_dir / "html")) == ["2026-08-01.html", "2026-08-02.html", "2026-08-03.html"]
+
+    items = index_items(site_dir)
+    assert [it["date"] for it in items] == ["2026-08-03", "2026-08-02", "2026-08-01"]
+    assert items[0]["title"] == "2026-08-03 每日電子報" and items[0]["excerpt"] == "今天的重點是 AI。"
+    assert items[0]["html"].startswith("html/2026-08-03.html?v=")
+
+
+def test_rebuild_only_touches_changed_newsletters(site):
+    md_dir, site_dir = site
+    build(str(md_dir), str(site_dir))
+    before = {it["date"]: it["html"] for it in index_items(site_dir)}
+    assert build(str(md_dir), str(site_dir)) == (0, 0)
+
+    (md_dir / "2026-08-02.md").write_text("# 更正\n\n內容改了。\n", encoding="utf-8")
+    assert build(str(md_dir), str(site_dir)) == (1, 0)
+    after = {it["date"]: it["html"] for it in index_items(site_dir)}
+    assert after["2026-08-02"] != before["2026-08-02"]
+    assert after["2026-08-01"] == before["2026-08-01"] and after["2026-08-03"] == before["2026-08-03"]
+
+
+def test_formatter_change_rewrites_only_changed_output(site, monkeypatch):
+    md_dir, site_dir = site
+    build(str(md_dir), str(site_dir))
+    # formatter.py 改了但輸出相同：全部重轉，但檔案都不用重寫
+    monkeypatch.setattr(build_site, "render_version", lambda: "next")
+    assert build(str(md_dir), str(site_dir)) == (0, 0)
+
+
+def test_removed_newsletters_are_pruned(site):
+    md_dir, site_dir = site
+    build(str(md_dir), str(site_dir))
+    (site_dir / "html" / "2026-08-01.0123456789abcdef.html").write_text("舊版檔名")
+    os.remove(md_dir / "2026-08-03.md")
+
+    assert build(str(md_dir), str(site_dir)) == (0, 2)
+    assert sorted(os.listdir(site_dir / "html")) == ["2026-08-01.html", "2026-08-02.html"]
+    # 剩兩篇只需要一頁
+    assert not os.path.exists(site_dir / "index-2.json")
+    with open(site_dir / "manifest.json", encoding="utf-8") as f:
+        assert sorted(json.load(f)["files"]) == ["2026-08-01", "2026-08-02"]
@@ -0,0 +1,79 @@
+import json
+
+import pytest
+
+import canonical
+import storage
+from canonical import canonicalize_url, migrate, read_version
+
+# data/ 裡曾經被併成同一個 key 的不同文章
+DISTINCT = {
+    "google goto token": (
+        "https://www.google.com/goto?url=CAESgwEB7keqTZ5bimX97tWT1na4a2y2jE5RK01CG9f5WlYMX7mVjo2g",
+        "https://www.google.com/goto?url=CAESnQEB7keqTemp-mZ-AwUJZm7sFAoqE8hQIuX7UjDCIzAp0HxvWKD0",
+    ),
+    "wordpress ?p=": (
+        "https://blog.104.com.tw/?post_type=post&p=231940",
+        "https://blog.104.com.tw/?post_type=post&p=234550",
+    ),
+    "tca ?n=": (
+        "https://www.tca.org.tw/exhibit_info1.php?n=2547",
+        "https://www.tca.org.tw/exhibit_info1.php?n=2570",
+    ),
+    "gov.tw News_Content": (
+        "https://www.tainan.gov.tw/News_Content.aspx?n=13370&s=8779991",
+        "https://www.tainan.gov.tw/News_Content.aspx?n=13370&s=8800809",
+    ),
+    "REFDOCID": (
+        "https://ibmi.taiwan-healthcare.org/zh/news_detail.php?REFDOCID=0tdro3nw2hnxfjc3",
+        "https://ibmi.taiwan-healthcare.org/zh/news_detail.php?REFDOCTYPID=0o4dd9ctwhtyumw0&REFDOCID=0tiltqvbu97l58nh",
+    ),
+    "unknown host, dynamic page": (
+        "https://www.example.com.tw/News.aspx?NewsID=1",
+        "https://www.example.com.tw/News.aspx?NewsID=2",
+    ),
+}
+
+SAME = {
+    "google unwrap": ("https://www.google.com/url?q=https://a.com/x?utm_source=g", "https://a.com/x"),
+    "tracking on dynamic page": ("https://www.example.com.tw/News.aspx?NewsID=1&utm_medium=fb&fbclid=1",
+                                 "https://www.example.com.tw/News.aspx?NewsID=1"),
+    "static path drops query": ("https://www.wsj.com/tech/ai/story-4e1810b2?gaa_at=eafs&gaa_ts=69130897",
+                                "https://www.wsj.com/tech/ai/story-4e1810b2"),
+    "digitimes keeps only id": ("https://www.digitimes.com.tw/tech/dt/n/shwnws.asp?cnlid=13&cat=100&id=0000738592",
+                                "https://www.digitimes.com.tw/tech/dt/n/shwnws.asp?id=0000738592"),
+}
+
+
+@pytest.mark.parametrize("a, b", DISTINCT.values(), ids=DISTINCT.keys())
+def test_distinct_articles_get_distinct_keys(a, b):
+    assert canonicalize_url(a) != canonicalize_url(b)
+
+
+@pytest.mark.parametrize("url, expected", SAME.values(), ids=SAME.keys())
+def test_variants_collapse(url, expected):
+    assert canonicalize_url(url) == expected
+
+
+def test_read_version_missing_file_is_current(tmp_path):
+    assert read_version(str(tmp_path / "canonical_version")) == canonical.RULES_VERSION
+    (tmp_path / "canonical_version").write_text("1\n")
+    assert read_version(str(tmp_path / "canonical_version")) == 1
+
+
+def test_migrate_recomputes_related_and_rebuilds_index(tmp_path, monkeypatch):
+    data = tmp_path / "data"
+    index_dir = data / "_index"
+    index_dir.mkdir(parents=True)
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(canonical, "VERSION_PATH", str(index_dir / "canonical_version"))
+    stale = "https://www.tca.org.tw/exhibit_info1.php"
+    rep = {"title": "a", "url": "https://www.tca.org.tw/exhibit_info1.php?n=1", "canonical_url": stale,
+           "related": [{"title": "b", "url": "https://www.tca.org.tw/exhibit_info1.php?n=2", "canonical_url": stale}]}
+    storage.write_json(str(data / "2026-08-01.json"), [rep], "json")
+
+    assert migrate(str(data)) == (1, 2)
+    saved = json.loads(storage.read_bytes(str(data / "2026-08-01.json")))[0]
+    assert saved["canonical_url"].endswith("?n=1")
+    assert saved["related"][0]["canonical_url"].endswith("?n=2")
+    assert read_version(canonical.VERSION_PATH) == canonical.RULES_VERSION
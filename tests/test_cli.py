@@ -0,0 +1,49 @@
+import os
+import subprocess
+import sys
+import types
+
+import pytest
+
+import cli
+
+SCRIPTS_DIR = os.path.dirname(cli.__file__)
+HEAVY = ("requests", "pandas", "g4f")
+
+
+def imported_after(snippet):
+    """在乾淨的直譯器裡執行 snippet，回傳之後已載入的重量級套件與 store_news"""
+    code = f"import sys\n{snippet}\nprint(','.join(m for m in {HEAVY + ('store_news',)!r} if m in sys.modules))"
+    out = subprocess.run([sys.executable, "-c", code], cwd=SCRIPTS_DIR, capture_output=True, text=True, check=True)
+    return set(filter(None, out.stdout.strip().split(",")))
+
+
+def test_import_cli_loads_no_subcommand_modules():
+    assert imported_after("import cli") == set()
+
+
+@pytest.mark.parametrize("cmd", ["fetch", "store", "generate", "build"])
+def test_subcommands_import_only_what_they_use(cmd):
+    assert not imported_after(f"import cli\ncli.load({cmd!r})") & set(HEAVY)
+
+
+def test_steps_for_commands_and_build_targets():
+    assert cli.steps("store", ["compact"]) == [("store_news", ["compact"], None)]
+    assert cli.steps("fetch", ["--ignored"]) == [("news", [], "news")]
+    assert [m for m, _, _ in cli.steps("build", [])] == ["build_bundles", "build_site"]
+    assert cli.steps("build", ["search"]) == [("search_index", ["update"], None)]
+    with pytest.raises(SystemExit, match="Unknown build target"):
+        cli.steps("build", ["bundles", "nope"])
+
+
+def test_run_module_passes_argv_and_restores_it(monkeypatch):
+    seen = []
+    fake = types.ModuleType("fake_step")
+    fake.__file__ = "scripts/fake_step.py"
+    fake.main = lambda: seen.append(list(sys.argv))
+    monkeypatch.setitem(sys.modules, "fake_step", fake)
+    before = list(sys.argv)
+
+    cli.run_module("fake_step", ["compact"])
+    assert seen == [["scripts/fake_step.py", "compact"]]
+    assert sys.argv == before
@@ -0,0 +1,80 @@
+import pytest
+
+import storage
+from dedup_index import KeyIndex, build_index, day_files, key_digest
+from store_news import item_key, merge_dedup
+
+
+@pytest.fixture
+def index_path(tmp_path):
+    return str(tmp_path / "_index" / "item_keys.tsv")
+
+
+def news(url, title="標題"):
+    return {"title": title, "url": url, "source": "example"}
+
+
+def test_add_flush_reload_keeps_first_day(index_path):
+    index = KeyIndex(index_path)
+    index.add("u:https://a.com/1", "2026-08-01")
+    index.add("u:https://a.com/1", "2026-08-02")
+    assert index.flush() == 1
+    assert index.flush() == 0
+
+    reloaded = KeyIndex(index_path)
+    assert "u:https://a.com/1" in reloaded
+    assert reloaded.first_seen("u:https://a.com/1") == "2026-08-01"
+    # 已收錄的 key 不會再 append
+    reloaded.add("u:https://a.com/1", "2026-08-03")
+    assert reloaded.flush() == 0
+    with open(index_path, encoding="utf-8") as f:
+        assert f.read() == f"{key_digest('u:https://a.com/1')}\t2026-08-01\n"
+
+
+def test_merge_skips_items_seen_on_earlier_days(index_path):
+    index = KeyIndex(index_path)
+    index.add(item_key(news("https://a.com/old")), "2026-08-01")
+
+    batch = [
+        # 追蹤參數不同，規範化後是同一篇
+        news("https://a.com/old?utm_source=fb"),
+        news("https://a.com/new"),
+    ]
+    merged = merge_dedup([], batch, seen=index)
+    assert [it["url"] for it in merged] == ["https://a.com/new"]
+
+
+def test_merge_still_updates_items_already_in_today(index_path):
+    index = KeyIndex(index_path)
+    today = merge_dedup([], [news("https://a.com/1")])
+    for it in today:
+        index.add(item_key(it), "2026-08-02")
+
+    merged = merge_dedup(today, [{**news("https://a.com/1"), "summary": "補上摘要"}], seen=index)
+    assert len(merged) == 1 and merged[0]["summary"] == "補上摘要"
+
+
+def test_build_index_records_earliest_day(tmp_path, index_path):
+    data = tmp_path / "data"
+    data.mkdir()
+    storage.write_json(str(data / "2026-08-01.json"), [news("https://a.com/1")], "json")
+    storage.write_json(str(data / "2026-08-02.json"), [news("https://a.com/1"), news("https://a.com/2")], "gzip")
+    assert [p.rsplit("/", 1)[-1] for p in day_files(str(data))] == ["2026-08-01.json", "2026-08-02.json"]
+
+    assert build_index(str(data), index_path) == 2
+    index = KeyIndex(index_path)
+    assert index.first_seen(item_key(news("https://a.com/1"))) == "2026-08-01"
+    assert index.first_seen(item_key(news("https://a.com/2"))) == "2026-08-02"
+
+
+def test_build_index_includes_related_copies(tmp_path, index_path):
+    data = tmp_path / "data"
+    data.mkdir()
+    rep = {**news("https://a.com/1"), "related": [news("https://b.com/copy", "轉載")]}
+    storage.write_json(str(data / "2026-08-01.json"), [rep], "json")
+    build_index(str(data), index_path)
+
+    # 重建後轉載仍算已收錄，隔天再抓到不會變成新文章
+    index = KeyIndex(index_path)
+    assert index.first_seen(item_key(news("https://b.com/copy"))) == "2026-08-01"
+    assert merge_dedup([], [news("https://b.com/copy?utm_source=x", "轉載")], seen=index) == []
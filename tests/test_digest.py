@@ -0,0 +1,106 @@
+import json
+import os
+from datetime import date
+
+import pytest
+
+import digest
+import storage
+from digest import build_period, completed_periods, headlines, key_entities, key_topics, load_daily, period_days
+
+NEWSLETTER = """# 2026年08月03日 每日電子報
+
+## 台積電擴產
+
+台積電宣布在美國加碼投資。市場反應熱烈。
+
+**總結：**
+
+AI 浪潮持續，歡迎繼續關注。
+"""
+
+
+def news(n, title, source="中央社", related=0):
+    return {"title": title, "summary": "", "url": f"https://a.com/{n}", "source": source,
+            "published_at": "2026-08-03T09:00:00+08:00", "related": [{"title": "copy"}] * related}
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    # data/、eletters/ 都是相對路徑
+    monkeypatch.chdir(tmp_path)
+    os.makedirs("data")
+    for day in ("2026-08-03", "2026-08-04"):
+        storage.write_json(f"data/{day}.json", [
+            news(1, "台積電美國新廠動工 NVIDIA 追加訂單", related=2),
+            news(2, "台積電法說會 NVIDIA 需求強勁", source="鉅亨網"),
+        ], "json")
+    return tmp_path
+
+
+class FakeLLM:
+    def __init__(self, fail=False):
+        self.prompts = []
+        self.fail = fail
+
+    def __call__(self, prompt, deadline=None):
+        self.prompts.append(prompt)
+        if self.fail:
+            raise RuntimeError("boom")
+        return "## 本週重點\n\n台積電持續擴產。"
+
+
+def test_topics_prefer_longest_term_and_entities_need_two_articles():
+    articles = [{"title": "台積電美國新廠"}, {"title": "台積電法說會"}, {"title": "OpenAI 新模型", "summary": ""}]
+    assert key_topics(articles)[0] == ["台積電", 2]
+    assert "積電" not in dict(key_topics(articles))
+    assert key_entities(articles + [{"title": "OpenAI 募資"}]) == [["OpenAI", 2]]
+
+
+def test_headlines_skip_title_and_closing():
+    assert headlines(NEWSLETTER) == ["台積電擴產：台積電宣布在美國加碼投資。"]
+    assert headlines("抱歉，由於 LLM 推論失敗") == []
+
+
+def test_load_daily_caches_until_inputs_change(workdir):
+    day = date(2026, 8, 3)
+    first = load_daily(day)
+    assert (first["articles"], first["sources"]) == (4, 2)
+    assert first["clusters"][0]["size"] == 3 and first["headlines"] == []
+    assert load_daily(day) == first
+
+    # 電子報寫出後，每日摘要跟著更新
+    with open("eletters/2026-08-03.md", "w", encoding="utf-8") as f:
+        f.write(NEWSLETTER)
+    assert load_daily(day)["headlines"] == ["台積電擴產：台積電宣布在美國加碼投資。"]
+    assert load_daily(date(2026, 8, 10)) is None
+
+
+def test_period_days_and_completed_periods():
+    assert period_days("2026-W32")[0] == date(2026, 8, 3) and len(period_days("2026-W32")) == 7
+    assert len(period_days("2026-02")) == 28
+    assert completed_periods(date(2026, 7, 30), date(2026, 8, 4)) == ["2026-W31", "2026-07"]
+
+
+def test_build_period_skips_unchanged_and_retries_failures(workdir):
+    today = date(2026, 8, 10)
+    failing = FakeLLM(fail=True)
+    path, regenerated = build_period("2026-W32", complete=failing, today=today)
+    assert regenerated and "抱歉，由於 LLM 推論失敗" in open(path, encoding="utf-8").read()
+
+    llm = FakeLLM()
+    assert build_period("2026-W32", complete=llm, today=today) == (path, True)
+    assert "### 2026-08-03" in llm.prompts[0] and "### 2026-08-04" in llm.prompts[0]
+    with open(path, encoding="utf-8") as f:
+        assert f.read().startswith("# 2026/08/03–08/09（第 32 週） AI 趨勢週報\n\n## 本週重點")
+    with open(digest.MANIFEST_PATH, encoding="utf-8") as f:
+        assert json.load(f)["2026-W32"]["ok"] is True
+
+    assert build_period("2026-W32", complete=llm, today=today) == (path, False)
+    assert len(llm.prompts) == 1
+
+
+def test_month_prompt_is_grouped_by_week(workdir):
+    llm = FakeLLM()
+    build_period("2026-08", complete=llm, today=date(2026, 9, 1))
+    assert "（第 32 週）（2 天，8 篇）" in llm.prompts[0]
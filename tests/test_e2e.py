@@ -0,0 +1,35 @@
+import os
+
+import pytest
+
+import e2e
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_serp_results_are_stable_and_paginated():
+    params = {"q": "AI", "gl": "tw", "start": "0"}
+    first = e2e.serp_results(params, size=3, pages=2)
+    assert first == e2e.serp_results(params, size=3, pages=2)
+    assert len(first["news_results"]) == 3 and "next" in first["serpapi_pagination"]
+    assert "serpapi_pagination" not in e2e.serp_results({**params, "start": "3"}, size=3, pages=2)
+
+
+def test_parse_env():
+    assert e2e.parse_env(["A=1", "B=x=y"]) == {"A": "1", "B": "x=y"}
+    with pytest.raises(SystemExit):
+        e2e.parse_env(["A"])
+
+
+def test_second_round_hits_caches_and_does_not_repost():
+    stubs = {name: e2e.Stub(name, latency_ms=0, size=d["size"]) for name, d in e2e.DEFAULTS.items()}
+    result = e2e.run(stubs, rounds=2, src=ROOT)
+
+    first, second = result["rounds"]
+    assert [s["exit"] for r in (first, second) for s in r["stages"]] == [0] * 2 * len(e2e.STAGES)
+    calls = {s["stage"]: {name: d["requests"] for name, d in s["stubs"].items() if d["requests"]} for s in first["stages"]}
+    assert calls["fetch"] == {"serp": 1} and calls["generate"] == {"llm": 1} and calls["publish"] == {"graph": 1}
+    # 第 2 輪：SerpAPI / LLM 走快取，發文佇列認得已發出的貼文
+    assert all(d["requests"] == 0 for s in second["stages"] for d in s["stubs"].values())
+    assert result["posts"] == 1
+    assert not os.path.exists(result["workdir"])
@@ -0,0 +1,44 @@
+import glob
+import os
+
+import pytest
+
+from formatter import TARGETS, render
+
+# golden 範例：<名稱>.md 是輸入，<名稱>.facebook.txt / .html / .email.html 是預期輸出。
+# newsletter-<日期>.md 是從 eletters/ 挑出的實際電子報（分隔線、斜體、裸網址、編號清單、
+# LLM 失敗時夾帶的 HTML 錯誤訊息、沒有資料、空檔）。
+# 改了輸出格式、看過 diff 確認正確後，用 UPDATE_GOLDEN=1 python -m pytest tests/test_formatter.py 改寫預期輸出
+GOLDEN_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "formatter")
+GOLDEN_EXTS = {"facebook": ".facebook.txt", "html": ".html", "email": ".email.html"}
+UPDATE = os.getenv("UPDATE_GOLDEN") == "1"
+
+CASES = [(md_path, t, md_path[:-len(".md")] + GOLDEN_EXTS[t])
+         for md_path in sorted(glob.glob(os.path.join(GOLDEN_DIR, "*.md"))) for t in TARGETS]
+
+
+def test_golden_samples_include_real_newsletters():
+    assert len([p for p, _, _ in CASES if os.path.basename(p).startswith("newsletter-")]) >= 10 * len(TARGETS)
+
+
+@pytest.mark.parametrize("md_path, target, expected_path", CASES,
+                         ids=[os.path.basename(p) for _, _, p in CASES])
+def test_render_matches_expected_output(md_path, target, expected_path):
+    with open(md_path, "r", encoding="utf-8") as f:
+        actual = render(f.read(), target)
+    if UPDATE:
+        with open(expected_path, "w", encoding="utf-8", newline="\n") as f:
+            f.write(actual)
+    assert os.path.exists(expected_path), "run: UPDATE_GOLDEN=1 python -m pytest tests/test_formatter.py"
+    with open(expected_path, "r", encoding="utf-8", newline="") as f:
+        assert actual == f.read()
+
+
+def test_facebook_styles_only_ascii():
+    assert render("**AI 新聞 2025**", "facebook") == "𝐀𝐈 新聞 𝟐𝟎𝟐𝟓"
+    assert render("*Gemini*", "facebook") == "𝐺𝑒𝑚𝑖𝑛𝑖"
+
+
+def test_html_escapes_text_and_urls():
+    out = render('<b>x</b> [a](https://e.com/?a=1&b="2")', "html")
+    assert "&lt;b&gt;" in out and "&amp;b=" in out and '"2"' not in out
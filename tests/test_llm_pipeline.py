@@ -0,0 +1,131 @@
+import threading
+import time
+
+import pytest
+
+import llm_pipeline
+from llm_pipeline import MAP_PROMPT, REDUCE_HEADER, chunk_articles, estimate_tokens, generate
+
+
+def articles(n, summary_len=200):
+    return [{"title": f"標題{i}", "summary": "新聞摘要內容" * (summary_len // 6)} for i in range(n)]
+
+
+class FakeLLM:
+    """記錄收到的 prompt；map 回傳短重點（含 fail_on 的組別丟出例外），其餘回傳固定的電子報"""
+
+    def __init__(self, fail_on=None):
+        self.prompts = []
+        self.deadlines = []
+        self.fail_on = fail_on
+        self._lock = threading.Lock()
+
+    def __call__(self, prompt, deadline=None):
+        with self._lock:
+            self.prompts.append(prompt)
+            self.deadlines.append(deadline)
+        if prompt.startswith(MAP_PROMPT):
+            if self.fail_on and self.fail_on in prompt:
+                raise RuntimeError("boom")
+            return "- 重點"
+        return "# 電子報"
+
+
+def test_chunk_articles_respects_budget_and_numbering():
+    items = articles(10)
+    budget = 3 * estimate_tokens(llm_pipeline.format_article(1, items[0]))
+    chunks = chunk_articles(items, budget)
+    assert [i for chunk in chunks for i, _ in chunk] == list(range(1, 11))
+    assert all(len(chunk) <= 3 for chunk in chunks)
+
+
+def test_small_input_is_a_single_call():
+    llm = FakeLLM()
+    assert generate(articles(3), "intro", "outro", complete=llm, budget=6000) == "# 電子報"
+    assert len(llm.prompts) == 1
+    assert "標題0" in llm.prompts[0] and "標題2" in llm.prompts[0]
+
+
+def test_large_input_goes_through_map_reduce():
+    llm = FakeLLM()
+    assert generate(articles(30), "intro", "outro", complete=llm, budget=800) == "# 電子報"
+    maps = [p for p in llm.prompts if p.startswith(MAP_PROMPT)]
+    reduces = [p for p in llm.prompts if REDUCE_HEADER in p]
+    assert len(maps) > 1 and len(reduces) == 1
+    # 每篇文章都剛好出現在一組 map 裡
+    for i in range(30):
+        assert sum(f"標題{i}\n" in p for p in maps) == 1
+    assert reduces[0].startswith("intro") and reduces[0].rstrip().endswith("outro")
+
+
+def test_failed_chunk_falls_back_to_titles():
+    llm = FakeLLM(fail_on="標題0\n")
+    generate(articles(30), "intro", "outro", complete=llm, budget=800)
+    reduce_prompt = next(p for p in llm.prompts if REDUCE_HEADER in p)
+    assert "- 標題0" in reduce_prompt
+
+
+def test_map_calls_get_the_round_deadline(monkeypatch):
+    monkeypatch.setattr(llm_pipeline, "CALL_TIMEOUT", 10.0)
+    llm = FakeLLM()
+    start = time.monotonic()
+    generate(articles(30), "intro", "outro", complete=llm, budget=800)
+    maps = [d for p, d in zip(llm.prompts, llm.deadlines) if p.startswith(MAP_PROMPT)]
+    rounds = -(-len(maps) // llm_pipeline.MAX_WORKERS)
+    assert all(start < d <= time.monotonic() + 10.0 * rounds for d in maps)
+    # 單次 / reduce 呼叫沒有期限
+    assert llm.deadlines[-1] is None
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class NoCache:
+    def fetch(self, request, call):
+        return call()
+
+
+@pytest.fixture
+def failing_http(monkeypatch):
+    """LLM_BASE_URL 模式下每次請求都失敗，記錄每次請求的逾時秒數"""
+    clock = FakeClock()
+    timeouts = []
+
+    def chat(request, timeout):
+        timeouts.append(timeout)
+        clock.now += 1
+        raise ConnectionError("refused")
+
+    monkeypatch.setattr(llm_pipeline, "time", clock)
+    monkeypatch.setattr(llm_pipeline.random, "uniform", lambda a, b: 1.0)
+    monkeypatch.setattr(llm_pipeline, "default_cache", NoCache)
+    monkeypatch.setattr(llm_pipeline, "_chat_completions", chat)
+    monkeypatch.setattr(llm_pipeline, "LLM_BASE_URL", "http://llm.test")
+    monkeypatch.setattr(llm_pipeline, "CALL_TIMEOUT", 30.0)
+    monkeypatch.setattr(llm_pipeline, "BACKOFF", 5.0)
+    monkeypatch.setattr(llm_pipeline, "RETRIES", 3)
+    return clock, timeouts
+
+
+def test_deadline_caps_request_timeout_and_stops_retrying(failing_http):
+    clock, timeouts = failing_http
+    with pytest.raises(TimeoutError):
+        llm_pipeline.default_complete("prompt", deadline=clock.now + 20)
+    # 每次請求的逾時不超過剩餘時間；第三次失敗後要等 20 秒，超過期限就不再重試
+    assert timeouts == [20.0, 14.0, 3.0]
+    assert clock.now == 118
+
+
+def test_without_deadline_every_retry_uses_call_timeout(failing_http):
+    _, timeouts = failing_http
+    with pytest.raises(ConnectionError):
+        llm_pipeline.default_complete("prompt")
+    assert timeouts == [30.0] * 4
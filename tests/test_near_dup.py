@@ -0,0 +1,117 @@
+import json
+from datetime import date
+
+import pytest
+
+from near_dup import LSHIndex, _encode, cluster_items, fingerprint, is_near_dup, similarity
+
+# 以下都是 data/ 裡實際出現過的配對
+INTEL_WORLDJOURNAL = {
+    "title": "英特爾AI主管跳槽OpenAI 執行長陳立武親自領軍救火",
+    "summary": "英特爾（Intel）10日表示，執行長陳立武將親自領導公司的AI事業。該公司的技術長兼AI主管卡提（Sachin Katti）"
+               "稍早宣布離職，跳槽聊天機器人ChatGPT開發商OpenAI。",
+    "source": "世界新聞網",
+    "url": "https://www.worldjournal.com/wj/story/121208/9131118",
+    "published_at": "2025-11-11T02:10:00Z",
+}
+INTEL_YAHOO = {
+    "title": "英特爾大將跳槽OpenAI 執行長陳立武親掌AI事業",
+    "summary": "英特爾技術長兼AI主管卡提證實，將轉投效聊天機器人ChatGPT開發商OpenAI，負責設計與建構運算基礎設施。"
+               "英特爾10日宣布，執行長陳立武將親自領導AI團隊，接手卡提原本的...",
+    "source": "奇摩新聞",
+    "url": "https://tw.news.yahoo.com/intel-052722483.html",
+    "published_at": "2025-11-11T05:27:22Z",
+}
+CNA = {
+    "title": "對話56天、傳訊4732則男子愛上AI後釀悲劇| 國際",
+    "summary": "美國一名與妻子分居的男子為尋求慰藉而與人工智慧Gemini對話聊天，不到兩個月男子竟愛上AI甚至還想為AI尋得身體"
+               "「長相廝守」，最終男子因幻滅釀成悲劇。",
+    "source": "中央社 CNA",
+    "url": "https://www.cna.com.tw/news/aopl/202604120059.aspx",
+}
+CNA_REPRINT = {**CNA, "source": "奇摩新聞", "url": "https://tw.news.yahoo.com/cna-202604120059.html"}
+
+NIKKEI_SUMMARY = ("日經中文網官方網站。日經中文網是日本經濟新聞社的中文財經網站。"
+                  "提供日本、中國、歐美財經金融資訊、商務、企業、高科技報道、評論和專欄。")
+MONEYDJ_SUMMARY = ("提供專業的金融網路資訊服務，幫您迅速掌握國內外即時財經新聞，除了有台股、美股、基金、港股、權證、ETF"
+                   "等投資專屬頻道，還有獨家專業的選股看盤商品，...")
+SETN_SUMMARY = ("AI熱潮持續延燒，到了2026年依然是全球股市最熱門的投資主題之一。投資人也開始思考，在這波人工智慧浪潮中，"
+                "哪些企業與產業能成為長期贏家，又有哪些公司...")
+RYZA_SUMMARY = ("SpiralAI 宣布，獲KOEI TECMO GAMES 授權的《RyzaChat:AI 與萊莎共譜專屬於你的夏日夢幻故事（暫譯，"
+                "RyzaChat:AI ライザと創るあなただけのひと夏の夢...")
+
+TRUE_PAIRS = {
+    "same story, rewritten": (INTEL_WORLDJOURNAL, INTEL_YAHOO),
+    "verbatim reprint": (CNA, CNA_REPRINT),
+}
+FALSE_PAIRS = {
+    # 摘要是網站固定介紹，全文相似度 0.6~0.7，但標題是不同新聞
+    "nikkei boilerplate": (
+        {"title": "AI會預見股市「黑天鵝」嗎？", "summary": NIKKEI_SUMMARY, "source": "日經中文網"},
+        {"title": "日系車的現實（中）沒有AI就會落後", "summary": NIKKEI_SUMMARY, "source": "日經中文網"},
+    ),
+    "moneydj boilerplate": (
+        {"title": "采鈺通過配息3元；AI布局添成長動能- 新聞", "summary": MONEYDJ_SUMMARY, "source": "MoneyDJ"},
+        {"title": "百度Q2經調整獲利年減46%；AI業務收入增25%", "summary": MONEYDJ_SUMMARY, "source": "MoneyDJ"},
+    ),
+    "setn shared lede": (
+        {"title": "押寶AI大趨勢！外媒點名「這2檔」股票：下輪財報季前必大量買進", "summary": SETN_SUMMARY},
+        {"title": "台積電太貴難下手？外媒呼長抱「3檔AI股票」拚翻身：地位難以撼動", "summary": SETN_SUMMARY},
+    ),
+    # 同一款遊戲的兩則不同消息（推出日期 / 延期）
+    "follow-up announcement": (
+        {"title": "開放式劇情 AI 聊天型 RPG《RyzaChat:AI》預定 8 月推出 與 AI 萊莎度過夢幻的夏日", "summary": RYZA_SUMMARY},
+        {"title": "開放式劇情 AI 聊天型 RPG《RyzaChat:AI》宣布延至下週上線", "summary": RYZA_SUMMARY},
+    ),
+}
+
+
+def pair_sims(a, b):
+    (sa, ta), (sb, tb) = fingerprint(a), fingerprint(b)
+    return similarity(sa, sb), similarity(ta, tb)
+
+
+@pytest.mark.parametrize("a, b", TRUE_PAIRS.values(), ids=TRUE_PAIRS.keys())
+def test_true_pairs_are_near_dups(a, b):
+    assert is_near_dup(*pair_sims(a, b))
+
+
+@pytest.mark.parametrize("a, b", FALSE_PAIRS.values(), ids=FALSE_PAIRS.keys())
+def test_false_pairs_are_kept_apart(a, b):
+    assert not is_near_dup(*pair_sims(a, b))
+
+
+@pytest.fixture
+def index(tmp_path):
+    return LSHIndex(path=str(tmp_path / "lsh.jsonl"), today=date(2025, 11, 11))
+
+
+def test_cluster_items_keeps_full_related_items(index):
+    items = [dict(INTEL_WORLDJOURNAL), dict(INTEL_YAHOO), dict(CNA)]
+    kept = cluster_items(items, index, "2025-11-11")
+    assert [it["url"] for it in kept] == [INTEL_WORLDJOURNAL["url"], CNA["url"]]
+    assert kept[0]["related"] == [INTEL_YAHOO]
+    assert kept[0]["cluster_id"] != kept[1]["cluster_id"]
+
+
+@pytest.mark.parametrize("a, b", FALSE_PAIRS.values(), ids=FALSE_PAIRS.keys())
+def test_cluster_items_keeps_false_pairs(index, a, b):
+    kept = cluster_items([dict(a), dict(b)], index, "2025-11-11")
+    assert len(kept) == 2 and not any(it.get("related") for it in kept)
+
+
+def test_index_round_trip_keeps_title_signature(tmp_path, index):
+    cluster_items([dict(INTEL_WORLDJOURNAL)], index, "2025-11-10")
+    index.save()
+    reloaded = LSHIndex(path=index.path, today=date(2025, 11, 11))
+    hit = reloaded.query(*fingerprint(INTEL_YAHOO))
+    assert hit is not None and hit[0] == index.entries[0][0]
+
+
+def test_legacy_entries_without_title_need_strong_match(tmp_path):
+    path = tmp_path / "lsh.jsonl"
+    sig, _ = fingerprint(INTEL_WORLDJOURNAL)
+    path.write_text(json.dumps({"c": "c1", "d": "2025-11-10", "s": _encode(sig)}) + "\n", encoding="utf-8")
+    index = LSHIndex(path=str(path), today=date(2025, 11, 11))
+    assert index.query(*fingerprint(INTEL_YAHOO)) is None
+    assert index.query(*fingerprint(INTEL_WORLDJOURNAL))[0] == "c1"
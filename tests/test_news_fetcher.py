@@ -0,0 +1,125 @@
+import threading
+import time
+from datetime import datetime, timezone
+
+import pytest
+
+import news_fetcher
+from news_fetcher import RateLimiter, fetch_all, fetch_query
+
+
+def news(n, hour):
+    return {"title": f"news {n}", "link": f"https://a.com/{n}", "published_at": f"2026-08-01 {hour:02d}:00:00 UTC"}
+
+
+class FakeSerp:
+    """依 start 回傳預先排好的頁；最後一頁沒有 next"""
+
+    def __init__(self, pages):
+        self.pages = pages
+        self.calls = []
+
+    def __call__(self, keyword, start_date, end_date, language="TW", start=0, session=None, limiter=None):
+        self.calls.append((keyword, language, start))
+        page = start // news_fetcher.PAGE_SIZE
+        if page >= len(self.pages):
+            return {"error": "Google hasn't returned any results for this query."}
+        res = {"news_results": self.pages[page]}
+        if page + 1 < len(self.pages):
+            res["serpapi_pagination"] = {"next": "..."}
+        return res
+
+
+@pytest.fixture
+def serp(monkeypatch):
+    # 結果不依時間排序：第二頁有比第一頁更舊、也有更新的新聞
+    fake = FakeSerp([[news(1, 5), news(2, 9)], [news(3, 1), news(4, 12)]])
+    monkeypatch.setattr(news_fetcher, "sera_google_search", fake)
+    return fake
+
+
+def test_exhausted_pagination_advances_to_newest(serp):
+    results, mark = fetch_query("AI", "TW", "8/1/2026", "8/1/2026", max_pages=5)
+    assert [r["title"] for r in results] == ["news 1", "news 2", "news 3", "news 4"]
+    assert mark == datetime(2026, 8, 1, 12, tzinfo=timezone.utc)
+    # 最後一頁沒有 next 就停，不會用完 max_pages
+    assert [start for _, _, start in serp.calls] == [0, news_fetcher.PAGE_SIZE]
+
+
+def test_truncated_pagination_does_not_advance(serp):
+    results, mark = fetch_query("AI", "TW", "8/1/2026", "8/1/2026", max_pages=1)
+    assert len(results) == 2 and mark is None
+    assert len(serp.calls) == 1
+
+
+def test_first_page_error_does_not_advance(monkeypatch):
+    monkeypatch.setattr(news_fetcher, "sera_google_search", FakeSerp([]))
+    assert fetch_query("AI", "TW", "8/1/2026", "8/1/2026", max_pages=3) == ([], None)
+
+
+def test_since_filters_items_but_keeps_paging(serp):
+    since = datetime(2026, 8, 1, 6, tzinfo=timezone.utc)
+    results, mark = fetch_query("AI", "TW", "8/1/2026", "8/1/2026", max_pages=5, since=since)
+    # 第二頁有比 since 舊的新聞，但也有新的，不能因為舊的就停止翻頁
+    assert [r["title"] for r in results] == ["news 2", "news 4"]
+    assert len(serp.calls) == 2 and mark == datetime(2026, 8, 1, 12, tzinfo=timezone.utc)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(round(seconds, 6))
+        self.now += seconds
+
+
+def test_rate_limiter_spaces_requests_per_host(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(news_fetcher, "time", clock)
+    limiter = RateLimiter(per_second=5)
+    for _ in range(3):
+        limiter.wait("https://serpapi.com/search?q=1")
+    # 其他 host 不必排在同一個佇列後面
+    limiter.wait("https://graph.facebook.com/me")
+    assert clock.sleeps == [0.2, 0.2]
+
+    clock.now += 1.0
+    limiter.wait("https://serpapi.com/search?q=2")
+    assert clock.sleeps == [0.2, 0.2]
+
+
+def test_rate_limiter_disabled():
+    assert RateLimiter(per_second=0).interval == 0.0
+
+
+def test_fetch_all_keeps_input_order_under_concurrency(monkeypatch):
+    running = []
+    peak = []
+    lock = threading.Lock()
+
+    def fake_fetch_query(keyword, language, start, end, max_pages, session, limiter, since):
+        with lock:
+            running.append(keyword)
+            peak.append(len(running))
+        # 越前面的組合越慢完成
+        time.sleep(0.02 * (3 - int(keyword[-1])))
+        with lock:
+            running.remove(keyword)
+        if keyword == "k1" and language == "EN":
+            raise RuntimeError("boom")
+        return [{"title": f"{keyword}/{language}"}], f"mark {keyword}/{language}"
+
+    monkeypatch.setattr(news_fetcher, "fetch_query", fake_fetch_query)
+    out = fetch_all(["k0", "k1", "k2"], ["TW", "EN"], "8/1/2026", "8/1/2026", max_workers=4)
+
+    assert max(peak) > 1
+    assert [(k, lang) for k, lang, _, _ in out] == [
+        ("k0", "TW"), ("k0", "EN"), ("k1", "TW"), ("k1", "EN"), ("k2", "TW"), ("k2", "EN")]
+    assert out[1][2:] == ([{"title": "k0/EN"}], "mark k0/EN")
+    # 單一組合失敗只影響自己
+    assert out[3][2:] == ([], None)
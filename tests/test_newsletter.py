@@ -0,0 +1,54 @@
+from datetime import date
+
+import pytest
+
+import llm_pipeline
+import newsletter
+import ranking
+
+DAY = date(2026, 8, 20)
+
+
+@pytest.fixture(autouse=True)
+def workdir(tmp_path, monkeypatch):
+    # data/、rollups 都用相對路徑；空目錄裡沒有資料也沒有趨勢摘要
+    monkeypatch.chdir(tmp_path)
+
+
+@pytest.mark.parametrize("module, name, value", [
+    (ranking, "MMR_LAMBDA", 0.5),
+    (ranking, "SOURCE_DECAY", 0.5),
+    (ranking, "W_RECENCY", 0.1),
+    (ranking, "TOP_K", 10),
+    (llm_pipeline, "REDUCE_HEADER", "重點："),
+    (llm_pipeline, "MAP_PROMPT", "摘要："),
+    (llm_pipeline, "MODEL", "other-model"),
+])
+def test_input_hash_covers_prompts_and_ranking(monkeypatch, module, name, value):
+    before = newsletter.input_hash(DAY)
+    monkeypatch.setattr(module, name, value)
+    assert newsletter.input_hash(DAY) != before
+
+
+def test_input_hash_covers_pinned_trends():
+    assert newsletter.input_hash(DAY, trends="\n升溫關鍵詞：輝達") != newsletter.input_hash(DAY)
+
+
+def test_rollups_changes_do_not_make_old_days_stale(monkeypatch):
+    monkeypatch.setattr(newsletter, "trends_for", lambda day: "\n升溫關鍵詞：輝達")
+    monkeypatch.setattr(newsletter, "render", lambda day, custom_prompt, strict, trends: (trends, True))
+    monkeypatch.setattr(newsletter.digest, "write_daily", lambda day, content: None)
+    manifest = newsletter.Manifest(newsletter.MANIFEST_PATH)
+    newsletter.generate_for_date(DAY, manifest=manifest)
+    assert manifest.get(DAY)["trends"] == "\n升溫關鍵詞：輝達"
+
+    # rollups.json 之後又更新了：這天仍是最新，重新生成也沿用當時的趨勢摘要
+    monkeypatch.setattr(newsletter, "trends_for", lambda day: "\n升溫關鍵詞：記憶體")
+    reloaded = newsletter.Manifest(newsletter.MANIFEST_PATH)
+    assert reloaded.is_up_to_date(DAY)
+    assert reloaded.trends(DAY) == "\n升溫關鍵詞：輝達"
+
+
+def test_input_hash_is_stable_and_per_prompt():
+    assert newsletter.input_hash(DAY) == newsletter.input_hash(DAY)
+    assert newsletter.input_hash(DAY, "多寫一點") != newsletter.input_hash(DAY)
@@ -0,0 +1,207 @@
+import itertools
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+import publish_queue
+from publish_queue import Outbox, Pacer, Publisher, parse_usage_headers
+
+
+class MockGraph:
+    """
+    本機的 Graph API：plan 依序決定每個請求（GET posts / POST feed）的回應，用完後都正常回應。
+      ok            正常
+      500           暫時性錯誤，沒有發出
+      post_then_500 貼文發出了但回應遺失（500）
+      forbidden     403 權限不足（code 10）
+      ratelimit     400 code 32，X-Page-Usage 要求等 1 分鐘
+      badtoken      400 code 190 權杖失效
+    """
+
+    def __init__(self, plan=()):
+        self.plan = list(plan)
+        self.posts = []
+        self.requests = []
+        self._ids = itertools.count(1)
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def send(self, status, body, headers=None):
+                payload = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                for k, v in (headers or {}).items():
+                    self.send_header(k, v)
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def handle_request(self, method):
+                url = urlparse(self.path)
+                n = int(self.headers.get("Content-Length") or 0)
+                data = parse_qs(self.rfile.read(n).decode("utf-8")) if n else {}
+                mock.requests.append((method, url.path))
+                action = mock.plan.pop(0) if mock.plan else "ok"
+                if action == "500":
+                    return self.send(500, {"error": {"message": "oops", "code": 2, "is_transient": True}})
+                if action == "forbidden":
+                    return self.send(403, {"error": {"message": "(#10) pages_read_engagement required", "code": 10}})
+                if action == "ratelimit":
+                    usage = {"call_count": 100, "estimated_time_to_regain_access": 1}
+                    return self.send(400, {"error": {"message": "limit", "code": 32}},
+                                     {"X-Page-Usage": json.dumps(usage)})
+                if action == "badtoken":
+                    return self.send(400, {"error": {"message": "Invalid OAuth access token", "code": 190}})
+                if method == "GET":
+                    return self.send(200, {"data": [{"id": p["id"], "message": p["message"]}
+                                                    for p in reversed(mock.posts)]})
+                post_id = f"page_{next(mock._ids)}"
+                mock.posts.append({"id": post_id, "message": data["message"][0]})
+                if action == "post_then_500":
+                    return self.send(500, {"error": {"message": "unknown", "code": 1}})
+                self.send(200, {"id": post_id}, {"X-App-Usage": json.dumps({"call_count": 10})})
+
+            def do_GET(self):
+                self.handle_request("GET")
+
+            def do_POST(self):
+                self.handle_request("POST")
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def graph():
+    mock = MockGraph()
+    yield mock
+    mock.close()
+
+
+@pytest.fixture
+def outbox(tmp_path, monkeypatch):
+    monkeypatch.setenv("FB_ACCESS_TOKEN", "token")
+    monkeypatch.delenv("FB_PAGE_TOKENS", raising=False)
+    # 重試不要真的等好幾秒
+    monkeypatch.setattr(publish_queue, "BACKOFF", 0.01)
+    box = Outbox(str(tmp_path / "queue.sqlite3"))
+    yield box
+    box.close()
+
+
+def drain(outbox, graph, max_wait=5):
+    publisher = Publisher(outbox, pacer=Pacer(min_interval=0, max_interval=1), graph_url=graph.url,
+                          max_wait=max_wait)
+    try:
+        return publisher.drain(), publisher
+    finally:
+        publisher.close()
+
+
+def test_enqueue_is_idempotent(outbox):
+    first, added = outbox.enqueue("page", "hello", source="2026-10-18.md")
+    again, added_again = outbox.enqueue("page", "hello", source="2026-10-18.md")
+    other, _ = outbox.enqueue("page", "hello", source="2026-10-19.md")
+    assert added and not added_again
+    assert first == again != other
+
+
+def test_publishes_once(outbox, graph):
+    item_id, _ = outbox.enqueue("page", "hello")
+    stats, _ = drain(outbox, graph)
+    assert stats["done"] == 1
+    assert outbox.get(item_id)["post_id"] == "page_1"
+    # 重跑不會再發
+    stats, _ = drain(outbox, graph)
+    assert stats["done"] == 0 and len(graph.posts) == 1
+
+
+def test_lost_response_is_not_reposted(outbox, graph):
+    graph.plan = ["post_then_500"]
+    item_id, _ = outbox.enqueue("page", "hello")
+    stats, _ = drain(outbox, graph)
+    row = outbox.get(item_id)
+    assert row["status"] == "done" and row["post_id"] == "page_1"
+    assert len(graph.posts) == 1
+    assert graph.requests == [("POST", "/page/feed"), ("GET", "/page/posts")]
+    assert stats["retry"] == 1
+
+
+def test_forbidden_lookup_is_retried_not_failed(outbox, graph):
+    # 第一次沒發出就 500；重試前查詢被拒，不能因此把還沒發出的貼文標成 failed
+    graph.plan = ["500", "forbidden"]
+    item_id, _ = outbox.enqueue("page", "hello")
+    stats, _ = drain(outbox, graph)
+    row = outbox.get(item_id)
+    assert row["status"] == "done"
+    assert stats == {"done": 1, "retry": 2, "failed": 0, "deferred": 0}
+    assert len(graph.posts) == 1
+
+
+def test_forbidden_lookup_gives_up_after_max_attempts(outbox, graph, monkeypatch):
+    monkeypatch.setattr(publish_queue, "MAX_ATTEMPTS", 3)
+    graph.plan = ["500", "forbidden", "forbidden"]
+    item_id, _ = outbox.enqueue("page", "hello")
+    stats, _ = drain(outbox, graph)
+    row = outbox.get(item_id)
+    assert row["status"] == "failed" and row["attempts"] == 3
+    assert "可能已經發出" in row["last_error"]
+    assert stats["failed"] == 1 and not graph.posts
+
+
+def test_permanent_error_fails_without_retry(outbox, graph):
+    graph.plan = ["badtoken"]
+    item_id, _ = outbox.enqueue("page", "hello")
+    stats, _ = drain(outbox, graph)
+    row = outbox.get(item_id)
+    assert row["status"] == "failed" and row["attempts"] == 1
+    assert stats["failed"] == 1
+
+
+def test_rate_limit_defers_until_regain(outbox, graph):
+    graph.plan = ["ratelimit"]
+    item_id, _ = outbox.enqueue("page", "hello")
+    stats, publisher = drain(outbox, graph, max_wait=1)
+    row = outbox.get(item_id)
+    # 限流時請求沒有發出，回到 pending；要等的時間超過 max_wait，留給下次執行
+    assert row["status"] == "pending"
+    assert stats["deferred"] == 1 and stats["done"] == 0
+    assert publisher.pacer.delay() > 50
+    assert not graph.posts
+
+
+def test_parse_usage_headers_takes_highest():
+    headers = {
+        "x-app-usage": json.dumps({"call_count": 12, "total_time": 40, "total_cputime": 3}),
+        "x-business-use-case-usage": json.dumps(
+            {"123": [{"call_count": 80, "estimated_time_to_regain_access": 5}]}),
+    }
+    assert parse_usage_headers(headers) == (80, 5)
+    assert parse_usage_headers({}) is None
+    assert parse_usage_headers({"x-app-usage": "not json"}) is None
+
+
+def test_pacer_interval_grows_with_usage():
+    pacer = Pacer(min_interval=2, max_interval=102)
+    pacer.usage = 50
+    assert pacer.interval() == 2
+    pacer.usage = 75
+    assert pacer.interval() == pytest.approx(27)
+    pacer.usage = 100
+    assert pacer.interval() == 102
+    pacer.last = time.time()
+    assert 100 < pacer.delay() <= 102
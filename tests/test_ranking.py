@@ -0,0 +1,41 @@
+from llm_pipeline import estimate_tokens, format_article
+from ranking import select_articles
+
+
+def articles(n):
+    return [{"title": f"輝達 GPU 新聞 {i}", "summary": "人工智慧晶片需求" * 10, "source": f"來源{i % 3}",
+             "published_at": f"2026-08-01T{i % 24:02d}:00:00+08:00"} for i in range(n)]
+
+
+def cost(selected):
+    return sum(estimate_tokens(format_article(i, a)) for i, a in enumerate(selected, 1))
+
+
+def test_k_caps_count():
+    assert len(select_articles(articles(20), k=5)) == 5
+
+
+def test_budget_caps_tokens():
+    items = articles(20)
+    budget = cost(items[:4]) + 10
+    selected = select_articles(items, k=20, budget=budget)
+    assert 0 < len(selected) < 20
+    assert cost(selected) <= budget
+
+
+def test_zero_k_still_applies_budget():
+    items = articles(20)
+    budget = cost(items[:4]) + 10
+    selected = select_articles(items, k=0, budget=budget)
+    assert 0 < len(selected) < 20
+    assert cost(selected) <= budget
+
+
+def test_zero_k_without_budget_keeps_everything_in_order():
+    items = articles(20)
+    assert select_articles(items, k=0) == items
+
+
+def test_prefers_source_diversity():
+    items = [dict(a, source="同一來源") for a in articles(6)] + [dict(articles(1)[0], title="輝達 GPU 另一家", source="別家")]
+    assert "別家" in {a["source"] for a in select_articles(items, k=3)}
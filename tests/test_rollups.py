@@ -0,0 +1,71 @@
+from datetime import date, timedelta
+
+import pytest
+
+from rollups import TERM_KEEP, Rollups, item_terms, merge_bigrams
+
+END = date(2026, 8, 28)
+
+
+def day(offset):
+    return (END - timedelta(days=offset)).isoformat()
+
+
+def articles(counts):
+    return [{"source": source, "title": ""} for source, n in counts.items() for _ in range(n)]
+
+
+@pytest.fixture
+def rollups(tmp_path):
+    """
+    基準期（前 28 天）每天 10 篇、近 7 天每天 20 篇，整體量剛好加倍（scale = 0.5）：
+      A 基準 28 篇、近期 14 篇   -> 預期 14，沒有升溫
+      B 只在近期，每天 1 篇       -> 預期 0，分數 7 / sqrt(1) = 7
+      C 只在近期，共 2 篇         -> 少於 MIN_BURST_COUNT，不算
+      D 基準 4 篇、近期 6 篇      -> 預期 2，分數 (6 - 2) / sqrt(3) = 2.31
+    """
+    r = Rollups(str(tmp_path / "rollups.json"))
+    for i in range(7, 35):
+        counts = {"A": 1, "D": 1 if i < 11 else 0}
+        r.add(day(i), articles({**counts, "Z": 10 - sum(counts.values())}))
+    for i in range(7):
+        counts = {"A": 2, "B": 1, "C": 1 if i < 2 else 0, "D": 1 if i < 6 else 0}
+        r.add(day(i), articles({**counts, "Z": 20 - sum(counts.values())}))
+    return r
+
+
+def test_volume_and_counts(rollups):
+    assert rollups.volume(END, 7) == 140
+    assert rollups.volume(END - timedelta(days=7), 28) == 280
+    assert rollups.counts("source", END, 7)["A"] == 14
+    assert rollups.top("source", END, 7, n=2) == [("Z", 111), ("A", 14)]
+
+
+def test_bursts_scale_baseline_by_volume(rollups):
+    assert rollups.bursts("source", END) == [("B", 7, 0.0, 7.0), ("D", 6, 2.0, 2.31)]
+
+
+def test_bursts_without_baseline_volume(tmp_path):
+    r = Rollups(str(tmp_path / "rollups.json"))
+    r.add(day(0), articles({"A": 4}))
+    # 沒有基準期資料時預期篇數為 0，分數就是 c / sqrt(1)
+    assert r.bursts("source", END) == [("A", 4, 0.0, 4.0)]
+
+
+def test_save_reload_and_prune(tmp_path, rollups):
+    old = day(60)
+    rollups.days[old] = {"n": 1, "source": {}, "keyword": {}, "term": {f"t{i:03d}": i for i in range(TERM_KEEP + 10)}}
+    rollups.save(END)
+    reloaded = Rollups(rollups.path)
+    assert reloaded.days[day(0)] == rollups.days[day(0)]
+    kept = reloaded.days[old]["term"]
+    assert len(kept) == TERM_KEEP and min(kept.values()) == 10
+
+
+def test_item_terms_uses_title_bigrams_without_stop_terms():
+    assert item_terms({"title": "AI 伺服器 2026 Nvidia"}) == {"伺服", "服器", "nvidia"}
+
+
+def test_merge_bigrams_joins_equal_counts_only():
+    rows = [("伺服", 5, 1.0, 3.0), ("服器", 5, 1.0, 3.0), ("晶片", 4, 0.0, 4.0)]
+    assert [r[0] for r in merge_bigrams(rows)] == ["伺服器", "晶片"]
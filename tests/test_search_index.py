@@ -0,0 +1,57 @@
+import json
+import os
+
+import pytest
+
+import search_index
+import storage
+from search_index import Searcher, shard_of, tokenize, update
+
+
+def news(n, title, summary=""):
+    return {"title": title, "summary": summary, "url": f"https://a.com/{n}", "source": "example"}
+
+
+@pytest.fixture
+def data(tmp_path, monkeypatch):
+    (tmp_path / "data").mkdir()
+    search_dir = tmp_path / "data" / "_search"
+    monkeypatch.setattr(search_index, "SEARCH_DIR", str(search_dir))
+    monkeypatch.setattr(search_index, "MANIFEST_PATH", str(search_dir / "manifest.json"))
+    storage.write_json(str(tmp_path / "data" / "2026-07-31.json"), [news(1, "台積電 法說會")], "json")
+    storage.write_json(str(tmp_path / "data" / "2026-08-01.json"), [news(2, "Nvidia 新晶片", "台積電代工")], "json")
+    return tmp_path / "data"
+
+
+def test_tokenize_cjk_bigrams_and_words():
+    assert tokenize("台積電 AI") == [["台積", "積電"], ["ai"]]
+
+
+def test_shard_of_is_fnv1a():
+    # 與前端 JS 的 FNV-1a 實作對照用的已知值："a" = 0xe40c292c
+    assert shard_of("a") == f"{0xE40C292C % search_index.SHARDS:02d}"
+
+
+def test_search_phrase_and_date_range(data):
+    assert update(str(data)) == ["2026-07", "2026-08"]
+    s = Searcher(search_index.SEARCH_DIR)
+    assert [r["url"] for r in s.search("台積電")] == ["https://a.com/1", "https://a.com/2"]
+    assert [r["url"] for r in s.search("台積電", date_from="2026-08-01")] == ["https://a.com/2"]
+    assert s.search('"積電法"') == []
+
+
+def test_update_rebuilds_only_changed_month(data):
+    update(str(data))
+    july = os.path.join(search_index.SEARCH_DIR, "2026-07", "docs.json")
+    os.utime(july, (0, 0))
+
+    storage.write_json(str(data / "2026-08-02.json"), [news(3, "記憶體 漲價")], "json")
+    assert update(str(data), only_months={"2026-08"}) == ["2026-08"]
+    # 沒變動的月份不會改寫
+    assert os.stat(july).st_mtime == 0
+    assert update(str(data)) == []
+
+    manifest = json.loads((data / "_search" / "manifest.json").read_text())
+    assert manifest["hash"] == search_index.SHARD_HASH
+    assert manifest["months"]["2026-08"]["n_docs"] == 2
+    assert Searcher(search_index.SEARCH_DIR).search("漲價")[0]["date"] == "2026-08-02"
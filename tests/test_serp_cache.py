@@ -0,0 +1,109 @@
+import os
+import time
+
+import pytest
+
+import serp_cache
+from serp_cache import CacheMiss, ResponseCache, cache_key
+
+PARAMS = {"engine": "google_news", "q": "AI  News", "start_date": "8/1/2026", "api_key": "secret"}
+
+
+class Fetcher:
+    """記錄被呼叫幾次的假 SerpAPI"""
+
+    def __init__(self, response=None):
+        self.calls = 0
+        self.response = response if response is not None else {"news_results": [{"title": "t"}]}
+
+    def __call__(self):
+        self.calls += 1
+        return self.response
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """可以往前撥的 time.time()"""
+    now = [time.time()]
+    monkeypatch.setattr(serp_cache.time, "time", lambda: now[0])
+    return now
+
+
+def make_cache(tmp_path, **kwargs):
+    return ResponseCache(cache_dir=str(tmp_path / "serp"), **kwargs)
+
+
+def test_key_ignores_token_spacing_case_and_date_format():
+    same = {"engine": "google_news", "q": "ai news", "start_date": "08/01/2026", "start": 0, "api_key": "other"}
+    assert cache_key(PARAMS) == cache_key(same)
+    assert cache_key(PARAMS) != cache_key({**PARAMS, "start": 10})
+
+
+def test_hit_within_ttl_and_miss_after(tmp_path, clock):
+    cache = make_cache(tmp_path, ttl=60)
+    fetch = Fetcher()
+    cache.fetch(PARAMS, fetch)
+    cache.fetch(PARAMS, fetch)
+    assert fetch.calls == 1 and (cache.hits, cache.misses) == (1, 1)
+
+    clock[0] += 61
+    cache.fetch(PARAMS, fetch)
+    assert fetch.calls == 2
+
+
+def test_per_query_ttl_can_only_shorten(tmp_path, clock):
+    cache = make_cache(tmp_path, ttl=60)
+    cache.put(PARAMS, {"ok": 1})
+    clock[0] += 30
+    assert cache.get(PARAMS, ttl=10) is None
+    assert cache.get(PARAMS, ttl=3600) == {"ok": 1}
+    clock[0] += 31
+    assert cache.get(PARAMS, ttl=3600) is None
+
+
+def test_error_responses_are_not_cached(tmp_path):
+    cache = make_cache(tmp_path)
+    fetch = Fetcher({"error": "Your account has run out of searches."})
+    cache.fetch(PARAMS, fetch)
+    cache.fetch(PARAMS, fetch)
+    assert fetch.calls == 2 and cache.stats()["entries"] == 0
+
+
+def test_replay_ignores_ttl_and_never_fetches(tmp_path, clock):
+    make_cache(tmp_path, ttl=60).put(PARAMS, {"ok": 1})
+    clock[0] += 10 * 24 * 3600
+    replay = make_cache(tmp_path, ttl=60, mode="replay")
+    fetch = Fetcher()
+    assert replay.fetch(PARAMS, fetch) == {"ok": 1}
+    with pytest.raises(CacheMiss):
+        replay.fetch({**PARAMS, "q": "not recorded"}, fetch)
+    assert fetch.calls == 0
+
+
+def test_record_always_fetches_and_off_never_writes(tmp_path):
+    cache = make_cache(tmp_path)
+    cache.put(PARAMS, {"old": 1})
+    record = make_cache(tmp_path, mode="record")
+    assert record.fetch(PARAMS, Fetcher({"new": 1})) == {"new": 1}
+    assert cache.get(PARAMS) == {"new": 1}
+
+    off = make_cache(tmp_path / "off", mode="off")
+    off.fetch(PARAMS, Fetcher())
+    assert off.stats()["entries"] == 0
+
+
+def test_evicts_least_recently_used_over_max_bytes(tmp_path):
+    big = {"news_results": [{"title": "x" * 1000}]}
+    cache = make_cache(tmp_path, max_bytes=2500)
+    a, b, c = ({**PARAMS, "q": q} for q in "abc")
+    cache.put(a, big)
+    cache.put(b, big)
+    # a 比 b 舊，但剛被讀過，所以淘汰的是 b
+    now = time.time()
+    os.utime(cache._path(cache.key(a)), (now - 300, now - 300))
+    os.utime(cache._path(cache.key(b)), (now - 200, now - 200))
+    assert cache.get(a) == big
+    cache.put(c, big)
+    assert cache.get(b) is None
+    assert cache.get(a) == big and cache.get(c) == big
+    assert cache.stats()["bytes"] <= 2500
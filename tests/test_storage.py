@@ -0,0 +1,83 @@
+import json
+import os
+
+import pytest
+
+import storage
+from dedup_index import file_hash
+
+ITEMS = [
+    {"title": "台積電 AI 訂單", "url": "https://a.com/1", "summary": "摘要 “引號” ✨"},
+    {"title": "Intel", "url": "https://a.com/2", "related": [{"title": "轉載", "url": "https://b.com/2"}]},
+]
+
+
+def formats():
+    out = ["json", "compact", "gzip"]
+    if storage.zstandard is not None:
+        out.append("zstd")
+    return out
+
+
+@pytest.fixture
+def day(tmp_path):
+    return str(tmp_path / "2026-08-01.json")
+
+
+@pytest.mark.parametrize("fmt", formats())
+def test_round_trip(day, fmt):
+    target = storage.write_json(day, ITEMS, fmt)
+    assert target == day + storage.EXTS.get(fmt, "")
+    assert storage.find(day) == target
+    assert storage.format_of(day) == fmt
+    assert json.loads(storage.read_bytes(day)) == ITEMS
+
+
+def test_switching_format_removes_old_file(day):
+    storage.write_json(day, ITEMS, "gzip")
+    storage.write_json(day, ITEMS, "compact")
+    assert os.listdir(os.path.dirname(day)) == ["2026-08-01.json"]
+
+
+def test_unset_format_keeps_existing_one(day, monkeypatch):
+    monkeypatch.setattr(storage, "STORE_FORMAT", None)
+    storage.write_json(day, ITEMS, "gzip")
+    assert storage.write_json(day, ITEMS[:1]).endswith(".gz")
+
+
+def test_gzip_output_is_deterministic():
+    first = storage.encode(ITEMS, "gzip")
+    assert first == storage.encode(ITEMS, "gzip")
+
+
+@pytest.mark.parametrize("fmt", formats())
+def test_legacy_bytes_and_file_hash_do_not_depend_on_format(tmp_path, fmt):
+    plain = str(tmp_path / "plain" / "2026-08-01.json")
+    other = str(tmp_path / fmt / "2026-08-01.json")
+    os.makedirs(os.path.dirname(plain))
+    os.makedirs(os.path.dirname(other))
+    storage.write_json(plain, ITEMS, "json")
+    storage.write_json(other, ITEMS, fmt)
+    assert storage.legacy_bytes(other) == storage.legacy_bytes(plain)
+    assert file_hash(other) == file_hash(plain)
+
+
+def test_missing_file(day):
+    assert storage.find(day) is None
+    assert storage.read_bytes(day) is None
+    assert storage.legacy_bytes(day) is None
+    assert storage.size(day) == 0
+
+
+def test_unknown_format_is_rejected(day):
+    with pytest.raises(ValueError):
+        storage.write_json(day, ITEMS, "bz2")
+
+
+def test_migrate_converts_every_day(tmp_path):
+    paths = [str(tmp_path / f"2026-08-0{i}.json") for i in (1, 2)]
+    for p in paths:
+        storage.write_json(p, ITEMS, "json")
+    n, before, after = storage.migrate(paths + [str(tmp_path / "2026-08-03.json")], "gzip")
+    assert n == 2 and after < before
+    assert all(storage.format_of(p) == "gzip" and json.loads(storage.read_bytes(p)) == ITEMS for p in paths)
@@ -0,0 +1,122 @@
+import json
+import os
+
+import pytest
+
+import storage
+import store_news
+import watermark
+from store_news import (append_changes, compact, compact_all, load_batch, load_json, log_path, pending_batches,
+                        read_jsonl, snapshot, store_lock, write_batch)
+
+
+def news(n, published, summary=""):
+    return {"title": f"news {n}", "url": f"https://a.com/{n}", "published_at": published, "summary": summary}
+
+
+def test_append_changes_writes_only_changes_and_deletions(tmp_path):
+    path = str(tmp_path / "2026-08-01.json")
+    day = [news(1, "2026-08-01 01:00"), news(2, "2026-08-01 02:00")]
+    assert append_changes(path, {}, day) == 2
+    assert load_json(path) == day[::-1]
+
+    before = snapshot(load_json(path))
+    updated = [news(1, "2026-08-01 01:00", "補上摘要"), news(2, "2026-08-01 02:00"), news(3, "2026-08-01 03:00")]
+    assert append_changes(path, before, updated) == 2
+    assert append_changes(path, snapshot(updated), updated) == 0
+
+    # 消失的 key 記成刪除
+    assert append_changes(path, snapshot(updated), updated[1:]) == 1
+    assert read_jsonl(log_path(path))[-1] == {"_deleted": "u:https://a.com/1"}
+    assert [it["title"] for it in load_json(path)] == ["news 3", "news 2"]
+
+
+def test_read_jsonl_skips_truncated_last_line(tmp_path):
+    path = tmp_path / "2026-08-01.jsonl"
+    path.write_text(json.dumps(news(1, "x")) + "\n" + '{"title": "news 2", "ur', encoding="utf-8")
+    assert read_jsonl(str(path)) == [news(1, "x")]
+
+
+def test_compact_folds_log_into_day_file(tmp_path):
+    path = str(tmp_path / "2026-08-01.json")
+    storage.write_json(path, [news(1, "2026-08-01 01:00")], "json")
+    append_changes(path, snapshot(load_json(path)), [news(1, "2026-08-01 01:00", "補上摘要"), news(2, "2026-08-01 02:00")])
+
+    assert compact(path)
+    assert not os.path.exists(log_path(path))
+    assert json.loads(storage.read_bytes(path)) == [news(2, "2026-08-01 02:00"), news(1, "2026-08-01 01:00", "補上摘要")]
+    assert not compact(path)
+
+
+def test_compact_all_skips_excluded_day(tmp_path):
+    old, today = str(tmp_path / "2026-08-01.json"), str(tmp_path / "2026-08-02.json")
+    append_changes(old, {}, [news(1, "2026-08-01 01:00")])
+    append_changes(today, {}, [news(2, "2026-08-02 01:00")])
+
+    assert compact_all(str(tmp_path), exclude={today}) == [old]
+    assert os.path.exists(log_path(today)) and not os.path.exists(log_path(old))
+    assert load_json(today) == [news(2, "2026-08-02 01:00")]
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    # data/、tmp/ 都是相對路徑
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(store_news, "today_str", lambda: "2026-08-01")
+    store_news.ensure_dirs()
+    return tmp_path
+
+
+def write_marks(batch, published):
+    marks = watermark.Watermarks(watermark.pending_path(batch))
+    marks.advance("AI", "TW", watermark.parse_published(published))
+    marks.save()
+
+
+def test_store_lock_is_exclusive(tmp_path):
+    fcntl = pytest.importorskip("fcntl")
+    path = str(tmp_path / "tmp" / "store.lock")
+    with store_lock(path):
+        with open(path, "a") as other, pytest.raises(BlockingIOError):
+            fcntl.flock(other, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    with open(path, "a") as other:
+        fcntl.flock(other, fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+
+def test_pending_batches_in_order_with_legacy_first(workdir):
+    write_batch("tmp/batches/20260801020000-b.json", [])
+    write_batch("tmp/batches/20260801010000-a.json", [])
+    write_batch(store_news.BATCH_PATH, [])
+    # 寫到一半的暫存檔不算
+    (workdir / "tmp" / "batches" / "20260801030000-c.json.123.tmp").write_text("[")
+    assert pending_batches() == [store_news.BATCH_PATH, "tmp/batches/20260801010000-a.json",
+                                 "tmp/batches/20260801020000-b.json"]
+
+
+@pytest.mark.parametrize("content", ['[{"title": "x"', '{"title": "x"}'])
+def test_corrupt_batch_is_moved_aside_and_its_watermarks_dropped(workdir, content):
+    path = "tmp/batches/20260801010000-a.json"
+    (workdir / path).write_text(content)
+    write_marks(path, "2026-08-01 05:00:00 UTC")
+
+    assert load_batch(path) is None
+    assert not os.path.exists(path) and os.path.exists(path + ".corrupt")
+    assert not os.path.exists(watermark.pending_path(path))
+
+
+def test_store_consumes_good_batches_and_skips_corrupt_ones(workdir):
+    good = ["tmp/batches/20260801010000-a.json", "tmp/batches/20260801030000-c.json"]
+    write_batch(good[0], [news(1, "2026-08-01 01:00:00 UTC")])
+    write_batch(good[1], [news(2, "2026-08-01 02:00:00 UTC"), news(1, "2026-08-01 01:00:00 UTC")])
+    bad = "tmp/batches/20260801020000-b.json"
+    (workdir / bad).write_text("[")
+    write_marks(good[0], "2026-08-01 03:00:00 UTC")
+    write_marks(bad, "2026-08-01 09:00:00 UTC")
+
+    store_news.store()
+
+    assert [it["title"] for it in load_json("data/2026-08-01.json")] == ["news 2", "news 1"]
+    assert not any(os.path.exists(p) for p in good) and os.path.exists(bad + ".corrupt")
+    # 只有存進去的批次水位生效
+    marks = watermark.Watermarks(watermark.WATERMARK_PATH)
+    assert marks.marks[watermark.query_key("AI", "TW")] == watermark.parse_published("2026-08-01 03:00:00 UTC")
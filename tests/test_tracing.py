@@ -0,0 +1,87 @@
+import threading
+
+import pytest
+
+import tracing
+
+
+@pytest.fixture
+def trace_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(tracing, "ENABLED", True)
+    return str(tmp_path / "traces")
+
+
+def only_run(trace_dir):
+    runs = tracing.read_runs(trace_dir)
+    assert len(runs) == 1
+    return next(iter(runs.values()))
+
+
+def test_spans_nest_and_record_counters_and_calls(trace_dir):
+    with tracing.run("store_news", trace_dir=trace_dir):
+        with tracing.span("merge", batch=2) as sp:
+            sp.add("items", 3)
+            tracing.count("items")
+            with tracing.external("serpapi", page=1) as info:
+                info["results"] = 10
+        # 工作執行緒沒有自己的 span，掛在整個 run 底下
+        def fetch():
+            with tracing.span("fetch"):
+                pass
+
+        worker = threading.Thread(target=fetch)
+        worker.start()
+        worker.join()
+    tracing.count("ignored")
+
+    records = only_run(trace_dir)
+    spans = {r["name"]: r for r in records if r["type"] == "span"}
+    root, merge = spans["store_news"], spans["merge"]
+    assert root["parent"] is None and merge["parent"] == root["id"]
+    assert merge["attrs"] == {"batch": 2} and merge["counters"] == {"items": 4}
+    assert spans["fetch"]["parent"] == root["id"] and spans["fetch"]["thread"] != root["thread"]
+    call = next(r for r in records if r["type"] == "call")
+    assert call["service"] == "serpapi" and call["parent"] == merge["id"]
+    assert call["attrs"] == {"page": 1, "results": 10}
+    assert {r["script"] for r in records} == {"store_news"}
+
+
+def test_errors_are_recorded_and_reraised(trace_dir):
+    with pytest.raises(ValueError):
+        with tracing.run("news", trace_dir=trace_dir):
+            with tracing.span("fetch"):
+                raise ValueError("boom")
+    errors = {r["name"]: r.get("error") for r in only_run(trace_dir)}
+    assert errors == {"fetch": "ValueError: boom", "news": "ValueError: boom"}
+
+
+def test_disabled_tracing_writes_nothing(trace_dir, monkeypatch):
+    monkeypatch.setattr(tracing, "ENABLED", False)
+    with tracing.run("news", trace_dir=trace_dir) as root:
+        root.add("items")
+    assert tracing.read_runs(trace_dir) == {}
+
+
+def test_prune_keeps_newest_runs(tmp_path):
+    for stamp in ("20260801-000000", "20260802-000000", "20260803-000000"):
+        (tmp_path / f"{stamp}-news-1.jsonl").write_text("")
+    tracing.prune(str(tmp_path), 2)
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["20260802-000000-news-1.jsonl", "20260803-000000-news-1.jsonl"]
+
+
+def test_summarize_sums_repeated_spans_per_run():
+    def span(run, name, wall, items):
+        return {"type": "span", "run": run, "script": "news", "name": name, "wall_ms": wall, "cpu_ms": 1.0,
+                "counters": {"items": items}}
+
+    runs = {
+        "a": [span("a", "fetch", 10.0, 1), span("a", "fetch", 20.0, 2)],
+        "b": [span("b", "fetch", 50.0, 5), {"type": "call", "script": "news", "service": "serpapi", "latency_ms": 7.0}],
+    }
+    out = tracing.summarize(runs)
+    stage = out["stages"][0]
+    assert (out["runs"], stage["runs"], stage["p50_ms"], stage["max_ms"], stage["last_ms"]) == (2, 2, 40.0, 50.0, 50.0)
+    assert stage["counters_p50"] == {"items": 4.0}
+    assert out["calls"] == [{"script": "news", "service": "serpapi", "calls": 1,
+                             "p50_ms": 7.0, "p90_ms": 7.0, "p99_ms": 7.0, "max_ms": 7.0}]
+    assert tracing.percentile([1, 2, 3, 4], 50) == 2.5